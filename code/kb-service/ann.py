@@ -0,0 +1,111 @@
+"""
+ann.py — tiered FAISS index for the trace store.
+
+The index starts as exact IndexFlatIP and is promoted to an approximate one
+as it grows, by a tier list of (ntotal threshold, kind):
+
+  * flat  : exact inner product, O(n) per query
+  * ivf   : IVF<nlist>,Flat — inverted lists over k-means cells; `nprobe`
+            cells are scanned per query
+  * ivfpq : IVF<nlist>,PQ<m> — the same with vectors compressed to m bytes
+  * hnsw  : HNSW<M>,Flat — graph search, `efSearch` candidates per query
+
+nlist grows as 4*sqrt(n).  IVF indexes keep a direct map so their vectors
+can be reconstructed for the next promotion (ivfpq reconstructions are
+lossy, so it should be the last tier).
+"""
+from __future__ import annotations
+
+import math
+
+import faiss
+import numpy as np
+
+KINDS = ("flat", "ivf", "ivfpq", "hnsw")
+
+
+def parse_tiers(spec: str) -> list:
+    """"100000:ivf,5000000:ivfpq" -> [(100000, "ivf"), (5000000, "ivfpq")]."""
+    tiers = []
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        at, _, kind = part.partition(":")
+        if kind not in KINDS:
+            raise ValueError(f"unknown index kind '{kind}'; expected one of {KINDS}")
+        tiers.append((int(float(at)), kind))
+    return sorted(tiers)
+
+
+def target_kind(tiers: list, n: int) -> str:
+    kind = "flat"
+    for at, k in tiers:
+        if n >= at:
+            kind = k
+    return kind
+
+
+def behind(tiers: list, index) -> bool:
+    """True when `index` is of a kind below the one its size calls for
+    (kinds rank by their place in `tiers`, flat first) or of one `tiers`
+    no longer lists."""
+    order = ["flat", *(k for _, k in tiers)]
+    current, target = kind_of(index), target_kind(tiers, int(index.ntotal))
+    return current != target and (current not in order
+                                  or order.index(current) < order.index(target))
+
+
+def kind_of(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivfpq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf"
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    return "flat"
+
+
+def nlist_for(n: int) -> int:
+    return int(min(65536, max(16, 4 * math.sqrt(max(n, 1)))))
+
+
+def empty(kind: str, n: int, dim: int, pq_m: int = 32, hnsw_m: int = 32):
+    """Untrained index of `kind` sized for about `n` vectors."""
+    spec = {"flat": "Flat", "ivf": f"IVF{nlist_for(n)},Flat",
+            "ivfpq": f"IVF{nlist_for(n)},PQ{pq_m}", "hnsw": f"HNSW{hnsw_m},Flat"}[kind]
+    return faiss.index_factory(dim, spec, faiss.METRIC_INNER_PRODUCT)
+
+
+def build(kind: str, vectors: np.ndarray, pq_m: int = 32, hnsw_m: int = 32,
+          seed: int = 0):
+    """Index of `kind` holding `vectors` (ids 0..n-1), trained on a sample
+    of at most 64 points per IVF cell."""
+    n, dim = vectors.shape
+    index = empty(kind, n, dim, pq_m, hnsw_m)
+    if not index.is_trained:
+        ivf = faiss.extract_index_ivf(index)
+        sample = vectors
+        if n > 64 * ivf.nlist:
+            pick = np.random.default_rng(seed).choice(n, 64 * ivf.nlist, replace=False)
+            sample = vectors[np.sort(pick)]
+        index.train(sample)
+        ivf.make_direct_map()
+    for i in range(0, n, 65536):
+        index.add(vectors[i:i + 65536])
+    return index
+
+
+def vectors(index, start: int, end: int) -> np.ndarray:
+    """Stored vectors start..end-1 (approximate for ivfpq)."""
+    if end <= start:
+        return np.zeros((0, index.d), np.float32)
+    return index.reconstruct_n(start, end - start)
+
+
+def search_params(index, nprobe: int = None, ef_search: int = None):
+    """Per-query SearchParameters for the index's kind, or None (flat)."""
+    kind = kind_of(index)
+    if kind in ("ivf", "ivfpq") and nprobe:
+        return faiss.SearchParametersIVF(nprobe=int(nprobe))
+    if kind == "hnsw" and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search))
+    return None
@@ -17,13 +17,21 @@ import os
 import json
 import time
 import math
+import threading
 from pathlib import Path
 
 import numpy as np
-from fastapi import FastAPI, Body, Query
+from fastapi import FastAPI, Body, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import JSONResponse
 from neo4j import GraphDatabase
 
+from embedder import HashingEmbedder
+from graph_cache import GraphCache
+from microbatch import MicroBatcher
+from trace_log import TraceLog
+from trace_store import TraceStore
+
 # --------------------------------------------------------------------------- #
 # Connections.
 # --------------------------------------------------------------------------- #
@@ -33,19 +41,29 @@ NEO4J_PASS = os.environ.get("NEO4J_PASS", "password")
 driver = GraphDatabase.driver(NEO4J_URI, auth=(NEO4J_USER, NEO4J_PASS))
 
 import faiss  # noqa: E402
+import ann  # noqa: E402
 DATA_DIR = Path(os.environ.get("DATA_DIR", "/data"))
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 INDEX_PATH = DATA_DIR / "faiss.index"
-META_PATH = DATA_DIR / "faiss_meta.json"
+META_PATH = DATA_DIR / "faiss_meta.json"  # pre-SQLite metadata, imported once
+TRACE_DB = DATA_DIR / "traces.db"
+WAL_DIR = DATA_DIR / "wal"
 SEED_PATH = Path(os.environ.get("SEED_EDGES", "/app/kb/seed_edges.json"))
 
 DIM = 128
-if INDEX_PATH.exists():
-    index = faiss.read_index(str(INDEX_PATH))
-    meta = json.loads(META_PATH.read_text())
-else:
-    index = faiss.IndexFlatIP(DIM)
-    meta = {"ids": [], "texts": []}
+# hashed n-gram embedder; the most recent KB_EMBED_CACHE texts are memoized
+embedder = HashingEmbedder(DIM, cache_size=int(os.environ.get("KB_EMBED_CACHE", "4096")))
+index = faiss.read_index(str(INDEX_PATH)) if INDEX_PATH.exists() else faiss.IndexFlatIP(DIM)
+store = TraceStore(TRACE_DB)
+if META_PATH.exists():
+    legacy = json.loads(META_PATH.read_text())
+    store.put_many(((i, t, None) for i, t in enumerate(legacy["texts"])), replace=False)
+    if store.get_info("embedder") is None:
+        store.set_info("embedder", legacy.get("embedder", "random-v0"))
+    META_PATH.rename(META_PATH.with_name(META_PATH.name + ".imported"))
+    del legacy
+elif store.get_info("embedder") is None and not INDEX_PATH.exists():
+    store.set_info("embedder", embedder.version)
 
 # Typed edge vocabulary and gamma-decay half-life (paper defaults).
 EDGE_TYPES = {"synergizes_with": "SYNERGIZES_WITH",
@@ -53,11 +71,187 @@ EDGE_TYPES = {"synergizes_with": "SYNERGIZES_WITH",
               "depends_on": "DEPENDS_ON"}
 GAMMA = float(os.environ.get("KB_GAMMA", "0.98"))          # per-day decay
 DECAY_UNIT_S = float(os.environ.get("KB_DECAY_UNIT_S", "86400"))
+BULK_CHUNK = int(os.environ.get("KB_BULK_CHUNK", "5000"))  # edges per transaction
+DECAY_BATCH = int(os.environ.get("KB_DECAY_BATCH", "10000"))  # edges per decay transaction
+# scheduled decay: every KB_DECAY_INTERVAL_S (0 = off), persist decay of edges
+# not updated for KB_DECAY_MIN_AGE_S
+DECAY_INTERVAL_S = float(os.environ.get("KB_DECAY_INTERVAL_S", "0"))
+DECAY_MIN_AGE_S = float(os.environ.get("KB_DECAY_MIN_AGE_S", "86400"))
+# in-process graph cache for neighborhood/path reads: KB_GRAPH_CACHE=on|off,
+# reloaded at least every KB_GRAPH_CACHE_TTL_S (0 = only on invalidation) to
+# pick up writes made outside this process
+GRAPH_CACHE = os.environ.get("KB_GRAPH_CACHE", "on") == "on"
+GRAPH_CACHE_TTL_S = float(os.environ.get("KB_GRAPH_CACHE_TTL_S", "60"))
+# trace inserts go to a write-ahead log (fsync'd unless KB_WAL_SYNC=off); the
+# index is checkpointed every KB_CHECKPOINT_INTERVAL_S or once the log holds
+# KB_CHECKPOINT_BYTES
+WAL_SYNC = os.environ.get("KB_WAL_SYNC", "on") == "on"
+CHECKPOINT_INTERVAL_S = float(os.environ.get("KB_CHECKPOINT_INTERVAL_S", "300"))
+CHECKPOINT_BYTES = int(os.environ.get("KB_CHECKPOINT_BYTES", str(64 << 20)))
+# the trace index is promoted from exact search to the kind of the highest
+# KB_ANN_TIERS threshold (ntotal:kind, kinds flat|ivf|ivfpq|hnsw) it crosses,
+# rebuilt in the background; "" keeps it exact
+ANN_TIERS = ann.parse_tiers(os.environ.get("KB_ANN_TIERS", "100000:hnsw"))
+ANN_NPROBE = int(os.environ.get("KB_ANN_NPROBE", "16"))       # IVF cells scanned
+ANN_EF_SEARCH = int(os.environ.get("KB_ANN_EF_SEARCH", "64"))  # HNSW candidates
+ANN_PQ_M = int(os.environ.get("KB_ANN_PQ_M", "32"))            # bytes per PQ code
+ANN_HNSW_M = int(os.environ.get("KB_ANN_HNSW_M", "32"))
+# a failed promotion is retried after 1, 2, 4, ... s, at most KB_PROMOTE_RETRY_MAX_S
+PROMOTE_RETRY_MAX_S = float(os.environ.get("KB_PROMOTE_RETRY_MAX_S", "300"))
+# concurrent /kb/nn_search calls arriving within KB_SEARCH_BATCH_MS of each
+# other share one index.search (0: only those queued behind a running search)
+SEARCH_BATCH_MS = float(os.environ.get("KB_SEARCH_BATCH_MS", "2"))
+SEARCH_BATCH_MAX = int(os.environ.get("KB_SEARCH_BATCH_MAX", "256"))  # also caps nn_search_batch
+SEARCH_MAX_K = int(os.environ.get("KB_SEARCH_MAX_K", "1000"))  # larger k is clamped
 
 
-def persist_index():
-    faiss.write_index(index, str(INDEX_PATH))
-    META_PATH.write_text(json.dumps(meta))
+# --------------------------------------------------------------------------- #
+# Trace index durability.  Inserts are appended to the WAL and held in
+# _pending until their record is on disk; only then are they added to the
+# index and the metadata store, in id order, so nothing searchable can be lost
+# on restart.  A checkpoint writes a copy of the index atomically and drops
+# the log segments below it.  Startup loads the checkpoint and replays the
+# log: later vectors are re-added, and rows the store lost are restored.
+# --------------------------------------------------------------------------- #
+_index_lock = threading.Lock()       # index + store + WAL order
+_checkpoint_lock = threading.Lock()  # one checkpoint at a time
+_checkpoint_due = threading.Event()
+_checkpoint = {"ntotal": int(index.ntotal), "at": time.time()}
+_pending = {}  # id -> (WAL seq, vector, text, ts) of inserts not yet durable
+
+
+def _replay_log():
+    rows = []
+    for rid, vec, text in wal.replay():
+        if rid > index.ntotal:
+            break  # gap: later records cannot be placed
+        if rid == index.ntotal:
+            index.add(vec.reshape(1, -1))
+        rows.append((rid, text, None))
+    store.put_many(rows, replace=False)
+    store.truncate(int(index.ntotal))  # rows whose vector never got logged
+
+
+def _write_atomic(path: Path, data: bytes):
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _reembed():
+    """Rebuild the index from the stored texts if they were embedded by a
+    different embedder (e.g. the seeded-random one it replaced)."""
+    global index
+    if store.get_info("embedder") == embedder.version:
+        return False
+    n, rebuilt = int(index.ntotal), faiss.IndexFlatIP(DIM)
+    for i in range(0, n, 4096):
+        texts = dict(store.scan(i, min(n, i + 4096)))
+        rebuilt.add(embedder.embed([texts.get(j, "") for j in range(i, min(n, i + 4096))]))
+    index = rebuilt
+    return True
+
+
+def _publish():
+    """Move the durable prefix of _pending into the index and the store;
+    call with _index_lock held."""
+    n, durable, rows = int(index.ntotal), wal.durable, []
+    while n + len(rows) in _pending and _pending[n + len(rows)][0] <= durable:
+        rows.append(_pending.pop(n + len(rows)))
+    if rows:
+        index.add(np.vstack([v for _, v, _, _ in rows]))
+        store.put_many((n + j, text, ts) for j, (_, _, text, ts) in enumerate(rows))
+
+
+def checkpoint(force: bool = False) -> dict:
+    """Write the index as of now and truncate the WAL."""
+    with _checkpoint_lock:
+        with _index_lock:
+            wal.rotate(_next_id)  # flushes: every queued insert is durable
+            _publish()
+            n = int(index.ntotal)
+            if n == _checkpoint["ntotal"] and INDEX_PATH.exists() and not force:
+                return {**_checkpoint, "written": False}
+            snap = faiss.clone_index(index)  # a copy: serializing blocks no insert
+        _write_atomic(INDEX_PATH, faiss.serialize_index(snap).tobytes())
+        del snap
+        wal.drop_before(n)
+        _checkpoint.update(ntotal=n, at=time.time())
+        return {**_checkpoint, "written": True}
+
+
+def checkpoint_worker():
+    while True:
+        _checkpoint_due.wait(CHECKPOINT_INTERVAL_S if CHECKPOINT_INTERVAL_S > 0 else None)
+        _checkpoint_due.clear()
+        try:
+            checkpoint()
+        except OSError:
+            pass  # disk trouble: the WAL still holds everything; retry later
+
+
+# Promotion: vectors are copied out under the index lock, the new index is
+# trained and filled outside it (the current index keeps serving), then the
+# inserts made meanwhile are copied over and the two are swapped.
+_promote_lock = threading.Lock()
+_promote_due = threading.Event()
+_promotion = {"running": False, "last": None, "last_error": None, "failures": 0}
+
+
+def promote() -> dict:
+    """Rebuild the index as the kind its size calls for, if it is not."""
+    global index
+    with _promote_lock:
+        with _index_lock:
+            n, src = int(index.ntotal), index
+            kind, current = ann.target_kind(ANN_TIERS, n), ann.kind_of(index)
+            if kind == current:
+                return {"promoted": False, "kind": current, "ntotal": n}
+            vecs = ann.vectors(src, 0, n)
+        _promotion["running"] = True
+        t0 = time.time()
+        try:
+            new = ann.build(kind, vecs, ANN_PQ_M, ANN_HNSW_M)
+            del vecs
+            with _index_lock:
+                new.add(ann.vectors(src, n, int(src.ntotal)))
+                index = new
+        finally:
+            _promotion["running"] = False
+        _promotion["last"] = {"from": current, "to": kind, "ntotal": n,
+                              "seconds": round(time.time() - t0, 3), "at": time.time()}
+    checkpoint(force=True)
+    return {"promoted": True, **_promotion["last"]}
+
+
+def promote_worker():
+    delay = 1.0
+    while True:
+        _promote_due.wait()
+        _promote_due.clear()
+        try:
+            promote()
+            delay = 1.0
+        except Exception as e:  # e.g. out of memory: stay on the current index
+            _promotion["failures"] += 1
+            _promotion["last_error"] = {"error": f"{type(e).__name__}: {e}",
+                                        "at": time.time(), "retry_in_s": delay}
+            time.sleep(delay)
+            delay = min(2 * delay, PROMOTE_RETRY_MAX_S)
+            _promote_due.set()
+
+
+wal = TraceLog(WAL_DIR, sync=WAL_SYNC)
+_replay_log()
+_stale = _reembed()
+wal.open(int(index.ntotal))
+_next_id = int(index.ntotal)  # id of the next insert (published or not)
+if _stale:
+    checkpoint(force=True)  # drops the log records with the old vectors
+    store.set_info("embedder", embedder.version)
 
 
 app = FastAPI(title="kb-service", version="1.0.0")
@@ -67,8 +261,29 @@ app = FastAPI(title="kb-service", version="1.0.0")
 def healthz():
     with driver.session() as s:
         s.run("RETURN 1").consume()
-    return {"ok": True, "neo4j": True, "faiss_ntotal": int(index.ntotal),
-            "gamma": GAMMA}
+    return {"ok": True, "neo4j": True, **stats()}
+
+
+@app.get("/kb/stats")
+def stats():
+    """Trace index, promotion, WAL, batching and cache counters (no Neo4j
+    round trip, unlike /healthz)."""
+    return {"faiss_ntotal": int(index.ntotal), "gamma": GAMMA,
+            "index": {"kind": ann.kind_of(index),
+                      "target": ann.target_kind(ANN_TIERS, int(index.ntotal))},
+            "promotion": dict(_promotion),
+            "embedder": {"version": embedder.version, "cache_hits": embedder.hits,
+                         "cache_misses": embedder.misses},
+            "search_batching": {"window_ms": SEARCH_BATCH_MS,
+                                "batches": _search_batcher.batches,
+                                "queries": _search_batcher.items},
+            "wal": {"bytes": wal.size, "syncs": wal.syncs, "sync": WAL_SYNC,
+                    "pending": len(_pending),
+                    "checkpoint_ntotal": _checkpoint["ntotal"],
+                    "checkpoint_at": _checkpoint["at"]},
+            "graph_cache": {"enabled": GRAPH_CACHE, "version": _graph_version,
+                            "cached_version": graph.version, "edges": len(graph),
+                            "loads": graph.loads, "patches": graph.patches}}
 
 
 # --------------------------------------------------------------------------- #
@@ -102,6 +317,50 @@ def _rel_label(edge_type: str) -> str:
     return EDGE_TYPES[key]
 
 
+# Every committed edge write bumps _graph_version.  A write that knows the
+# edge it produced patches the cache; the others invalidate it.  Reads with
+# consistency="strong" (or KB_GRAPH_CACHE=off) go to Neo4j.
+graph = GraphCache(EDGE_TYPES.values())
+_graph_version = 0
+_graph_lock = threading.Lock()    # orders version bumps with cache patches
+_reload_lock = threading.Lock()   # one reload at a time
+_GRAPH_CY = """
+MATCH (a:Tunable)-[r]->(b:Tunable)
+WHERE type(r) IN $labels
+RETURN a.name, b.name, type(r), r.sign, r.weight, r.evidence, r.updated_at
+"""
+
+
+def _graph_changed(edge=None):
+    """Record a committed write; `edge` is the (from, to, label, sign, weight,
+    evidence, updated_at) it left behind, if it touched a single edge."""
+    global _graph_version
+    with _graph_lock:
+        _graph_version += 1
+        if edge is None:
+            graph.invalidate()
+        else:
+            graph.patch(edge, _graph_version)
+
+
+def _cached_graph(consistency: str):
+    """The up-to-date cache, or None to read through to Neo4j."""
+    if consistency not in ("cache", "strong"):
+        raise ValueError(f"unknown consistency '{consistency}'; "
+                         "expected 'cache' or 'strong'")
+    if not GRAPH_CACHE or consistency == "strong":
+        return None
+    if not graph.fresh(_graph_version, GRAPH_CACHE_TTL_S):
+        with _reload_lock:
+            version = _graph_version  # read before the query: a write racing
+            if not graph.fresh(version, GRAPH_CACHE_TTL_S):  # it forces a reload
+                with driver.session() as s:
+                    rows = [tuple(rec.values()) for rec in
+                            s.run(_GRAPH_CY, labels=list(EDGE_TYPES.values()))]
+                graph.load(rows, version)
+    return graph
+
+
 @app.post("/kb/dep_edge")
 def dep_edge(frm: str = Body(...), to: str = Body(...),
              edge_type: str = Body(...), sign: int = Body(default=1),
@@ -128,81 +387,273 @@ def dep_edge(frm: str = Body(...), to: str = Body(...),
                     evidence=int(evidence), now=now).single()
     if rec is None:
         return JSONResponse({"error": "both tunables must exist"}, status_code=404)
+    _graph_changed((rec["from"], rec["to"], rec["edge_type"], rec["sign"],
+                    rec["weight"], rec["evidence"], now))
     return JSONResponse(rec.data())
 
 
+def decay_weights(weights: np.ndarray, updated_at: np.ndarray, now: float) -> np.ndarray:
+    """w * gamma^(age_days), vectorized; NaN updated_at (never stamped) and
+    future stamps leave the weight as is."""
+    age = np.nan_to_num((now - updated_at) / DECAY_UNIT_S, nan=0.0)
+    return weights * np.power(GAMMA, np.maximum(age, 0.0))
+
+
+def neighborhoods(knobs: list, edge_type: str = None, min_weight: float = 0.0,
+                  decayed: bool = True, consistency: str = "cache") -> dict:
+    """{knob: [edge, ...]} for all `knobs` from the graph cache or one UNWIND
+    query; edges are sorted by (decayed) weight, heaviest first."""
+    rel = _rel_label(edge_type) if edge_type else None
+    cached = _cached_graph(consistency)
+    if cached is not None:
+        now = time.time()
+        decay = (lambda w, ts: decay_weights(w, ts, now)) if decayed else None
+        return cached.neighborhoods(knobs, rel, min_weight, decay)
+    pattern = f"[r:{rel}]" if rel else "[r]"
+    cy = f"""
+    UNWIND $knobs AS knob
+    MATCH (a:Tunable {{name:knob}})-{pattern}->(b:Tunable)
+    RETURN knob, type(r) AS edge_type, b.name AS neighbor, r.sign AS sign,
+           r.weight AS weight, r.evidence AS evidence, r.updated_at AS updated_at
+    """
+    with driver.session() as s:
+        rows = [tuple(rec.values()) for rec in s.run(cy, knobs=list(knobs))]
+    out = {k: [] for k in knobs}
+    if not rows:
+        return out
+    w = np.array([r[4] for r in rows], float)
+    if decayed:
+        ts = np.array([np.nan if r[6] is None else r[6] for r in rows], float)
+        w = decay_weights(w, ts, time.time())
+    for i in np.argsort(-w, kind="stable"):
+        if not w[i] >= min_weight:  # sorted, NaN last
+            break
+        knob, etype, nbr, sign, _, evidence, _ = rows[i]
+        out[knob].append({"edge_type": etype.lower(), "neighbor": nbr,
+                          "sign": int(sign), "weight": round(float(w[i]), 4),
+                          "evidence": int(evidence)})
+    return out
+
+
 @app.get("/kb/typed_neighborhood")
 def typed_neighborhood(knob: str = Query(...), edge_type: str = Query(None),
-                       min_weight: float = Query(0.0), decayed: bool = Query(True)):
+                       min_weight: float = Query(0.0), decayed: bool = Query(True),
+                       consistency: str = Query("cache")):
     """Return the typed/signed/weighted neighborhood the reasoner grounds on.
 
     If `decayed`, weights are reported after gamma-decay: w * gamma^(age_days),
     so stale evidence is discounted at query time without mutating the store.
+    consistency="strong" bypasses the graph cache.
     """
-    rel = _rel_label(edge_type) if edge_type else None
-    pattern = f"[r:{rel}]" if rel else "[r]"
-    cy = f"""
-    MATCH (a:Tunable {{name:$knob}})-{pattern}->(b:Tunable)
-    RETURN type(r) AS edge_type, b.name AS neighbor, r.sign AS sign,
-           r.weight AS weight, r.evidence AS evidence, r.updated_at AS updated_at
-    """
+    return {"knob": knob, "edges": neighborhoods([knob], edge_type, min_weight,
+                                                 decayed, consistency)[knob]}
+
+
+@app.post("/kb/typed_neighborhoods")
+def typed_neighborhoods(knobs: list = Body(...), edge_type: str = Body(default=None),
+                        min_weight: float = Body(default=0.0),
+                        decayed: bool = Body(default=True),
+                        consistency: str = Body(default="cache")):
+    """`typed_neighborhood` for many knobs in one query:
+    {"neighborhoods": {knob: [edge, ...]}}."""
+    knobs = list(dict.fromkeys(str(k) for k in knobs))
+    return {"neighborhoods": neighborhoods(knobs, edge_type, min_weight, decayed,
+                                           consistency)}
+
+
+# Decay runs entirely in the database: one auto-commit statement per edge type
+# selects edges by an updated_at index and rewrites them in committed batches,
+# so locks are held per batch and concurrent reads are not stalled.
+_DECAY_CY = """
+MATCH ()-[r:{label}]->()
+WHERE r.updated_at <= $cutoff AND r.weight IS NOT NULL
+CALL {{
+  WITH r
+  SET r.weight = r.weight * $gamma ^ (($now - r.updated_at) / $unit),
+      r.updated_at = $now
+  RETURN 1 AS done
+}} IN TRANSACTIONS OF $batch ROWS
+RETURN count(done) AS n
+"""
+_indexed = False
+
+
+def _ensure_decay_indexes(s):
+    global _indexed
+    if not _indexed:
+        for label in EDGE_TYPES.values():
+            s.run(f"CREATE INDEX {label.lower()}_updated_at IF NOT EXISTS "
+                  f"FOR ()-[r:{label}]-() ON (r.updated_at)").consume()
+        _indexed = True
+
+
+def decay_edges(min_age_s: float = 0.0, batch: int = DECAY_BATCH) -> int:
+    """w <- w * gamma^(age_days) for edges not updated for `min_age_s`;
+    updated_at is reset to now.  Returns the number of edges rewritten."""
     now = time.time()
-    out = []
-    with driver.session() as s:
-        for rec in s.run(cy, knob=knob):
-            w = float(rec["weight"])
-            if decayed and rec["updated_at"] is not None:
-                age_days = max(0.0, (now - float(rec["updated_at"])) / DECAY_UNIT_S)
-                w = w * (GAMMA ** age_days)
-            if w < min_weight:
-                continue
-            out.append({"edge_type": rec["edge_type"].lower(),
-                        "neighbor": rec["neighbor"], "sign": int(rec["sign"]),
-                        "weight": round(w, 4), "evidence": int(rec["evidence"])})
-    out.sort(key=lambda e: -e["weight"])
-    return {"knob": knob, "edges": out}
+    n = 0
+    try:
+        with driver.session() as s:
+            _ensure_decay_indexes(s)
+            for label in EDGE_TYPES.values():
+                rec = s.run(_DECAY_CY.format(label=label),
+                            cutoff=now - max(0.0, min_age_s), gamma=GAMMA, now=now,
+                            unit=DECAY_UNIT_S, batch=max(1, int(batch))).single()
+                n += rec["n"] if rec else 0
+    finally:  # batches commit independently, so a failed run may be partial
+        _graph_changed()
+    return n
 
 
 @app.post("/kb/decay")
-def decay():
+def decay(min_age_s: float = Body(default=0.0), batch: int = Body(default=DECAY_BATCH)):
     """Persist gamma-decay into stored weights (batch maintenance job).
-    w <- w * gamma^(age_days); updated_at reset to now."""
-    now = time.time()
-    cy = """
-    MATCH ()-[r]->()
-    WHERE r.updated_at IS NOT NULL AND r.weight IS NOT NULL
-    RETURN id(r) AS rid, r.weight AS w, r.updated_at AS ts
-    """
-    updates = []
+    w <- w * gamma^(age_days); updated_at reset to now.  With `min_age_s`,
+    only edges older than that are touched (the scheduled mode)."""
+    n = decay_edges(min_age_s, batch)
+    return {"decayed_edges": n, "gamma": GAMMA, "min_age_s": min_age_s}
+
+
+def decay_worker():
+    while True:
+        time.sleep(DECAY_INTERVAL_S)
+        try:
+            decay_edges(DECAY_MIN_AGE_S)
+        except Exception:
+            pass  # neo4j unavailable: retry next interval
+
+
+@app.on_event("startup")
+def startup():
+    if DECAY_INTERVAL_S > 0:
+        threading.Thread(target=decay_worker, daemon=True).start()
+    threading.Thread(target=checkpoint_worker, daemon=True).start()
+    threading.Thread(target=promote_worker, daemon=True).start()
+    _promote_due.set()  # the tiers may have changed since the last run
+
+
+@app.on_event("shutdown")
+def shutdown():
+    wal.close()
+    store.close()
+
+
+# --------------------------------------------------------------------------- #
+# Bulk edge ingestion.  Edges are sent in chunks, one transaction per chunk
+# holding one parameterized UNWIND per edge type (a relationship type cannot
+# be a parameter).  Rows are applied in order, so repeated edges get the same
+# weighted running update as successive /kb/dep_edge calls.
+# --------------------------------------------------------------------------- #
+_BULK_CY = """
+UNWIND $rows AS e
+MATCH (a:Tunable {{name:e.frm}}), (b:Tunable {{name:e.to}})
+MERGE (a)-[r:{label}]->(b)
+ON CREATE SET r.weight=e.weight, r.sign=e.sign, r.evidence=e.evidence,
+              r.created_at=$now, r.updated_at=$now
+ON MATCH  SET r.weight = (r.weight*r.evidence + e.weight*e.evidence)
+                          / (r.evidence + e.evidence),
+              r.sign=e.sign,
+              r.evidence = r.evidence + e.evidence,
+              r.updated_at=$now
+RETURN count(r) AS n
+"""
+
+
+def _edge_row(e: dict):
+    """(relationship label, UNWIND row) of one seed record."""
+    return _rel_label(e["edge_type"]), {
+        "frm": str(e["from"]), "to": str(e["to"]), "sign": int(e.get("sign", 1)),
+        "weight": float(e.get("weight", 0.5)), "evidence": int(e.get("evidence", 1))}
+
+
+def _write_chunk(tx, groups: dict, now: float) -> int:
+    return sum(tx.run(_BULK_CY.format(label=label), rows=rows, now=now).single()["n"]
+               for label, rows in groups.items())
+
+
+def bulk_load_edges(records, chunk: int = BULK_CHUNK) -> dict:
+    """Load an iterable of {from,to,edge_type,sign,weight,evidence} records
+    `chunk` at a time.  Malformed records and edges whose tunables do not
+    exist are counted as rejected."""
+    stats = {"loaded": 0, "rejected": 0, "chunks": 0}
+    groups, pending = {}, 0
     with driver.session() as s:
-        for rec in s.run(cy):
-            age_days = max(0.0, (now - float(rec["ts"])) / DECAY_UNIT_S)
-            updates.append((rec["rid"], float(rec["w"]) * (GAMMA ** age_days)))
-        for rid, w in updates:
-            s.run("MATCH ()-[r]->() WHERE id(r)=$rid "
-                  "SET r.weight=$w, r.updated_at=$now",
-                  rid=rid, w=w, now=now).consume()
-    return {"decayed_edges": len(updates), "gamma": GAMMA}
+        def flush(groups, pending):
+            n = s.execute_write(_write_chunk, groups, time.time())
+            stats["loaded"] += n
+            stats["rejected"] += pending - n  # unknown tunables
+            stats["chunks"] += 1
+
+        try:
+            for e in records:
+                try:
+                    label, row = _edge_row(e)
+                except (KeyError, TypeError, ValueError, AttributeError):
+                    stats["rejected"] += 1
+                    continue
+                groups.setdefault(label, []).append(row)
+                pending += 1
+                if pending >= chunk:
+                    flush(groups, pending)
+                    groups, pending = {}, 0
+            if pending:
+                flush(groups, pending)
+        finally:  # committed chunks stay committed
+            if stats["loaded"]:
+                _graph_changed()
+    return stats
+
+
+def _ndjson(lines):
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield None  # rejected by _edge_row
 
 
 @app.post("/kb/induce_from_seed")
-def induce_from_seed(path: str = Body(default=None)):
+def induce_from_seed(path: str = Body(default=None), chunk: int = Body(default=BULK_CHUNK)):
     """Bulk-load the induced typed edges produced offline by kb/induce_edges.py.
-    Expects a JSON list of {from,to,edge_type,sign,weight,evidence}."""
+    Expects a JSON list of {from,to,edge_type,sign,weight,evidence}, or one
+    such object per line (.ndjson / .jsonl), which is streamed from disk."""
     p = Path(path) if path else SEED_PATH
     if not p.exists():
         return JSONResponse({"error": f"seed file not found: {p}"}, status_code=404)
-    edges = json.loads(p.read_text())
-    loaded = 0
-    for e in edges:
-        try:
-            dep_edge(frm=e["from"], to=e["to"], edge_type=e["edge_type"],
-                     sign=int(e.get("sign", 1)), weight=float(e.get("weight", 0.5)),
-                     evidence=int(e.get("evidence", 1)))
-            loaded += 1
-        except Exception:
-            continue
-    return {"loaded": loaded, "source": str(p)}
+    if p.suffix in (".ndjson", ".jsonl"):
+        with p.open() as f:
+            stats = bulk_load_edges(_ndjson(f), max(1, chunk))
+    else:
+        stats = bulk_load_edges(json.loads(p.read_text()), max(1, chunk))
+    return {**stats, "source": str(p)}
+
+
+@app.post("/kb/bulk_edges")
+async def bulk_edges(request: Request, chunk: int = Query(BULK_CHUNK, ge=1)):
+    """Bulk-load edges streamed as NDJSON in the request body, e.g.
+    `curl --data-binary @edges.ndjson`; only one chunk is held in memory."""
+    stats = {"loaded": 0, "rejected": 0, "chunks": 0}
+    batch, buf = [], b""
+
+    async def load(rows):
+        part = await run_in_threadpool(bulk_load_edges, rows, chunk)
+        for k in stats:
+            stats[k] += part[k]
+
+    async for data in request.stream():
+        lines = (buf + data).split(b"\n")
+        buf = lines.pop()
+        batch.extend(_ndjson(lines))
+        if len(batch) >= chunk:
+            await load(batch)
+            batch = []
+    batch.extend(_ndjson([buf]))
+    if batch:
+        await load(batch)
+    return stats
 
 
 # --------------------------------------------------------------------------- #
@@ -230,42 +681,143 @@ def upsert_trace(context: dict = Body(...), action: dict = Body(...),
     return {"ok": True}
 
 
-def _embed(text: str) -> np.ndarray:
-    np.random.seed(abs(hash(text)) % (2 ** 32))
-    v = np.random.normal(0, 1, size=(DIM,)).astype("float32")
-    v /= np.linalg.norm(v) + 1e-8
-    return v
-
-
 @app.post("/kb/nn_upsert")
 def nn_upsert(text: str = Body(...)):
-    v = _embed(text)
-    index.add(v.reshape(1, -1))
-    meta["ids"].append(int(index.ntotal) - 1)
-    meta["texts"].append(text)
-    persist_index()
-    return {"ok": True, "id": int(index.ntotal) - 1}
+    global _next_id
+    v = embedder.embed([text])[0]
+    with _index_lock:
+        rid, _next_id = _next_id, _next_id + 1
+        seq = wal.append(rid, v, text)
+        _pending[rid] = (seq, v, text, time.time())
+    try:
+        wal.wait(seq)  # group commit with concurrent inserts
+    except OSError:
+        with _index_lock:
+            _pending.pop(rid, None)
+        raise
+    with _index_lock:
+        _publish()
+    if wal.size >= CHECKPOINT_BYTES:
+        _checkpoint_due.set()
+    if not _promotion["running"] and ann.behind(ANN_TIERS, index):
+        _promote_due.set()
+    return {"ok": True, "id": rid}
+
+
+@app.post("/kb/checkpoint")
+def checkpoint_now():
+    """Checkpoint the trace index immediately (e.g. before a backup)."""
+    return checkpoint()
+
+
+@app.get("/kb/ann")
+def ann_state():
+    kind = ann.kind_of(index)
+    return {"kind": kind, "ntotal": int(index.ntotal),
+            "target": ann.target_kind(ANN_TIERS, int(index.ntotal)),
+            "tiers": [{"at": at, "kind": k} for at, k in ANN_TIERS],
+            "nprobe": ANN_NPROBE, "ef_search": ANN_EF_SEARCH,
+            "nlist": faiss.extract_index_ivf(index).nlist if kind.startswith("ivf") else None,
+            "promoting": _promotion["running"], "last_promotion": _promotion["last"],
+            "last_error": _promotion["last_error"], "failures": _promotion["failures"]}
+
+
+@app.post("/kb/ann/promote")
+def ann_promote():
+    """Promote now (blocking) instead of waiting for the next threshold."""
+    return promote()
+
+
+def search(vectors: np.ndarray, ks: list, nprobe: int = None,
+           ef_search: int = None) -> list:
+    """[[item, ...] per query] from one index.search over all `vectors`
+    (n x DIM) at the largest k; each row is cut to its own k."""
+    if index.ntotal == 0 or not ks:
+        return [[] for _ in ks]
+    with _index_lock:
+        kmax = min(max(max(ks), 1), int(index.ntotal))
+        params = ann.search_params(index, nprobe or ANN_NPROBE,
+                                   max(ef_search or ANN_EF_SEARCH, kmax))
+        D, I = index.search(np.ascontiguousarray(vectors, np.float32), kmax,
+                            params=params)
+    texts = store.texts({i for row, k in zip(I.tolist(), ks) for i in row[:k] if i >= 0})
+    return [[{"id": idx, "text": texts[idx], "score": float(score)}
+             for score, idx in zip(d[:k], i[:k]) if idx in texts]
+            for d, i, k in zip(D.tolist(), I.tolist(), ks)]
+
+
+# single searches with the same parameters are coalesced into one search()
+_search_batcher = MicroBatcher(
+    lambda key, items: search(np.vstack([v for v, _ in items]),
+                              [k for _, k in items], *key),
+    SEARCH_BATCH_MS / 1000.0, SEARCH_BATCH_MAX)
 
 
 @app.post("/kb/nn_search")
-def nn_search(query: str = Body(...), k: int = Body(default=5)):
+def nn_search(query: str = Body(...), k: int = Body(default=5),
+              nprobe: int = Body(default=None), ef_search: int = Body(default=None)):
+    """`nprobe` (IVF) / `ef_search` (HNSW) override the configured
+    recall/latency trade-off for this query; exact search ignores them."""
     if index.ntotal == 0:
         return {"items": []}
-    v = _embed(query)
-    D, I = index.search(v.reshape(1, -1), min(k, index.ntotal))
-    items = []
-    for score, idx in zip(D[0].tolist(), I[0].tolist()):
-        if idx < 0 or idx >= len(meta["texts"]):
-            continue
-        items.append({"id": idx, "text": meta["texts"][idx], "score": float(score)})
-    return {"items": items}
+    v = embedder.embed([query])[0]
+    k = min(k, SEARCH_MAX_K)
+    return {"items": _search_batcher.submit((nprobe, ef_search), (v, k))}
+
+
+@app.post("/kb/nn_search_batch")
+def nn_search_batch(queries: list = Body(...), k: int = Body(default=5),
+                    nprobe: int = Body(default=None), ef_search: int = Body(default=None)):
+    """Many searches in one call.  Each query is a string, or
+    {"query": str | "vector": [DIM floats], "k": int} (k defaults to `k`);
+    texts are embedded in one pass and all queries share one index search.
+    Returns {"results": [{"items": [...]}, ...]} in query order; at most
+    KB_SEARCH_BATCH_MAX queries, and k is clamped to KB_SEARCH_MAX_K."""
+    if len(queries) > SEARCH_BATCH_MAX:
+        return JSONResponse({"error": f"at most {SEARCH_BATCH_MAX} queries per batch"},
+                            status_code=400)
+    vecs, ks, texts = np.zeros((len(queries), DIM), np.float32), [], {}
+    for i, q in enumerate(queries):
+        q = {"query": q} if isinstance(q, str) else q
+        try:
+            ks.append(min(int(q.get("k", k)), SEARCH_MAX_K))
+            if "vector" in q:
+                vecs[i] = np.asarray(q["vector"], np.float32).reshape(DIM)
+            else:
+                texts[i] = str(q["query"])
+        except (AttributeError, KeyError, TypeError, ValueError):
+            return JSONResponse({"error": f"query {i}: expected a string or "
+                                          f"{{query|vector[{DIM}], k}}"}, status_code=400)
+    if texts:
+        vecs[list(texts)] = embedder.embed(list(texts.values()))
+    return {"results": [{"items": items}
+                        for items in search(vecs, ks, nprobe, ef_search)]}
+
+
+@app.get("/kb/traces")
+def traces(workload: str = Query(None), server: str = Query(None), knob: str = Query(None),
+           min_delta_p95: float = Query(None), max_delta_p95: float = Query(None),
+           anomaly: bool = Query(None), since: float = Query(None),
+           until: float = Query(None), limit: int = Query(100, ge=1, le=10000)):
+    """Indexed traces filtered by their structured fields, newest first;
+    since/until are epoch seconds."""
+    return {"items": store.query(workload, server, knob, min_delta_p95, max_delta_p95,
+                                 anomaly, since, until, limit)}
 
 
 # --------------------------------------------------------------------------- #
 # Path / neighborhood over any typed edge (kept for operator introspection).
 # --------------------------------------------------------------------------- #
 @app.get("/kb/dependency_path")
-def dependency_path(start: str = Query(...), end: str = Query(None)):
+def dependency_path(start: str = Query(...), end: str = Query(None),
+                    consistency: str = Query("cache")):
+    cached = _cached_graph(consistency)
+    if cached is not None:
+        if end:
+            path = cached.shortest_path(start, end, 4)
+            nodes, rels = path if path else ([], [])
+            return {"nodes": nodes, "rels": rels}
+        return {"neighbors": cached.reachable(start, 2)}
     with driver.session() as s:
         if end:
             cy = """
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+bench_ann.py — recall@k vs latency of the ANN tiers against exact search.
+
+Embeds synthetic trace texts (the same `key=value` shape upsert_trace
+indexes) with the service's embedder, builds each index kind the way a
+promotion does (`ann.build`) and sweeps its search knob: nprobe for ivf and
+ivfpq, efSearch for hnsw.  Recall@k is the share of returned ids scoring at
+least IndexFlatIP's k-th score (so ties with it count: trace texts repeat),
+averaged over the queries; latency is per query, batched.
+
+Usage:
+    python bench_ann.py --n 200000 --queries 1000 --k 10 --kinds ivf ivfpq hnsw
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+import ann
+from embedder import HashingEmbedder
+
+
+def corpus(n: int, seed: int) -> list:
+    rng = np.random.default_rng(seed)
+    w, s, kn, v = (rng.integers(0, m, n) for m in (40, 500, 300, 64))
+    d = rng.normal(0, 5, n)
+    return [f"workload=w{w[i]} server=s{s[i]} knob=k{kn[i]} value={v[i] * 16} "
+            f"delta_p95={d[i]:.1f} anomaly={d[i] > 8}" for i in range(n)]
+
+
+def timed_search(index, q, k, params=None):
+    t0 = time.perf_counter()
+    _, ids = index.search(q, k, params=params)
+    return ids, (time.perf_counter() - t0) / len(q) * 1e6
+
+
+def recall(ids: np.ndarray, xb: np.ndarray, xq: np.ndarray, kth: np.ndarray) -> float:
+    """Share of returned ids scoring at least the exact k-th score."""
+    scores = np.einsum("qkd,qd->qk", xb[np.maximum(ids, 0)], xq)
+    return float(np.mean((scores >= kth[:, None] - 1e-5) & (ids >= 0)))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=200000)
+    ap.add_argument("--queries", type=int, default=1000)
+    ap.add_argument("--k", type=int, default=10)
+    ap.add_argument("--dim", type=int, default=128)
+    ap.add_argument("--kinds", nargs="+", default=["ivf", "ivfpq", "hnsw"],
+                    choices=[k for k in ann.KINDS if k != "flat"])
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    ap.add_argument("--ef", type=int, nargs="+", default=[16, 64, 256])
+    ap.add_argument("--pq-m", type=int, default=32)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    emb = HashingEmbedder(args.dim, cache_size=0)
+    t0 = time.perf_counter()
+    xb = np.vstack([emb.embed(c) for c in np.array_split(corpus(args.n, args.seed),
+                                                         max(1, args.n // 50000))])
+    xq = emb.embed(corpus(args.queries, args.seed + 1))
+    print(f"embedded {args.n} traces in {time.perf_counter() - t0:.1f}s")
+
+    flat = ann.build("flat", xb)
+    _, flat_us = timed_search(flat, xq, args.k)
+    kth = flat.search(xq, args.k)[0][:, -1]
+    print(f"{'index':>14} {'param':>10} {'build s':>8} {'us/query':>9} "
+          f"{f'recall@{args.k}':>10} {'speedup':>8}")
+    print(f"{'flat':>14} {'-':>10} {'-':>8} {flat_us:>9.1f} {1.0:>10.3f} {1.0:>7.1f}x")
+    for kind in args.kinds:
+        t0 = time.perf_counter()
+        index = ann.build(kind, xb, pq_m=args.pq_m, seed=args.seed)
+        build_s = time.perf_counter() - t0
+        sweep = args.ef if kind == "hnsw" else args.nprobe
+        for p in sweep:
+            params = (ann.search_params(index, ef_search=max(p, args.k)) if kind == "hnsw"
+                      else ann.search_params(index, nprobe=p))
+            ids, us = timed_search(index, xq, args.k, params)
+            label = f"{kind}" + (f"/{faiss.extract_index_ivf(index).nlist}"
+                                 if kind != "hnsw" else "")
+            name = "efSearch" if kind == "hnsw" else "nprobe"
+            print(f"{label:>14} {f'{name}={p}':>10} {build_s:>8.1f} {us:>9.1f} "
+                  f"{recall(ids, xb, xq, kth):>10.3f} {flat_us / us:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+embedder.py — deterministic hashed n-gram text embedder for the trace index.
+
+Texts are lower-cased, whitespace-normalized and featurized as character
+n-grams (padded with spaces, so word starts and ends are features) plus whole
+whitespace tokens, which carry the `key=value` pairs of trace texts.  Each
+feature is hashed with a fixed 64-bit hash to a signed bucket of a
+`dim`-vector (the hashing trick), counts are log-damped and rows
+L2-normalized, so inner product is cosine similarity and texts sharing knobs,
+workloads or values land close together.  No RNG and no
+salted `hash()`: the same text embeds identically in every process.
+
+Character n-grams of a whole batch are hashed in one vectorized pass over the
+concatenated bytes.  `HashingEmbedder.embed` keeps a bounded LRU of recent
+texts so repeated queries skip featurization.
+"""
+from __future__ import annotations
+
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+_PRIME = np.uint64(0x100000001B3)  # FNV-1a 64-bit prime
+_MIX1 = np.uint64(0xFF51AFD7ED558CCD)  # murmur3 fmix64
+_MIX2 = np.uint64(0xC4CEB9FE1A85EC53)
+_S33 = np.uint64(33)
+_SEP = 0  # byte between texts; never inside an n-gram
+
+
+def _fmix(h: np.ndarray) -> np.ndarray:
+    h = h ^ (h >> _S33)
+    h = h * _MIX1
+    h = h ^ (h >> _S33)
+    h = h * _MIX2
+    return h ^ (h >> _S33)
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int, ngrams=(3, 4, 5), word_weight: float = 2.0,
+                 cache_size: int = 4096):
+        self.dim = int(dim)
+        self.ngrams = tuple(ngrams)
+        self.word_weight = float(word_weight)
+        self.cache_size = int(cache_size)
+        self.version = f"hash-ngram-v1:{self.dim}:{','.join(map(str, self.ngrams))}"
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def _features(self, texts: list):
+        """(row, hash, weight) arrays of every feature of `texts`."""
+        rows, hashes, weights = [], [], []
+        docs = [(" " + " ".join(t.lower().split()) + " ").encode() for t in texts]
+        buf = np.frombuffer(bytes([_SEP]).join(docs), np.uint8)
+        # row of each byte position; separators belong to no row
+        row_of = np.repeat(np.arange(len(docs)), [len(d) + 1 for d in docs])[:buf.size]
+        seps = np.concatenate([[0], np.cumsum(buf == _SEP)])
+        codes = buf.astype(np.uint64)
+        for n in self.ngrams:
+            m = buf.size - n + 1
+            if m <= 0:
+                continue
+            h = np.full(m, np.uint64(n))
+            for j in range(n):
+                h = h * _PRIME + codes[j:j + m]
+            ok = seps[n:n + m] == seps[:m]
+            rows.append(row_of[:m][ok])
+            hashes.append(h[ok])
+            weights.append(np.ones(int(ok.sum())))
+        for r, t in enumerate(texts):
+            toks = t.lower().split()
+            if toks:
+                rows.append(np.full(len(toks), r))
+                hashes.append(np.array([zlib.crc32(w.encode()) for w in toks], np.uint64)
+                              << np.uint64(32))
+                weights.append(np.full(len(toks), self.word_weight))
+        if not rows:
+            return np.zeros(0, int), np.zeros(0, np.uint64), np.zeros(0)
+        return np.concatenate(rows), np.concatenate(hashes), np.concatenate(weights)
+
+    def _embed(self, texts: list) -> np.ndarray:
+        rows, h, w = self._features(texts)
+        h = _fmix(h)
+        bucket = (h % np.uint64(self.dim)).astype(np.int64)
+        sign = np.where(h >> np.uint64(63), -1.0, 1.0)
+        flat = np.bincount(rows * self.dim + bucket, sign * w,
+                           minlength=len(texts) * self.dim)
+        m = flat.reshape(len(texts), self.dim)
+        m = np.sign(m) * np.log1p(np.abs(m))
+        m /= np.linalg.norm(m, axis=1, keepdims=True) + 1e-8
+        return m.astype(np.float32)
+
+    def embed(self, texts) -> np.ndarray:
+        """(len(texts), dim) float32 unit rows; cached texts are reused."""
+        texts = list(texts)
+        out = np.empty((len(texts), self.dim), np.float32)
+        missing = {}
+        with self._lock:
+            for i, t in enumerate(texts):
+                v = self._cache.get(t)
+                if v is None:
+                    missing.setdefault(t, []).append(i)
+                else:
+                    self._cache.move_to_end(t)
+                    out[i] = v
+            self.hits += len(texts) - sum(map(len, missing.values()))
+            self.misses += len(missing)
+        if missing:
+            new = self._embed(list(missing))
+            with self._lock:
+                for v, (t, idx) in zip(new, missing.items()):
+                    out[idx] = v
+                    if self.cache_size > 0:
+                        self._cache[t] = v.copy()  # not a view of the batch
+                        self._cache.move_to_end(t)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return out
@@ -0,0 +1,220 @@
+"""
+graph_cache.py — in-process copy of the typed Tunable graph for kb-service.
+
+The graph changes only through kb-service writes (dep_edge, bulk loads,
+decay), so reads can be answered from memory.  Edges live in parallel numpy
+arrays (src, dst, type, sign, weight, evidence, updated_at) with a CSR index
+by source node, rebuilt lazily after writes; gamma-decay is applied at read
+time exactly as the Cypher path does.
+
+Consistency: the cache records the write `version` it reflects.  A write that
+returns the edge it produced is patched in place when the cache is exactly one
+version behind; any other write (bulk load, decay) invalidates it, and the
+next read reloads the whole graph from Neo4j.  A patch older than the cached
+row of the same edge (two writes reporting back out of order) is skipped.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+_COLUMNS = (("src", np.int32), ("dst", np.int32), ("etype", np.int8),
+            ("sign", np.int8), ("weight", np.float64), ("evidence", np.int64),
+            ("updated_at", np.float64))
+
+
+class GraphCache:
+    def __init__(self, edge_types, capacity: int = 1024):
+        self.edge_types = list(edge_types)  # relationship labels, e.g. "DEPENDS_ON"
+        self._etype = {t: i for i, t in enumerate(self.edge_types)}
+        self._lock = threading.Lock()
+        self.version = -1  # write version reflected; -1 = not loaded
+        self.loaded_at = 0.0
+        self.loads = self.patches = 0
+        self._reset(capacity)
+
+    def _reset(self, capacity: int):
+        self.names, self._node = [], {}
+        self._edge = {}  # (src, dst, etype) -> row
+        self._cols = {c: np.zeros(capacity, t) for c, t in _COLUMNS}
+        self.n_edges = 0
+        self._csr = None
+
+    def __len__(self):
+        return self.n_edges
+
+    def _node_id(self, name: str) -> int:
+        i = self._node.get(name)
+        if i is None:
+            i = self._node[name] = len(self.names)
+            self.names.append(name)
+        return i
+
+    def _upsert(self, frm, to, label, sign, weight, evidence, updated_at):
+        key = (self._node_id(frm), self._node_id(to), self._etype[label])
+        i = self._edge.get(key)
+        if i is None:
+            i = self._edge[key] = self.n_edges
+            if i == self._cols["src"].size:
+                for c, a in self._cols.items():
+                    self._cols[c] = np.concatenate([a, np.zeros_like(a)])
+            self.n_edges += 1
+            self._csr = None
+        c = self._cols
+        c["src"][i], c["dst"][i], c["etype"][i] = key
+        c["sign"][i] = sign
+        c["weight"][i] = np.nan if weight is None else weight
+        c["evidence"][i] = evidence or 0
+        c["updated_at"][i] = np.nan if updated_at is None else updated_at
+
+    def _stale(self, row) -> bool:
+        frm, to, label, _, _, evidence, updated_at = row
+        a, b = self._node.get(frm), self._node.get(to)
+        i = None if a is None or b is None else self._edge.get((a, b, self._etype[label]))
+        if i is None:
+            return False
+        have, new = int(self._cols["evidence"][i]), evidence or 0
+        # NaN stamps compare False, so an unstamped side never counts as newer
+        return new < have or (new == have and updated_at is not None
+                              and updated_at < self._cols["updated_at"][i])
+
+    # ------------------------------------------------------------------ #
+    # Writes.
+    # ------------------------------------------------------------------ #
+    def load(self, rows, version: int):
+        """Replace the contents with `rows` of (from, to, label, sign, weight,
+        evidence, updated_at) as of write `version`."""
+        with self._lock:
+            self._reset(max(1024, self._cols["src"].size))
+            for row in rows:
+                if row[2] in self._etype:
+                    self._upsert(*row)
+            self.version = version
+            self.loaded_at = time.time()
+            self.loads += 1
+
+    def patch(self, row, version: int) -> bool:
+        """Apply one written edge; if the cache missed a write in between it
+        is invalidated instead.  Returns whether it was patched.
+
+        Concurrent writes to one edge can report back in the opposite order
+        they committed, so a row older than the cached one (lower evidence, or
+        equal evidence and an earlier updated_at) is not applied; the version
+        still advances, since the cached row already reflects that write."""
+        with self._lock:
+            if self.version != version - 1:
+                self.version = -1
+                return False
+            if not self._stale(row):
+                self._upsert(*row)
+            self.version = version
+            self.patches += 1
+            return True
+
+    def invalidate(self):
+        with self._lock:
+            self.version = -1
+
+    def fresh(self, version: int, ttl_s: float) -> bool:
+        return self.version == version and (
+            ttl_s <= 0 or time.time() - self.loaded_at < ttl_s)
+
+    # ------------------------------------------------------------------ #
+    # Reads.
+    # ------------------------------------------------------------------ #
+    def _index(self):
+        """(order, offsets): edge rows sorted by source, and per-node spans."""
+        if self._csr is None:
+            src = self._cols["src"][:self.n_edges]
+            order = np.argsort(src, kind="stable")
+            offsets = np.searchsorted(src[order], np.arange(len(self.names) + 1))
+            self._csr = (order, offsets)
+        return self._csr
+
+    def _out_edges(self, node: int) -> np.ndarray:
+        order, offsets = self._index()
+        return order[offsets[node]:offsets[node + 1]]
+
+    def neighborhoods(self, knobs, label: str = None, min_weight: float = 0.0,
+                      decay=None) -> dict:
+        """Same result as the Cypher neighborhood query; `decay(weights,
+        updated_at)` maps raw to decayed weights (None: raw)."""
+        with self._lock:
+            c = self._cols
+            idx, owner = [], []
+            for k in knobs:
+                node = self._node.get(k)
+                if node is not None:
+                    rows = self._out_edges(node)
+                    idx.append(rows)
+                    owner.extend([k] * rows.size)
+            out = {k: [] for k in knobs}
+            if not owner:
+                return out
+            rows = np.concatenate(idx)
+            if label is not None:
+                keep = c["etype"][rows] == self._etype[label]
+                rows, owner = rows[keep], [o for o, m in zip(owner, keep) if m]
+            w = c["weight"][rows]
+            if decay is not None:
+                w = decay(w, c["updated_at"][rows])
+            for j in np.argsort(-w, kind="stable"):
+                if not w[j] >= min_weight:  # sorted, NaN last
+                    break
+                i = rows[j]
+                out[owner[j]].append({
+                    "edge_type": self.edge_types[c["etype"][i]].lower(),
+                    "neighbor": self.names[c["dst"][i]], "sign": int(c["sign"][i]),
+                    "weight": round(float(w[j]), 4), "evidence": int(c["evidence"][i])})
+            return out
+
+    def reachable(self, start: str, depth: int = 2) -> list:
+        """Names reachable from `start` by 1..depth outgoing edges."""
+        with self._lock:
+            node = self._node.get(start)
+            if node is None:
+                return []
+            dst = self._cols["dst"]
+            seen, frontier = set(), {node}
+            for _ in range(depth):
+                nxt = set()
+                for n in frontier:
+                    nxt.update(dst[self._out_edges(n)].tolist())
+                seen |= nxt
+                frontier = nxt
+            return [self.names[n] for n in sorted(seen)]
+
+    def shortest_path(self, start: str, end: str, max_hops: int = 4):
+        """(nodes, relationship labels) of a shortest directed path of 1..
+        max_hops edges, or None."""
+        with self._lock:
+            a, b = self._node.get(start), self._node.get(end)
+            if a is None or b is None:
+                return None
+            c = self._cols
+            parent = {}  # node -> (previous node, edge row)
+            queue = deque([(a, 0)])
+            while queue:
+                n, d = queue.popleft()
+                if d == max_hops:
+                    continue
+                for i in self._out_edges(n).tolist():
+                    m = int(c["dst"][i])
+                    if m in parent or (m == a and m != b):
+                        continue
+                    parent[m] = (n, i)
+                    if m == b:
+                        nodes, rels = [b], []
+                        while True:
+                            prev, row = parent[nodes[-1]]
+                            rels.append(self.edge_types[c["etype"][row]].lower())
+                            nodes.append(prev)
+                            if prev == a:
+                                break
+                        return ([self.names[x] for x in reversed(nodes)],
+                                list(reversed(rels)))
+                    queue.append((m, d + 1))
+            return None
@@ -0,0 +1,71 @@
+"""
+microbatch.py — coalesce concurrent single requests into batch calls.
+
+Callers `submit(key, item)` from their own threads (FastAPI's threadpool).
+The first caller for a key leads: it waits up to `window_s` for more items
+with the same key (or until `max_batch` are queued), runs `fn(key, items)`
+once for all of them, and hands each caller its result.  Items that arrive
+while a batch is running queue up and the first of them leads the next
+batch, so under load batches form even with a zero window.
+"""
+from __future__ import annotations
+
+import threading
+
+
+class _Slot:
+    __slots__ = ("item", "result", "error", "lead", "done")
+
+    def __init__(self, item):
+        self.item, self.result, self.error = item, None, None
+        self.lead = self.done = False
+
+
+class MicroBatcher:
+    def __init__(self, fn, window_s: float = 0.002, max_batch: int = 256):
+        self.fn = fn  # fn(key, [item, ...]) -> [result, ...]
+        self.window_s = float(window_s)
+        self.max_batch = int(max_batch)
+        self._cond = threading.Condition()
+        self._queues = {}    # key -> [slot, ...] waiting
+        self._running = set()  # keys with a leader
+        self.batches = self.items = 0
+
+    def submit(self, key, item):
+        slot = _Slot(item)
+        with self._cond:
+            q = self._queues.setdefault(key, [])
+            q.append(slot)
+            if key not in self._running:
+                self._running.add(key)
+                slot.lead = True
+            self._cond.notify_all()
+            while not (slot.lead or slot.done):
+                self._cond.wait()
+            if slot.lead:
+                if self.window_s > 0:
+                    self._cond.wait_for(lambda: len(q) >= self.max_batch, self.window_s)
+                batch = q[:self.max_batch]
+                del q[:self.max_batch]
+        if not slot.done:
+            self._run(key, q, batch)
+        if slot.error is not None:
+            raise slot.error
+        return slot.result
+
+    def _run(self, key, q, batch):
+        try:
+            results, error = self.fn(key, [s.item for s in batch]), None
+        except Exception as e:
+            results, error = [None] * len(batch), e
+        with self._cond:
+            for s, r in zip(batch, results):
+                s.result, s.error, s.done = r, error, True
+            if q:
+                q[0].lead = True
+            else:
+                self._running.discard(key)
+                self._queues.pop(key, None)
+            self.batches += 1
+            self.items += len(batch)
+            self._cond.notify_all()
@@ -0,0 +1,53 @@
+import faiss
+import numpy as np
+import pytest
+
+import ann
+
+
+def _unit(n, dim=16, seed=0):
+    x = np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def test_parse_and_target_kind():
+    tiers = ann.parse_tiers("5e6:ivfpq, 100000:ivf,")
+    assert tiers == [(100000, "ivf"), (5000000, "ivfpq")]
+    assert [ann.target_kind(tiers, n) for n in (0, 100000, 6000000)] == ["flat", "ivf", "ivfpq"]
+    with pytest.raises(ValueError):
+        ann.parse_tiers("10:annoy")
+
+
+@pytest.mark.parametrize("kind", ["ivf", "hnsw"])
+def test_build_keeps_ids_and_finds_stored_vectors(kind):
+    x = _unit(2000)
+    index = ann.build(kind, x)
+    assert ann.kind_of(index) == kind and index.ntotal == 2000
+    params = ann.search_params(index, nprobe=index.nlist if kind == "ivf" else None,
+                               ef_search=64)
+    _, ids = index.search(x[:50], 1, params=params)
+    assert (ids[:, 0] == np.arange(50)).mean() >= 0.98
+    assert np.allclose(ann.vectors(index, 10, 20), x[10:20], atol=1e-6)
+
+
+def test_empty_index_kinds_and_nlist_growth():
+    assert [ann.kind_of(ann.empty(k, 1000, 16, pq_m=4)) for k in ann.KINDS] == list(ann.KINDS)
+    assert faiss.extract_index_ivf(ann.empty("ivfpq", 1000, 16, pq_m=4)).nlist == 126
+    assert [ann.nlist_for(n) for n in (0, 10000, 10**12)] == [16, 400, 65536]
+
+
+def test_behind_compares_against_the_tier_order():
+    tiers = ann.parse_tiers("100:hnsw")
+    flat = faiss.IndexFlatIP(16)
+    assert not ann.behind(tiers, flat)
+    flat.add(_unit(100))
+    assert ann.behind(tiers, flat)
+    hnsw = ann.build("hnsw", _unit(150))
+    assert not ann.behind(tiers, hnsw)
+    assert ann.behind(ann.parse_tiers("100:ivf"), hnsw)  # a kind no longer configured
+    assert not ann.behind(ann.parse_tiers("100:ivf,1000:hnsw"), hnsw)
+
+
+def test_search_params_only_for_approximate_kinds():
+    assert ann.search_params(faiss.IndexFlatIP(4), nprobe=8, ef_search=8) is None
+    assert ann.search_params(ann.empty("hnsw", 10, 4), ef_search=32).efSearch == 32
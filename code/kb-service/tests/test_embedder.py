@@ -0,0 +1,45 @@
+import numpy as np
+
+from embedder import HashingEmbedder
+
+TRACE = "workload=oltp server=s1 knob=vm.swappiness value=10 delta_p95=-3.5 anomaly=False"
+
+
+def test_rows_are_unit_norm_and_deterministic():
+    a = HashingEmbedder(128, cache_size=0)
+    b = HashingEmbedder(128, cache_size=0)
+    texts = [TRACE, "  Workload=OLTP   knob=x ", "", "a"]
+    x, y = a.embed(texts), b.embed(texts)
+    assert x.dtype == np.float32 and x.shape == (4, 128)
+    assert np.array_equal(x, y)
+    norms = np.linalg.norm(x, axis=1)
+    assert np.allclose(norms[[0, 1, 3]], 1.0, atol=1e-5) and norms[2] == 0.0
+    # case and whitespace are normalized
+    assert np.array_equal(a.embed(["workload=oltp knob=x"]), a.embed(["  Workload=OLTP   knob=x "]))
+
+
+def test_batch_embedding_matches_one_at_a_time():
+    e = HashingEmbedder(64, cache_size=0)
+    texts = [TRACE, "knob=net.core.somaxconn value=4096", "short", TRACE.upper()]
+    assert np.allclose(e.embed(texts), np.vstack([e.embed([t]) for t in texts]))
+
+
+def test_shared_key_value_tokens_bring_traces_closer():
+    e = HashingEmbedder(128)
+    q, same_knob, other = e.embed(["knob=vm.swappiness",
+                                   "workload=web knob=vm.swappiness value=60",
+                                   "workload=web knob=net.core.somaxconn value=60"])
+    assert q @ same_knob > q @ other
+
+
+def test_cache_is_bounded_lru_and_returns_copies():
+    e = HashingEmbedder(32, cache_size=2)
+    first = e.embed(["a", "b"])
+    assert (e.hits, e.misses) == (0, 2)
+    first[0] = 0  # callers may scribble on their result
+    assert np.array_equal(e.embed(["a"])[0], HashingEmbedder(32, cache_size=0).embed(["a"])[0])
+    assert e.hits == 1
+    e.embed(["c"])  # evicts "b", the least recently used
+    e.embed(["b"])
+    assert (e.hits, e.misses) == (1, 4) and len(e._cache) == 2
+    assert e.version == "hash-ngram-v1:32:3,4,5"
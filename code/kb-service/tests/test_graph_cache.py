@@ -0,0 +1,98 @@
+import time
+
+import numpy as np
+
+from graph_cache import GraphCache
+
+ROWS = [
+    ("a", "b", "DEPENDS_ON", 1, 0.9, 3, 100.0),
+    ("a", "c", "CONFLICTS_WITH", -1, 0.5, 1, 100.0),
+    ("a", "d", "DEPENDS_ON", 1, None, 0, None),  # no weight: never returned
+    ("b", "c", "DEPENDS_ON", 1, 0.7, 2, 100.0),
+    ("c", "e", "DEPENDS_ON", 1, 0.4, 1, 100.0),
+    ("x", "y", "UNKNOWN", 1, 1.0, 1, 100.0),      # foreign label: skipped
+]
+
+
+def _cache(capacity=1024):
+    g = GraphCache(["DEPENDS_ON", "CONFLICTS_WITH"], capacity=capacity)
+    g.load(ROWS, version=5)
+    return g
+
+
+def test_load_skips_foreign_labels_and_marks_fresh():
+    g = _cache()
+    assert len(g) == 5 and g.version == 5 and g.loads == 1
+    assert g.fresh(5, ttl_s=60) and not g.fresh(6, ttl_s=60)
+    g.loaded_at = time.time() - 120
+    assert not g.fresh(5, ttl_s=60) and g.fresh(5, ttl_s=0)
+
+
+def test_neighborhoods_sorted_filtered_and_decayed():
+    g = _cache()
+    out = g.neighborhoods(["a", "zz"])
+    assert out["zz"] == []
+    assert [(e["neighbor"], e["edge_type"], e["sign"]) for e in out["a"]] == [
+        ("b", "depends_on", 1), ("c", "conflicts_with", -1)]
+    assert out["a"][0]["evidence"] == 3
+    only = g.neighborhoods(["a"], label="DEPENDS_ON", min_weight=0.6)["a"]
+    assert [e["neighbor"] for e in only] == ["b"]
+    halved = g.neighborhoods(["a"], decay=lambda w, t: w * 0.5)["a"]
+    assert [e["weight"] for e in halved] == [0.45, 0.25]
+
+
+def test_patch_in_sequence_updates_and_extends():
+    g = _cache(capacity=1)  # forces the column arrays to grow
+    assert g.patch(("a", "b", "DEPENDS_ON", 1, 0.1, 4, 200.0), version=6)
+    assert g.patch(("e", "a", "DEPENDS_ON", 1, 0.8, 1, 200.0), version=7)
+    assert len(g) == 6 and g.version == 7 and g.patches == 2
+    a = {e["neighbor"]: e for e in g.neighborhoods(["a"])["a"]}
+    assert a["b"]["weight"] == 0.1 and a["b"]["evidence"] == 4
+    assert g.reachable("e", depth=1) == ["a"]  # CSR rebuilt after the insert
+
+
+def test_missed_write_and_invalidate_drop_the_version():
+    g = _cache()
+    assert not g.patch(("a", "e", "DEPENDS_ON", 1, 0.3, 1, 0.0), version=7)
+    assert g.version == -1 and len(g) == 5 and not g.fresh(5, ttl_s=0)
+    g.load(ROWS, version=7)
+    g.invalidate()
+    assert g.version == -1 and g.loads == 2
+
+
+def test_reachable_and_shortest_path():
+    g = _cache()
+    assert g.reachable("a", depth=1) == ["b", "c", "d"]
+    assert g.reachable("a", depth=2) == ["b", "c", "d", "e"]
+    assert g.reachable("nope") == []
+    assert g.shortest_path("a", "e") == (["a", "c", "e"], ["conflicts_with", "depends_on"])
+    assert g.shortest_path("a", "e", max_hops=1) is None
+    assert g.shortest_path("e", "a") is None and g.shortest_path("a", "nope") is None
+
+
+def test_load_matches_naive_scan():
+    rng = np.random.default_rng(0)
+    names = [f"k{i}" for i in range(30)]
+    rows = [(names[rng.integers(30)], names[rng.integers(30)],
+             "DEPENDS_ON", 1, float(rng.random()), 1, 0.0) for _ in range(300)]
+    g = GraphCache(["DEPENDS_ON"])
+    g.load(rows, version=0)
+    latest = {(f, t): w for f, t, _, _, w, _, _ in rows}  # last write wins
+    assert len(g) == len(latest)
+    for k in names:
+        want = sorted(round(w, 4) for (f, _), w in latest.items() if f == k)
+        got = sorted(e["weight"] for e in g.neighborhoods([k])[k])
+        assert got == want
+
+
+def test_out_of_order_patches_keep_the_later_write():
+    g = _cache()
+    a = ("a", "b", "DEPENDS_ON", 1, 0.8, 4, 200.0)   # committed first
+    b = ("a", "b", "DEPENDS_ON", -1, 0.6, 5, 201.0)  # committed second
+    assert g.patch(b, version=6) and g.patch(a, version=7)
+    assert g.version == 7 and g.fresh(7, ttl_s=0)
+    e = g.neighborhoods(["a"], label="DEPENDS_ON")["a"][0]
+    assert (e["neighbor"], e["sign"], e["weight"], e["evidence"]) == ("b", -1, 0.6, 5)
+    # equal evidence: the later stamp wins either way round
+    assert g.patch(("a", "b", "DEPENDS_ON", 1, 0.2, 5, 200.5), version=8)
+    assert g.neighborhoods(["a"], label="DEPENDS_ON")["a"][0]["weight"] == 0.6
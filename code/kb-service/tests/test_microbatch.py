@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from microbatch import MicroBatcher
+
+
+def _submit_all(mb, items, key="k"):
+    results, errors = {}, {}
+
+    def run(x):
+        try:
+            results[x] = mb.submit(key, x)
+        except Exception as e:
+            errors[x] = e
+
+    ths = [threading.Thread(target=run, args=(x,)) for x in items]
+    for th in ths:
+        th.start()
+    for th in ths:
+        th.join()
+    return results, errors
+
+
+def test_concurrent_submits_are_batched_and_get_their_own_result():
+    sizes = []
+
+    def fn(key, items):
+        sizes.append(len(items))
+        time.sleep(0.01)
+        return [x * 10 for x in items]
+
+    mb = MicroBatcher(fn, window_s=0.02, max_batch=8)
+    results, errors = _submit_all(mb, range(40))
+    assert not errors and results == {x: x * 10 for x in range(40)}
+    assert max(sizes) <= 8 and len(sizes) < 40
+    assert mb.items == 40 and mb.batches == len(sizes)
+
+
+def test_keys_are_never_mixed_in_one_batch():
+    seen = []
+    mb = MicroBatcher(lambda key, items: seen.append((key, list(items))) or items,
+                      window_s=0.02)
+    ths = [threading.Thread(target=_submit_all, args=(mb, [f"{key}{i}" for i in range(5)], key))
+           for key in ("a", "b")]
+    for th in ths:
+        th.start()
+    for th in ths:
+        th.join()
+    assert sum(len(items) for _, items in seen) == 10
+    assert all(x.startswith(key) for key, items in seen for x in items)
+
+
+def test_batch_error_reaches_every_caller_and_batcher_recovers():
+    calls = []
+
+    def fn(key, items):
+        calls.append(list(items))
+        if len(calls) == 1:
+            time.sleep(0.05)
+            raise RuntimeError("index unavailable")
+        return items
+
+    mb = MicroBatcher(fn, window_s=0.02)
+    results, errors = _submit_all(mb, range(6))
+    failed = set(calls[0])
+    assert set(errors) == failed and all(str(e) == "index unavailable" for e in errors.values())
+    assert set(results) == set(range(6)) - failed
+    assert mb.submit("k", 99) == 99  # the key's queue was released
+
+
+def test_single_caller_gets_the_exception():
+    def fn(key, items):
+        raise ValueError("bad query")
+
+    mb = MicroBatcher(fn, window_s=0)
+    with pytest.raises(ValueError, match="bad query"):
+        mb.submit("k", 1)
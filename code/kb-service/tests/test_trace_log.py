@@ -0,0 +1,101 @@
+import threading
+
+import numpy as np
+import pytest
+
+from trace_log import TraceLog
+
+DIM = 4
+
+
+def _vec(i):
+    return np.full(DIM, i, np.float32)
+
+
+def _write(log, ids):
+    for i in ids:
+        log.wait(log.append(i, _vec(i), f"trace {i}"))
+
+
+def test_replay_returns_what_was_appended(tmp_path):
+    log = TraceLog(tmp_path)
+    list(log.replay())
+    log.open(0)
+    _write(log, range(5))
+    log.close()
+    got = list(TraceLog(tmp_path).replay())
+    assert [r for r, _, _ in got] == list(range(5))
+    assert all(np.array_equal(v, _vec(r)) and t == f"trace {r}" for r, v, t in got)
+
+
+def test_torn_tail_is_truncated_and_later_segments_dropped(tmp_path):
+    log = TraceLog(tmp_path)
+    log.open(0)
+    _write(log, range(3))
+    log.rotate(3)
+    _write(log, range(3, 5))
+    log.close()
+    first, second = log.segments()
+    size = first.stat().st_size
+    with first.open("r+b") as f:  # tear the last record of the first segment
+        f.truncate(size - 3)
+    got = [r for r, _, _ in TraceLog(tmp_path).replay()]
+    assert got == [0, 1]
+    assert first.stat().st_size == size * 2 // 3 and not second.exists()
+
+
+def test_corrupt_record_ends_the_log(tmp_path):
+    log = TraceLog(tmp_path)
+    log.open(0)
+    _write(log, range(3))
+    log.close()
+    (path,) = log.segments()
+    data = bytearray(path.read_bytes())
+    data[len(data) // 2] ^= 0xFF  # inside record 1
+    path.write_bytes(bytes(data))
+    assert [r for r, _, _ in TraceLog(tmp_path).replay()] == [0]
+
+
+def test_concurrent_appends_are_all_durable(tmp_path):
+    log = TraceLog(tmp_path)
+    log.open(0)
+    ths = [threading.Thread(target=_write, args=(log, range(i * 50, i * 50 + 50)))
+           for i in range(8)]
+    for th in ths:
+        th.start()
+    for th in ths:
+        th.join()
+    log.close()
+    assert log.durable == 400
+    assert sorted(r for r, _, _ in TraceLog(tmp_path).replay()) == list(range(400))
+
+
+def test_drop_before_keeps_uncovered_segments(tmp_path):
+    log = TraceLog(tmp_path)
+    log.open(0)
+    _write(log, range(2))
+    log.rotate(2)
+    _write(log, range(2, 4))
+    log.rotate(4)
+    log.drop_before(2)
+    assert [p.name for p in log.segments()] == ["wal-0000000000000002.log",
+                                                "wal-0000000000000004.log"]
+    log.close()
+
+
+def test_write_failure_reaches_waiters_and_rotate(tmp_path):
+    log = TraceLog(tmp_path)
+    log.open(0)
+
+    class _Full:
+        name = str(tmp_path / "wal-0000000000000000.log")
+
+        def write(self, data):
+            raise OSError(28, "No space left on device")
+
+    log._f = _Full()
+    with pytest.raises(OSError):
+        log.wait(log.append(0, _vec(0), "lost"))
+    with pytest.raises(OSError):
+        log.rotate(1)
+    assert log.durable == 0
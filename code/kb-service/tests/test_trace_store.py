@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from trace_store import TraceStore, parse_fields
+
+TRACE = ("workload={w} server=s1 knob={k} value=10 delta_p95={d} anomaly={a}")
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = TraceStore(tmp_path / "traces.db")
+    yield s
+    s.close()
+
+
+def test_parse_fields():
+    f = parse_fields("workload=oltp knob=vm.swappiness value=None delta_p95=-3.5 "
+                     "anomaly=0.7 junk")
+    assert f == {"workload": "oltp", "server": None, "knob": "vm.swappiness",
+                 "value": None, "delta_p95": -3.5, "anomaly": 1}
+    assert parse_fields("delta_p95=x anomaly=False")["delta_p95"] is None
+    assert parse_fields("anomaly=False")["anomaly"] == 0
+
+
+def test_texts_chunks_large_id_sets(store):
+    store.put_many((i, f"t{i}", float(i)) for i in range(3000))
+    got = store.texts(range(0, 80000, 2))  # beyond SQLite's 32766 bound variables
+    assert len(got) == 1500 and got[2998] == "t2998"
+    assert store.texts([]) == {}
+
+
+def test_put_many_replace_and_ignore(store):
+    store.put(0, "old", 1.0)
+    store.put_many([(0, "new", 2.0), (1, "one", 2.0)], replace=False)
+    assert store.texts([0, 1]) == {0: "old", 1: "one"}
+    store.put_many([(0, "new", 3.0)])
+    assert store.texts([0]) == {0: "new"}
+    with pytest.raises(sqlite3.IntegrityError):
+        store.put_many([(2, "ok", 0.0), ("x", "bad id", 0.0)])  # whole batch rolls back
+    assert store.count() == 2
+
+
+def test_query_filters_newest_first(store):
+    rows = [(0, TRACE.format(w="oltp", k="a", d=-5.0, a=False), 1.0),
+            (1, TRACE.format(w="oltp", k="b", d=2.0, a=True), 2.0),
+            (2, TRACE.format(w="olap", k="a", d=-1.0, a=False), 3.0)]
+    store.put_many(rows)
+    assert [r["id"] for r in store.query(knob="a")] == [2, 0]
+    assert [r["id"] for r in store.query(workload="oltp", max_delta_p95=0)] == [0]
+    assert [r["id"] for r in store.query(anomaly=True)] == [1]
+    assert [r["id"] for r in store.query(since=2.0, limit=1)] == [2]
+    assert store.query(knob="a")[0]["delta_p95"] == -1.0
+
+
+def test_scan_truncate_and_info_survive_reopen(tmp_path):
+    s = TraceStore(tmp_path / "t.db")
+    s.put_many((i, f"t{i}", None) for i in range(10))
+    assert s.truncate(7) == 3
+    s.set_info("embedder", "v1")
+    s.close()
+    s = TraceStore(tmp_path / "t.db")
+    assert [tuple(r) for r in s.scan(5, 100)] == [(5, "t5"), (6, "t6")]
+    assert s.get_info("embedder") == "v1" and s.get_info("missing") is None
+    s.close()
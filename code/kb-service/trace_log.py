@@ -0,0 +1,178 @@
+"""
+trace_log.py — append-only write-ahead log of FAISS trace inserts.
+
+Each insert is one record (FAISS id, vector, text) appended to the current
+segment file; a background flusher writes whatever has accumulated in one
+write + fsync (group commit), so concurrent inserts share a sync.  The
+checkpoint of the index covers every id below some n: `rotate(n)` starts a
+new segment at id n, and once the checkpoint is on disk `drop_before(n)`
+deletes the segments it covers.  On startup the caller loads the checkpoint
+and applies `replay()`.
+
+Record layout (little-endian):
+    u32 body length | u32 crc32(body) | body = i64 id | u32 text bytes |
+    f32[dim] vector | utf-8 text
+A torn or corrupt record ends the log; replay truncates it away.
+"""
+from __future__ import annotations
+
+import os
+import struct
+import threading
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+_HEAD = struct.Struct("<II")
+_BODY = struct.Struct("<qI")
+
+
+def _segment_start(path: Path) -> int:
+    return int(path.stem.split("-")[1])
+
+
+class TraceLog:
+    def __init__(self, directory, sync: bool = True):
+        self.dir = Path(directory)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self.sync = sync
+        self._cond = threading.Condition()
+        self._buf = []
+        self._seq = self._durable = 0  # records appended / made durable
+        self._writing = False
+        self._error = None
+        self._closed = False
+        self._f = None
+        self.size = 0  # bytes in all live segments
+        self.syncs = 0
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+
+    def segments(self) -> list:
+        return sorted(self.dir.glob("wal-*.log"), key=_segment_start)
+
+    # ------------------------------------------------------------------ #
+    # Startup.
+    # ------------------------------------------------------------------ #
+    def replay(self):
+        """Yield (id, vector, text) of every intact record in order; a torn
+        tail is truncated.  Call before `open`."""
+        segs = self.segments()
+        for i, path in enumerate(segs):
+            with path.open("r+b") as f:
+                data = f.read()
+                pos = 0
+                while pos + _HEAD.size <= len(data):
+                    length, crc = _HEAD.unpack_from(data, pos)
+                    body = data[pos + _HEAD.size:pos + _HEAD.size + length]
+                    if len(body) < length or zlib.crc32(body) != crc:
+                        break
+                    rid, n_text = _BODY.unpack_from(body)
+                    vec = np.frombuffer(body, np.float32,
+                                        (length - _BODY.size - n_text) // 4, _BODY.size)
+                    yield rid, vec, body[length - n_text:].decode()
+                    pos += _HEAD.size + length
+                if pos < len(data):
+                    f.truncate(pos)
+                    for later in segs[i + 1:]:  # unreliable after a torn record
+                        later.unlink()
+                    return
+
+    def open(self, start_id: int):
+        """Append to the last segment, or start one at `start_id`."""
+        segs = self.segments()
+        path = segs[-1] if segs else self.dir / f"wal-{start_id:016d}.log"
+        self._f = path.open("ab")
+        self.size = sum(p.stat().st_size for p in self.segments())
+        self._flusher.start()
+
+    # ------------------------------------------------------------------ #
+    # Appends.
+    # ------------------------------------------------------------------ #
+    def append(self, rid: int, vector: np.ndarray, text: str) -> int:
+        """Queue one record; returns the sequence number to `wait` on."""
+        raw = text.encode()
+        body = (_BODY.pack(rid, len(raw)) + np.ascontiguousarray(vector, np.float32).tobytes()
+                + raw)
+        with self._cond:
+            self._buf.append(_HEAD.pack(len(body), zlib.crc32(body)) + body)
+            self._seq += 1
+            self._cond.notify_all()
+            return self._seq
+
+    @property
+    def durable(self) -> int:
+        """Sequence number of the last record on disk."""
+        return self._durable
+
+    def wait(self, seq: int):
+        """Block until record `seq` is on disk (fsync'd unless sync is off)."""
+        with self._cond:
+            while self._durable < seq and self._error is None:
+                self._cond.wait()
+            if self._durable < seq:
+                raise self._error
+
+    def _flush_loop(self):
+        while True:
+            with self._cond:
+                while not self._buf and not self._closed:
+                    self._cond.wait()
+                if not self._buf:
+                    return
+                batch, self._buf = self._buf, []
+                seq, f = self._seq, self._f
+                self._writing = True
+            try:
+                f.write(b"".join(batch))
+                f.flush()
+                if self.sync:
+                    os.fsync(f.fileno())
+            except OSError as e:
+                with self._cond:
+                    self._error, self._writing = e, False
+                    self._cond.notify_all()
+                return
+            with self._cond:
+                self._durable, self._writing = seq, False
+                self.syncs += 1
+                self.size += sum(map(len, batch))
+                self._cond.notify_all()
+
+    def _drain(self):
+        while (self._buf or self._writing) and self._error is None:
+            self._cond.wait()
+
+    # ------------------------------------------------------------------ #
+    # Checkpoints.
+    # ------------------------------------------------------------------ #
+    def rotate(self, start_id: int):
+        """Flush, then send later appends to a new segment starting at
+        `start_id`.  Call with inserts paused so ids stay in order.  Raises
+        the flusher's error if queued records could not be written."""
+        with self._cond:
+            self._drain()
+            if self._error is not None:
+                raise self._error
+            path = self.dir / f"wal-{start_id:016d}.log"
+            if Path(self._f.name) != path:
+                self._f.close()
+                self._f = path.open("ab")
+
+    def drop_before(self, start_id: int):
+        """Delete segments holding only ids below `start_id`."""
+        segs = self.segments()
+        for path, nxt in zip(segs, segs[1:]):  # a segment ends where the next starts
+            if _segment_start(nxt) <= start_id:
+                freed = path.stat().st_size
+                path.unlink()
+                with self._cond:
+                    self.size -= freed
+
+    def close(self):
+        with self._cond:
+            self._drain()
+            self._closed = True
+            self._cond.notify_all()
+        if self._f is not None:
+            self._f.close()
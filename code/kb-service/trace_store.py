@@ -0,0 +1,150 @@
+"""
+trace_store.py — SQLite metadata store for the FAISS trace index.
+
+One row per indexed trace, keyed by its FAISS id, holding the text and the
+structured fields parsed from its `key=value` tokens (workload, server,
+knob, value, delta_p95, anomaly) plus the insert time.  Search results are
+joined by primary key, so a top-k lookup reads k rows, and memory does not
+grow with the corpus.  The database runs in WAL mode with synchronous=NORMAL:
+durability of inserts comes from the trace log, whose replay restores any
+row lost with the last SQLite transactions.
+"""
+from __future__ import annotations
+
+import sqlite3
+import threading
+
+FIELDS = ("workload", "server", "knob", "value", "delta_p95", "anomaly")
+_IN_CHUNK = 500  # ids per IN (...) lookup
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS traces (
+    id INTEGER PRIMARY KEY, ts REAL, workload TEXT, server TEXT, knob TEXT,
+    value TEXT, delta_p95 REAL, anomaly INTEGER, text TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS traces_workload ON traces (workload, ts);
+CREATE INDEX IF NOT EXISTS traces_server ON traces (server, ts);
+CREATE INDEX IF NOT EXISTS traces_knob ON traces (knob, ts);
+CREATE INDEX IF NOT EXISTS traces_ts ON traces (ts);
+CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def parse_fields(text: str) -> dict:
+    """Structured fields of a trace text; absent or "None" values are None."""
+    out = dict.fromkeys(FIELDS)
+    for tok in text.split():
+        k, sep, v = tok.partition("=")
+        if sep and k in out and v != "None":
+            out[k] = v
+    if out["delta_p95"] is not None:
+        try:
+            out["delta_p95"] = float(out["delta_p95"])
+        except ValueError:
+            out["delta_p95"] = None
+    a = out["anomaly"]
+    if a is not None:  # a bool, or a score where nonzero means anomalous
+        try:
+            out["anomaly"] = {"true": 1, "false": 0}.get(a.lower(), None)
+            if out["anomaly"] is None:
+                out["anomaly"] = int(float(a) != 0)
+        except ValueError:
+            out["anomaly"] = None
+    return out
+
+
+class TraceStore:
+    def __init__(self, path):
+        self._db = sqlite3.connect(str(path), check_same_thread=False,
+                                   isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript(_SCHEMA)
+
+    @staticmethod
+    def _row(rid: int, text: str, ts) -> tuple:
+        f = parse_fields(text)
+        return (rid, ts, *(f[k] for k in FIELDS), text)
+
+    def put_many(self, rows, replace: bool = True):
+        """Store (id, text, ts) rows in one transaction; with `replace` off,
+        ids already present are kept."""
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.executemany(f"{verb} INTO traces VALUES (?,?,?,?,?,?,?,?,?)",
+                                     (self._row(*r) for r in rows))
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def put(self, rid: int, text: str, ts: float = None):
+        self.put_many([(rid, text, ts)])
+
+    def texts(self, ids) -> dict:
+        """{id: text} for the given ids (missing ids are absent), looked up
+        _IN_CHUNK at a time to stay under SQLite's bound-variable limit."""
+        ids = [int(i) for i in ids]
+        out = {}
+        with self._lock:
+            for i in range(0, len(ids), _IN_CHUNK):
+                chunk = ids[i:i + _IN_CHUNK]
+                out.update(self._db.execute(f"SELECT id, text FROM traces WHERE id IN "
+                                            f"({','.join('?' * len(chunk))})", chunk))
+        return out
+
+    def scan(self, start: int, end: int) -> list:
+        """[(id, text)] with start <= id < end, by id."""
+        with self._lock:
+            return self._db.execute("SELECT id, text FROM traces WHERE id >= ? AND id < ? "
+                                    "ORDER BY id", (start, end)).fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT count(*) FROM traces").fetchone()[0]
+
+    def truncate(self, n: int) -> int:
+        """Drop rows with id >= n (metadata of vectors that never made it
+        into the index); returns how many."""
+        with self._lock:
+            return self._db.execute("DELETE FROM traces WHERE id >= ?", (n,)).rowcount
+
+    def query(self, workload=None, server=None, knob=None, min_delta_p95=None,
+              max_delta_p95=None, anomaly=None, since=None, until=None,
+              limit: int = 100) -> list:
+        """Traces matching all given filters, newest first."""
+        where, args = [], []
+        for col, v in (("workload", workload), ("server", server), ("knob", knob)):
+            if v is not None:
+                where.append(f"{col} = ?")
+                args.append(v)
+        for cond, v in (("delta_p95 >= ?", min_delta_p95), ("delta_p95 <= ?", max_delta_p95),
+                        ("ts >= ?", since), ("ts <= ?", until),
+                        ("anomaly = ?", None if anomaly is None else int(anomaly))):
+            if v is not None:
+                where.append(cond)
+                args.append(v)
+        sql = "SELECT * FROM traces"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY ts DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db.execute(sql, (*args, int(limit))).fetchall()
+        return [dict(r) for r in rows]
+
+    def get_info(self, key: str):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM info WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_info(self, key: str, value: str):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO info VALUES (?, ?)", (key, value))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
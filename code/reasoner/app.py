@@ -64,14 +64,26 @@ async def fetch_json(client, method, url, **kwargs):
     return r.json()
 
 
-async def typed_neighborhood(client, knob):
+async def typed_neighborhoods(client, knobs):
+    """Decayed neighborhoods of all `knobs` in one KB round trip."""
     try:
-        r = await client.get(f"{KB_URL}/kb/typed_neighborhood",
-                             params={"knob": knob, "decayed": True})
+        r = await client.post(f"{KB_URL}/kb/typed_neighborhoods",
+                              json={"knobs": knobs, "decayed": True})
         r.raise_for_status()
-        return r.json().get("edges", [])
+        return r.json().get("neighborhoods", {})
     except Exception:
-        return []
+        return {}
+
+
+async def syscall_profile(client):
+    """Top syscalls / processes and the io-vs-sched syscall mix, which tells
+    I/O-bound from scheduler-bound load when choosing knobs."""
+    try:
+        r = await client.get(f"{TELEMETRY_URL}/topk", params={"k": 5})
+        r.raise_for_status()
+        return r.json()
+    except Exception:
+        return {}
 
 
 async def rag_context():
@@ -82,15 +94,15 @@ async def rag_context():
         q = (f"p95:{m.get('p95_latency_ms',0):.1f} "
              f"anomaly:{m.get('anomaly_rate',0):.3f} "
              f"load:{m.get('cpu_load_1',0):.2f}")
-        nn = await fetch_json(client, "POST", f"{KB_URL}/kb/nn_search",
-                              json={"query": q, "k": 5})
-        graph = {}
-        for knob in CANDIDATE_KNOBS:
-            edges = await typed_neighborhood(client, knob)
-            if edges:
-                graph[knob] = edges
-    return {"telemetry": tele, "retrieved_traces": nn.get("items", []),
-            "dependency_graph": graph}
+        nn = await fetch_json(client, "POST", f"{KB_URL}/kb/nn_search_batch",
+                              json={"queries": [{"query": q, "k": 5}]})
+        results = nn.get("results", [])
+        graph = {knob: edges for knob, edges in
+                 (await typed_neighborhoods(client, CANDIDATE_KNOBS)).items() if edges}
+        profile = await syscall_profile(client)
+    return {"telemetry": tele,
+            "retrieved_traces": results[0].get("items", []) if results else [],
+            "dependency_graph": graph, "syscall_profile": profile}
 
 
 # --------------------------------------------------------------------------- #
@@ -7,6 +7,8 @@ Responsibilities:
     by cost-based selection C(tau) (see safety_core.py).
   * Roll out survivors through canary -> ramp -> full stages, each guarded by an
     SLO check on live p95; auto-rollback on breach.
+  * Raise the telemetry agent's sampling rate for the duration of a rollout
+    (a renewable lease), so a breach is caught within a fraction of a second.
   * Detect drift (ADWIN over u) and recalibrate tau online.
   * Emit an OptimizationTrace (JSONL) capturing every gate/stage/rollback for
     auditability and for offline re-derivation of the paper's tau-sweep.
@@ -18,6 +20,7 @@ import glob
 import statistics
 import threading
 import asyncio
+from collections import deque
 
 import httpx
 from fastapi import FastAPI, Body
@@ -40,7 +43,14 @@ CAL_SEED_PATH = os.environ.get("CAL_SEED", "/app/data/calibration_seed.json")
 TELEMETRY_URL = os.environ.get("TELEMETRY_URL", "http://telemetry-agent:8000")
 AUTO_POLL = os.environ.get("AUTO_POLL", "on").lower()
 POLL_INTERVAL_SEC = int(os.environ.get("POLL_INTERVAL_SEC", "10"))
+# subscribe to telemetry-agent /stream so a breach is seen within one sampling
+# tick; the poller stays as the fallback when the stream is unavailable
+TELEMETRY_STREAM = os.environ.get("TELEMETRY_STREAM", "on").lower()
 ALERT_WEBHOOK = os.environ.get("ALERT_WEBHOOK", "")
+# while a rollout is active, lease this telemetry-agent sampling rate (0 = off)
+ROLLOUT_SAMPLING_HZ = float(os.environ.get("ROLLOUT_SAMPLING_HZ", "20"))
+ROLLOUT_SAMPLING_TTL_SEC = float(os.environ.get("ROLLOUT_SAMPLING_TTL_SEC", "30"))
+STATUS_HISTORY = int(os.environ.get("STATUS_HISTORY", "256"))  # /status entries kept
 
 COST = {"c_fn": float(os.environ.get("C_FN", "4.0")),
         "c_fp": float(os.environ.get("C_FP", "6.0")),
@@ -52,7 +62,8 @@ calibrator = SlidingCalibrator(alpha=ALPHA, window=CAL_WINDOW,
 
 state = {
     "active": False, "rec_id": None, "percent": 0, "stage": None,
-    "history": [], "vetoed": [], "tau": calibrator.tau,
+    "history": deque(maxlen=STATUS_HISTORY), "vetoed": deque(maxlen=STATUS_HISTORY),
+    "tau": calibrator.tau,
 }
 
 app = FastAPI(title="safety-runtime", version="1.0.0")
@@ -163,6 +174,7 @@ def apply(body: dict = Body(...)):
                                  "p95": p95})
         alert(f"SemantOS: canary started for {state['rec_id']} "
               f"({state['percent']}%, p95={p95}ms, tau={tau:.3f})")
+        _sampling_wake.set()
     state["vetoed"].extend(vetoed)
     return JSONResponse({"applied": applied, "vetoed": vetoed, "tau": tau})
 
@@ -182,6 +194,7 @@ def rollout_advance():
         alert(f"SemantOS: rollout halted at {state['percent']}% "
               f"(p95={p95} > {SLO_MAX_P95})")
         state.update(active=False, percent=0, stage=None)
+        _sampling_wake.set()
         return {"ok": True, "stopped": True, "p95": p95}
     if idx < len(ROLL) - 1:
         state["percent"] = ROLL[idx + 1]
@@ -193,6 +206,7 @@ def rollout_advance():
         return {"ok": True, "advanced_to": state["percent"], "stage": state["stage"]}
     _trace("rollout_complete", {"rec_id": state["rec_id"], "p95": p95})
     state.update(active=False, percent=100, stage="full")
+    _sampling_wake.set()
     alert(f"SemantOS: rollout completed for {state['rec_id']}")
     return {"ok": True, "completed": True}
 
@@ -204,6 +218,7 @@ def rollback():
                             "percent": state["percent"]})
         alert(f"SemantOS: manual rollback at {state['percent']}%")
     state.update(active=False, percent=0, stage=None)
+    _sampling_wake.set()
     return {"ok": True, "rolled_back": True}
 
 
@@ -223,39 +238,122 @@ def log_outcome(rec_id: str = Body(...), u: float = Body(...),
 
 @app.get("/status")
 def status():
-    return {**state, "calibration": calibrator.metrics(),
-            "recalibrations": calibrator.recalibrations}
+    return {**state, "history": list(state["history"]), "vetoed": list(state["vetoed"]),
+            "calibration": calibrator.metrics(),
+            "recalibrations": calibrator.recalibrations,
+            "sampling_lease": _sampling["lease_id"]}
 
 
 # --------------------------------------------------------------------------- #
-# Background SLO poller with auto-rollback.
+# Rollout sampling lease.  While a rollout is active the telemetry agent is
+# asked to sample at ROLLOUT_SAMPLING_HZ; the lease is renewed every third of
+# its TTL and released when the rollout ends, and simply lapses if this
+# process dies mid-rollout.
 # --------------------------------------------------------------------------- #
+_sampling = {"lease_id": None}
+_sampling_wake = threading.Event()
+
+
+def _sync_sampling(client: httpx.Client):
+    base = f"{TELEMETRY_URL}/sampling/lease"
+    lid = _sampling["lease_id"]
+    if state["active"]:
+        if lid is not None:
+            r = client.put(f"{base}/{lid}", json={"ttl_s": ROLLOUT_SAMPLING_TTL_SEC})
+            if r.status_code != 404:  # 404: lapsed, take a new one
+                r.raise_for_status()
+                return
+        r = client.post(base, json={"hz": ROLLOUT_SAMPLING_HZ,
+                                    "ttl_s": ROLLOUT_SAMPLING_TTL_SEC,
+                                    "holder": f"safety-runtime:{state['rec_id']}"})
+        r.raise_for_status()
+        _sampling["lease_id"] = r.json()["lease_id"]
+    elif lid is not None:
+        _sampling["lease_id"] = None
+        client.delete(f"{base}/{lid}")
+
+
+def sampling_lease_keeper():
+    with httpx.Client(timeout=5) as client:
+        while True:
+            _sampling_wake.wait(ROLLOUT_SAMPLING_TTL_SEC / 3)
+            _sampling_wake.clear()
+            try:
+                _sync_sampling(client)
+            except Exception:
+                pass
+
+
+# --------------------------------------------------------------------------- #
+# Background SLO guards with auto-rollback: a push subscriber on the telemetry
+# stream and a periodic poller as fallback.
+# --------------------------------------------------------------------------- #
+_guard_lock = threading.Lock()
+_stream_live = threading.Event()
+
+
+def _guard_slo(p95: float, source: str):
+    with _guard_lock:
+        if not state["active"]:
+            return
+        ok = p95 <= SLO_MAX_P95 or p95 == 0.0
+        last = state["history"][-1] if state["history"] else None
+        if not (ok and last and last["ok"] and last["percent"] == state["percent"]):
+            # breaches and changes only: the stream checks up to 20 times a second
+            state["history"].append({"ts": time.time(), "percent": state["percent"],
+                                     "stage": state["stage"], "p95": p95, "ok": ok,
+                                     "source": source})
+        if not ok:
+            _trace("rollback", {"rec_id": state["rec_id"],
+                                "reason": "auto_slo_breach", "source": source,
+                                "percent": state["percent"], "p95": p95})
+            alert(f"SemantOS: AUTO-ROLLBACK at {state['percent']}% "
+                  f"(p95={p95} > {SLO_MAX_P95})")
+            state.update(active=False, percent=0, stage=None)
+            _sampling_wake.set()
+
+
 def poller():
     loop = asyncio.new_event_loop()
     asyncio.set_event_loop(loop)
     while True:
         try:
             time.sleep(POLL_INTERVAL_SEC)
-            if not state["active"] or AUTO_POLL != "on":
+            if not state["active"] or AUTO_POLL != "on" or _stream_live.is_set():
                 continue
             p95 = loop.run_until_complete(p95_from_telemetry()) or \
                 latest_p95_from_outputs()
-            ok = p95 <= SLO_MAX_P95 or p95 == 0.0
-            state["history"].append({"ts": time.time(), "percent": state["percent"],
-                                     "stage": state["stage"], "p95": p95, "ok": ok})
-            if not ok:
-                _trace("rollback", {"rec_id": state["rec_id"],
-                                    "reason": "auto_slo_breach",
-                                    "percent": state["percent"], "p95": p95})
-                alert(f"SemantOS: AUTO-ROLLBACK at {state['percent']}% "
-                      f"(p95={p95} > {SLO_MAX_P95})")
-                state.update(active=False, percent=0, stage=None)
+            _guard_slo(p95, "poll")
+        except Exception:
+            pass
+
+
+def stream_watcher():
+    """Consume telemetry-agent SSE snapshots; check the SLO on every tick."""
+    while True:
+        try:
+            with httpx.Client(timeout=httpx.Timeout(5.0, read=60.0)) as client:
+                with client.stream("GET", f"{TELEMETRY_URL}/stream") as r:
+                    r.raise_for_status()
+                    _stream_live.set()
+                    for line in r.iter_lines():
+                        if not line.startswith("data:") or not state["active"]:
+                            continue
+                        snap = json.loads(line[5:])
+                        p95 = float(snap.get("metrics", {}).get("p95_latency_ms", 0.0))
+                        _guard_slo(p95, "stream")
         except Exception:
             pass
+        _stream_live.clear()
+        time.sleep(POLL_INTERVAL_SEC)
 
 
 @app.on_event("startup")
 def startup():
     _seed_calibration()
+    if ROLLOUT_SAMPLING_HZ > 0:
+        threading.Thread(target=sampling_lease_keeper, daemon=True).start()
     if AUTO_POLL == "on":
         threading.Thread(target=poller, daemon=True).start()
+        if TELEMETRY_STREAM == "on":
+            threading.Thread(target=stream_watcher, daemon=True).start()
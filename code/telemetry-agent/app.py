@@ -1,34 +1,164 @@
-import os, time, json, threading, statistics, psutil
-from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+import os, math, time, json, socket, logging, threading, asyncio, psutil
+import urllib.request
+from collections import namedtuple
+from fastapi import FastAPI, Body, Query, HTTPException
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+import numpy as np
+
+from collectors import (GAUGES, BccCollector, FixtureCollector, ProcfsCollector,
+                        Tick, parse_intervals)
+from attribution import (CGROUP_COLUMNS, CPU_COLUMNS, AttributionTable,
+                         CgroupCollector)
+from exposition import (CONTENT_TYPE as OPENMETRICS_TYPE, MetricsPage,
+                        counter_text, gauge_text, histogram_text)
+from fingerprint import FEATURE_NAMES, FINGERPRINT_VERSION, fingerprint
+from replay import Replayer
+from sampling import SamplingController
+from selfstats import (BpfProgStats, SelfUsage, Timing, bpf_stats_enabled,
+                       enable_bpf_stats)
+from topk import (MAX_SYSCALL_ID, PROCESS_COLUMNS, SYSCALL_CLASSES,
+                  ProcessCollector, SpaceSaving, syscall_info)
+from tsdb import History, parse_tiers
+from telemetry_core import (LOG2_SLOTS, Log2Counter, RingWindow, RobustOutliers,
+                            WindowedSketch, hist_quantiles, weighted_median)
 
 USE_EBPF = os.environ.get("USE_EBPF", "auto")  # "auto" | "on" | "off"
 SAMPLE_WINDOW = int(os.environ.get("SAMPLE_WINDOW", "30"))  # seconds to keep
 ANOMALY_MAD_K = float(os.environ.get("ANOMALY_MAD_K", "3.0"))  # robust z cutoff
+BPF_FIXTURE = os.environ.get("BPF_FIXTURE", "")  # replay recorded histograms instead of BCC
+USE_PROCFS = os.environ.get("USE_PROCFS", "on")  # "on" | "off"
+# per-source minimum re-read period (s) for the procfs collector
+PROCFS_INTERVALS = parse_intervals(os.environ.get(
+    "PROCFS_INTERVALS", "schedstat=1,diskstats=1,pressure=1,stat=1"))
+# base cadence: anomaly samples, push and replay gaps; and the sampling
+# interval when no lease asks for more (SAMPLE_IDLE_INTERVAL_SEC) and the
+# fastest a lease may ask for (SAMPLE_MIN_INTERVAL_SEC)
+SAMPLE_INTERVAL_SEC = float(os.environ.get("SAMPLE_INTERVAL_SEC", "1.0"))
+SAMPLE_IDLE_INTERVAL_SEC = float(os.environ.get("SAMPLE_IDLE_INTERVAL_SEC",
+                                                str(SAMPLE_INTERVAL_SEC)))
+SAMPLE_MIN_INTERVAL_SEC = float(os.environ.get("SAMPLE_MIN_INTERVAL_SEC", "0.05"))
+SAMPLING_MAX_LEASE_SEC = float(os.environ.get("SAMPLING_MAX_LEASE_SEC", "3600"))
+SKETCH_WINDOWS = [int(x) for x in os.environ.get("SKETCH_WINDOWS", "1,10,60").split(",")]
+SKETCH_ALPHA = float(os.environ.get("SKETCH_ALPHA", "0.01"))  # relative error
+SNAPSHOT_TTL_SEC = float(os.environ.get("SNAPSHOT_TTL_SEC", str(2 * SAMPLE_IDLE_INTERVAL_SEC)))
+STREAM_MAX_SUBSCRIBERS = int(os.environ.get("STREAM_MAX_SUBSCRIBERS", "64"))
+STREAM_KEEPALIVE_SEC = float(os.environ.get("STREAM_KEEPALIVE_SEC", "15"))
+HISTORY_DIR = os.environ.get("HISTORY_DIR", "/data/history")  # "" disables history
+HISTORY_TIERS = parse_tiers(os.environ.get(
+    "HISTORY_TIERS", "1=21600,10=259200,60=2592000,3600=31536000"))  # res=retention (s)
+HISTORY_FLUSH_SEC = float(os.environ.get("HISTORY_FLUSH_SEC", "10"))
+USE_CGROUPS = os.environ.get("USE_CGROUPS", "on")  # "on" | "off"
+CGROUP_ROOT = os.environ.get("CGROUP_ROOT", "/sys/fs/cgroup")
+CGROUP_DEPTH = int(os.environ.get("CGROUP_DEPTH", "2"))  # levels below the root
+MAX_CPUS = int(os.environ.get("MAX_CPUS", "1024"))  # attribution table sizes
+MAX_CGROUPS = int(os.environ.get("MAX_CGROUPS", "256"))
+# also record per-CPU / per-cgroup window averages in the history
+HISTORY_ATTRIBUTION = os.environ.get("HISTORY_ATTRIBUTION", "off")  # "on" | "off"
+HOST_ID = os.environ.get("HOST_ID") or socket.gethostname()
+HOST_GROUP = os.environ.get("HOST_GROUP", "default")  # fleet aggregation group
+# push /sketches payloads to a telemetry-aggregator instead of (or besides)
+# being scraped; empty disables
+AGGREGATOR_URL = os.environ.get("AGGREGATOR_URL", "")
+AGGREGATOR_WINDOW = int(os.environ.get("AGGREGATOR_WINDOW", "60"))  # sketch window (s)
+# Replay a recorded trace (JSONL snapshots) or workload CSVs (a file, glob, or
+# an outputs/ directory) instead of sampling; REPLAY_SPEED=0 steps one record
+# per /snapshot request
+REPLAY_PATH = os.environ.get("REPLAY_PATH", "")
+REPLAY_SPEED = float(os.environ.get("REPLAY_SPEED", "1.0"))  # x real time
+REPLAY_LOOP = os.environ.get("REPLAY_LOOP", "on")  # "on" | "off"
+RECORD_PATH = os.environ.get("RECORD_PATH", "")  # append published snapshots (JSONL)
+BPF_STATS = os.environ.get("BPF_STATS", "on")  # enable kernel BPF run-time stats
+HISTORY_SELFSTATS = os.environ.get("HISTORY_SELFSTATS", "on")  # record own overhead
+HISTORY_FINGERPRINT = os.environ.get("HISTORY_FINGERPRINT", "on")  # fp.<feature>
+# fnmatch patterns of the metrics the history records (default: the snapshot
+# metrics, the agent's own totals, fp.* and, with HISTORY_ATTRIBUTION=on, the
+# per-CPU / per-cgroup columns); every series costs one file per tier
+HISTORY_METRICS = [p for p in os.environ.get("HISTORY_METRICS", "").split(",") if p] or [
+    "cpu_load_*", "median_latency_ms", "p95_latency_ms", "p95_block_io_ms",
+    "sys_enter_rps", "anomaly_rate", "throughput_kbps", *GAUGES, "syscall_*_share",
+    "self.cpu_percent", "self.rss_mb", "self.publish_ms", "self.dropped_ticks",
+    "self.sampler_errors", "fp.*",
+    *(["cpu[0-9]*", "cgroup/*"] if HISTORY_ATTRIBUTION == "on" else [])]
+HISTORY_MAX_SERIES = int(os.environ.get("HISTORY_MAX_SERIES", "512"))
+HISTORY_EXPIRE_SEC = float(os.environ.get("HISTORY_EXPIRE_SEC", "86400"))  # idle series
+# top-K syscall / process accounting: counters per space-saving summary, and
+# the default number of entries /topk returns
+TOPK = int(os.environ.get("TOPK", "10"))
+TOPK_COUNTERS = int(os.environ.get("TOPK_COUNTERS", "128"))
+MAX_PIDS = int(os.environ.get("MAX_PIDS", "4096"))  # eBPF per-process map / procfs scan
+# /proc/<pid> sampler: "auto" runs it when eBPF is unavailable
+USE_PROCESS_SCAN = os.environ.get("USE_PROCESS_SCAN", "auto")  # "auto" | "on" | "off"
+PROCESS_SCAN_SEC = float(os.environ.get("PROCESS_SCAN_SEC", "5"))
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99, "p999": 0.999}
 
 app = FastAPI(title="telemetry-agent", version="1.0.0")
+log = logging.getLogger("telemetry-agent")
 hist_lock = threading.Lock()
-latency_ms = []  # sliding window storage (sched switch proxy)
-io_latency = []  # sliding window of block I/O complete durations (ms)
-sys_enter_rate = []  # syscalls/sec in window
+# sampling interval: idle rate unless a lease (e.g. a rollout) asks for more
+sampling = SamplingController(SAMPLE_IDLE_INTERVAL_SEC, SAMPLE_MIN_INTERVAL_SEC,
+                              max_ttl_s=SAMPLING_MAX_LEASE_SEC)
+# sliding windows: preallocated ring buffers, expired lazily on read, sized for
+# the fastest leased rate; per-tick summaries are read time-weighted
+latency_ms = RingWindow.for_rate(SAMPLE_WINDOW, SAMPLE_MIN_INTERVAL_SEC,
+                                 columns=("median", "p95"))  # sched latency
+io_latency = RingWindow.for_rate(SAMPLE_WINDOW, SAMPLE_MIN_INTERVAL_SEC,
+                                 columns=("p95",))  # block I/O durations (ms)
+sys_enter_rate = RingWindow.for_rate(SAMPLE_WINDOW, SAMPLE_MIN_INTERVAL_SEC,
+                                     columns=("rps",))  # syscalls/sec
+gauges = RingWindow.for_rate(SAMPLE_WINDOW, SAMPLE_MIN_INTERVAL_SEC,
+                             columns=GAUGES)  # PSI / cpu / ctxt (NaN = absent)
+# true window quantiles over the raw histogram counts (mergeable across hosts)
+lat_sketch = WindowedSketch(SKETCH_WINDOWS, alpha=SKETCH_ALPHA)
+io_sketch = WindowedSketch(SKETCH_WINDOWS, alpha=SKETCH_ALPHA)
+# Fraction of recent per-tick p95 samples that are statistical outliers.
+# A median + k*MAD robust threshold lets a few tail spikes register as anomalies
+# without a trained model.  This is the `anomaly_rate` signal the reasoner and
+# safety-runtime consume (and the quantity the paper's Table 2 / tau-sweep
+# report reductions on); it is maintained per sample so reads are O(1).
+anomaly = RobustOutliers(SAMPLE_WINDOW, k=ANOMALY_MAD_K)
+# cumulative log2 histograms / counters since start, for /metrics
+sched_hist = Log2Counter()
+block_hist = Log2Counter()
+syscalls = {"total": 0}
+# per-CPU / per-cgroup aggregates: fixed-size tables, averaged over SAMPLE_WINDOW
+cpu_table = AttributionTable(MAX_CPUS, CPU_COLUMNS, SAMPLE_WINDOW)
+cgroup_table = AttributionTable(MAX_CGROUPS, CGROUP_COLUMNS, SAMPLE_WINDOW)
+# heavy hitters over an exponentially weighted SAMPLE_WINDOW: syscall ids,
+# processes per PROCESS_COLUMNS column, and the decayed count per syscall class
+top_syscalls = SpaceSaving(TOPK_COUNTERS)
+top_processes = {col: SpaceSaving(TOPK_COUNTERS) for col in PROCESS_COLUMNS}
+syscall_mix = dict.fromkeys(SYSCALL_CLASSES, 0.0)
 _net_prev = {"ts": None, "bytes": 0}  # for throughput derivation
 
+# Published snapshot: computed once per sampling tick by snapshot_worker (the
+# only caller of _throughput_rps, so deltas are never split between readers)
+# and swapped in by a single reference assignment.  `body` is pre-serialized.
+Snapshot = namedtuple("Snapshot", ["ts", "data", "body"])
+_snapshot = None
+_publish_lock = threading.Lock()
+history = None  # tsdb.History of snapshot metrics, opened at startup
+metrics_page = MetricsPage()  # /metrics body, re-rendered once per publish
+replayer = None  # replay.Replayer when REPLAY_PATH is set
+# own overhead: per-collector read latency, sampler / publisher health
+collector_timing = {}  # collector name -> Timing
+publish_timing = Timing()
+sampler = {"ticks": 0, "dropped_ticks": 0, "errors": 0,
+           "interval_s": SAMPLE_IDLE_INTERVAL_SEC}
+self_usage = SelfUsage()
+bpf_progs = None  # selfstats.BpfProgStats once BCC is loaded
+_selfstats = None  # last tick's /selfstats body
+_bpf_prev = {}  # program -> (monotonic s, run_time_ns) for the CPU share
 
-def _robust_anomaly_rate(p95s) -> float:
-    """Fraction of recent p95 samples that are statistical outliers.
 
-    Uses a median + k*MAD robust threshold so a few tail spikes register as
-    anomalies without a trained model.  This is the `anomaly_rate` signal the
-    reasoner and safety-runtime consume (and the quantity the paper's Table 2 /
-    tau-sweep report reductions on).
-    """
-    vals = [v for v in p95s if v is not None]
-    if len(vals) < 5:
-        return 0.0
-    med = statistics.median(vals)
-    mad = statistics.median([abs(v - med) for v in vals]) or 1e-9
-    thresh = med + ANOMALY_MAD_K * 1.4826 * mad
-    return sum(1 for v in vals if v > thresh) / len(vals)
+def _window_quantiles(sk: WindowedSketch, now: float) -> dict:
+    """{"<w>s": {"count", "p50", ..., "p999"}} for every configured window."""
+    out = {}
+    for w in SKETCH_WINDOWS:
+        qs = sk.quantiles(w, list(QUANTILES.values()), now)
+        out[f"{w}s"] = {"count": sk.count(w),
+                        **{k: float(v) for k, v in zip(QUANTILES, qs)}}
+    return out
 
 
 def _throughput_rps() -> float:
@@ -56,179 +186,870 @@ def try_init_bcc():
         from bcc import BPF
     except Exception:
         return None, {}
+    # runqlat/biolatency-style probes: stamp the start of each interval in a
+    # hash map, take the delta at its end and aggregate it in-kernel into a
+    # log2(us) histogram, so userspace reads 64 slots per tick instead of events.
     program = r"""
     #include <uapi/linux/ptrace.h>
-    #include <linux/blkdev.h>
+    #include <linux/sched.h>
+
+    BPF_HASH(runq_start, u32, u64, 10240);
+    BPF_PERCPU_ARRAY(runq_us, u64, 64);
+
+    struct io_key_t { u32 dev; u64 sector; };
+    BPF_HASH(io_start, struct io_key_t, u64, 10240);
+    BPF_PERCPU_ARRAY(bio_us, u64, 64);
+
+    BPF_PERCPU_ARRAY(sys_enter_cnt, u64, 1);
+    BPF_TABLE("lru_hash", u64, u64, cg_sys_enter, 1024);
+    BPF_PERCPU_ARRAY(sys_by_id, u64, MAX_SYSCALL_ID);
+    struct proc_val_t { u64 count; char comm[TASK_COMM_LEN]; };
+    BPF_TABLE("lru_hash", u32, struct proc_val_t, sys_by_pid, MAX_PIDS);
+    BPF_PERCPU_ARRAY(drops, u64, 1);  // start stamps lost to a full map
+
+    static void pcpu_inc(u64 *slot) {
+        if (slot)
+            (*slot)++;  // per-CPU slot: no atomics needed
+    }
 
-    BPF_HISTOGRAM(dist);
-    BPF_HISTOGRAM(iolat);
-    BPF_HASH(sys_enter_cnt, u32, u64);
+    static void count_drop(void) {
+        int key = 0;
+        pcpu_inc(drops.lookup(&key));
+    }
+
+    static int runq_enqueue(u32 pid) {
+        if (pid == 0)
+            return 0;
+        u64 ts = bpf_ktime_get_ns();
+        if (runq_start.update(&pid, &ts))
+            count_drop();
+        return 0;
+    }
+
+    TRACEPOINT_PROBE(sched, sched_wakeup) { return runq_enqueue(args->pid); }
+    TRACEPOINT_PROBE(sched, sched_wakeup_new) { return runq_enqueue(args->pid); }
+
+    // wakeup -> switch-in; a preempted task goes straight back on the run queue
+    TRACEPOINT_PROBE(sched, sched_switch) {
+        if (args->prev_state == TASK_RUNNING)
+            runq_enqueue(args->prev_pid);
+        u32 pid = args->next_pid;
+        u64 *tsp = runq_start.lookup(&pid);
+        if (tsp == 0)
+            return 0;
+        u64 delta_us = (bpf_ktime_get_ns() - *tsp) / 1000;
+        int slot = bpf_log2l(delta_us);
+        pcpu_inc(runq_us.lookup(&slot));
+        runq_start.delete(&pid);
+        return 0;
+    }
 
-    int trace_sched_switch(struct pt_regs *ctx) {
+    // block request issue -> complete, keyed by (dev, sector)
+    TRACEPOINT_PROBE(block, block_rq_issue) {
+        struct io_key_t key = {.dev = args->dev, .sector = args->sector};
         u64 ts = bpf_ktime_get_ns();
-        u64 slot = ts / 1000000ULL % 100;  // bucket 0..99 ms
-        dist.increment(slot);
+        if (io_start.update(&key, &ts))
+            count_drop();
         return 0;
     }
 
     TRACEPOINT_PROBE(block, block_rq_complete) {
-        u64 delta = args->nr_bytes ? args->nr_bytes : 1; // placeholder if needed
-        // Here, we don't have start timestamp easily; use completion time mod buckets as proxy demo
-        u64 slot = bpf_ktime_get_ns() / 1000000ULL % 200; // 0..199 ms
-        iolat.increment(slot);
+        struct io_key_t key = {.dev = args->dev, .sector = args->sector};
+        u64 *tsp = io_start.lookup(&key);
+        if (tsp == 0)
+            return 0;
+        u64 delta_us = (bpf_ktime_get_ns() - *tsp) / 1000;
+        int slot = bpf_log2l(delta_us);
+        pcpu_inc(bio_us.lookup(&slot));
+        io_start.delete(&key);
         return 0;
     }
 
     TRACEPOINT_PROBE(raw_syscalls, sys_enter) {
-        u32 key = 0;
-        u64 zero = 0, *val;
-        val = sys_enter_cnt.lookup_or_init(&key, &zero);
-        (*val)++;
+        int key = 0;
+        pcpu_inc(sys_enter_cnt.lookup(&key));
+        u64 cg = bpf_get_current_cgroup_id(), zero = 0, *val;
+        val = cg_sys_enter.lookup_or_try_init(&cg, &zero);
+        if (val)
+            __sync_fetch_and_add(val, 1);
+        u32 id = args->id;  // out-of-range ids: lookup fails, nothing counted
+        pcpu_inc(sys_by_id.lookup(&id));
+        u32 tgid = bpf_get_current_pid_tgid() >> 32;
+        struct proc_val_t *pv = sys_by_pid.lookup(&tgid);
+        if (pv) {
+            __sync_fetch_and_add(&pv->count, 1);
+        } else {
+            struct proc_val_t init = {.count = 1};
+            bpf_get_current_comm(&init.comm, sizeof(init.comm));
+            sys_by_pid.update(&tgid, &init);
+        }
+        return 0;
+    }
+
+    // free a process's slot when its thread-group leader exits
+    TRACEPOINT_PROBE(sched, sched_process_exit) {
+        u64 id = bpf_get_current_pid_tgid();
+        u32 tgid = id >> 32;
+        if ((u32)id == tgid)
+            sys_by_pid.delete(&tgid);
         return 0;
     }
     """
-    b = BPF(text=program)
-    try:
-        b.attach_kprobe(event="finish_task_switch", fn_name="trace_sched_switch")
-    except Exception:
-        pass
+    b = BPF(text=program, cflags=[f"-DMAX_SYSCALL_ID={MAX_SYSCALL_ID}",
+                                  f"-DMAX_PIDS={MAX_PIDS}"])
     tps = {}
-    try:
-        tps["block"] = b.get_table("iolat")
-    except Exception:
-        tps["block"] = None
-    try:
-        tps["sys_enter"] = b.get_table("sys_enter_cnt")
-    except Exception:
-        tps["sys_enter"] = None
+    for key, name in (("sched", "runq_us"), ("block", "bio_us"),
+                      ("sys_enter", "sys_enter_cnt"),
+                      ("cg_sys_enter", "cg_sys_enter"), ("sys_by_id", "sys_by_id"),
+                      ("sys_by_pid", "sys_by_pid"), ("drops", "drops")):
+        try:
+            tps[key] = b.get_table(name)
+        except Exception:
+            tps[key] = None
     return b, tps
 
 bcc = None
 tps = {}
+collectors = []  # Bcc/Fixture (latency, syscalls), Procfs and/or Cgroup collectors
+cgroups = None  # the CgroupCollector, whose `ids` resolve eBPF cgroup ids
+
+
+def _merge_ticks(ticks) -> Tick:
+    """First source wins per latency signal (and per attribution column);
+    gauges are unioned."""
+    sched = block = sys_enter = per_syscall = None
+    gauges, per_cpu, per_cgroup, per_process = {}, {}, {}, {}
+    ids = cgroups.ids if cgroups is not None else {}
+    for t in ticks:
+        sched = sched if sched is not None else t.sched
+        block = block if block is not None else t.block
+        sys_enter = sys_enter if sys_enter is not None else t.sys_enter
+        gauges.update(t.gauges)
+        for col, vals in (t.per_cpu or {}).items():
+            per_cpu.setdefault(col, vals)
+        for key, vals in (t.per_cgroup or {}).items():
+            if isinstance(key, int):  # eBPF cgroup id -> path
+                key = ids.get(key)
+                if key is None:
+                    continue
+            row = per_cgroup.setdefault(key, {})
+            for col, v in vals.items():
+                row.setdefault(col, v)
+        per_syscall = per_syscall if per_syscall is not None else t.per_syscall
+        for key, vals in (t.per_process or {}).items():
+            row = per_process.setdefault(key, {})
+            for col, v in vals.items():
+                row.setdefault(col, v)
+    return Tick(sched, block, sys_enter, gauges, per_cpu, per_cgroup,
+                per_syscall, per_process)
+
+
+def _read_collectors() -> list:
+    ticks = []
+    for c in collectors:
+        timing = collector_timing.setdefault(c.name, Timing())
+        t0 = time.perf_counter()
+        try:
+            ticks.append(c.read())
+        except Exception:
+            timing.errors += 1  # this source's tick is dropped
+            continue
+        timing.observe((time.perf_counter() - t0) * 1000.0)
+    return ticks
 
-def ebpf_worker():
-    global bcc, tps
-    last_syscalls = 0
+
+def _update_topk(tick: Tick, decay: float):
+    """Age the heavy-hitter summaries by one tick and add its counts."""
+    top_syscalls.decay(decay)
+    for cls in syscall_mix:
+        syscall_mix[cls] *= decay
+    if tick.per_syscall:
+        top_syscalls.update(tick.per_syscall)
+        for sid, n in tick.per_syscall.items():
+            syscall_mix[syscall_info(sid)[1]] += n
+    for col, summary in top_processes.items():
+        summary.decay(decay)
+        if tick.per_process:
+            summary.update({key: vals[col] for key, vals in tick.per_process.items()
+                            if col in vals})
+
+
+def _pooled_p95(dists) -> float:
+    """p95 of several (values_ms, counts) distributions taken together."""
+    if len(dists) == 1:
+        return hist_quantiles(*dists[0], [0.95])[0]
+    v = np.concatenate([d[0] for d in dists])
+    c = np.concatenate([d[1] for d in dists])
+    order = np.argsort(v, kind="stable")
+    return hist_quantiles(v[order], c[order], [0.95])[0]
+
+
+def sample_worker():
+    """Sample on the controller's current interval.  A lease change wakes the
+    worker to re-plan the next deadline; the anomaly detector is fed one
+    pooled p95 per SAMPLE_INTERVAL_SEC whatever the rate, so a burst of short
+    (noisier) ticks during a rollout does not read as outliers."""
     last_ts = time.time()
+    anom_dists, anom_start = [], last_ts
+    version = sampling.version
+    replanned = False
     while True:
-        time.sleep(1.0)
+        interval = sampling.interval()
+        due = last_ts + interval
+        delay = due - time.time()
+        if delay > 0:
+            seen = sampling.wait(delay, version)
+            if seen != version:
+                version, replanned = seen, True
+                continue
         try:
-            # sched histogram -> p50/p95 proxy
-            table = bcc.get_table("dist")
-            total = 0
-            buckets = []
-            for k, v in table.items():
-                buckets.append((int(k.value), int(v.value)))
-                total += int(v.value)
-            buckets.sort()
-            if total:
-                cum = 0
-                p50 = p95 = 0
-                for b, c in buckets:
-                    cum += c
-                    if p50 == 0 and cum >= 0.5 * total:
-                        p50 = b
-                    if p95 == 0 and cum >= 0.95 * total:
-                        p95 = b
-                        break
-            else:
-                p50 = p95 = 0
-
-            # block I/O latency proxy
-            iop = 0
-            if tps.get("block"):
-                io_tab = tps["block"]
-                total_io = 0
-                io_buckets = []
-                for k, v in io_tab.items():
-                    io_buckets.append((int(k.value), int(v.value)))
-                    total_io += int(v.value)
-                io_buckets.sort()
-                if total_io:
-                    cum = 0
-                    p95io = 0
-                    for b, c in io_buckets:
-                        cum += c
-                        if p95io == 0 and cum >= 0.95 * total_io:
-                            p95io = b
-                            break
-                    iop = p95io
-                io_tab.clear()
+            late = time.time() - due
+            tick = _merge_ticks(_read_collectors())
+            now = time.time()
+            dt = now - last_ts if now > last_ts else interval
+            last_ts = now
+            sampler["ticks"] += 1
+            sampler["interval_s"] = interval
+            if not replanned and late >= interval:  # stalled: whole ticks missed
+                sampler["dropped_ticks"] += int(late // interval)
+            replanned = False
+
+            # run-queue latency distribution -> p50/p95 (ms)
+            p50 = p95 = 0.0
+            if tick.sched is not None:
+                p50, p95 = hist_quantiles(*tick.sched, [0.5, 0.95])
+
+            # block I/O latency distribution -> p95 (ms)
+            iop = 0.0
+            if tick.block is not None:
+                iop = hist_quantiles(*tick.block, [0.95])[0]
 
             # sys_enter rate (per second)
-            rate = 0.0
-            if tps.get("sys_enter"):
-                tab = tps["sys_enter"]
-                key = tab.Key(0)
-                val = tab.get(key)
-                cur = int(val.value) if val else 0
-                now = time.time()
-                dt = now - last_ts if now > last_ts else 1.0
-                if dt > 0:
-                    rate = max(0.0, (cur - last_syscalls) / dt)
-                last_syscalls, last_ts = cur, now
+            rate = tick.sys_enter / dt if tick.sys_enter is not None else 0.0
 
             with hist_lock:
-                latency_ms.append({"ts": time.time(), "median": p50, "p95": p95})
-                io_latency.append({"ts": time.time(), "p95": iop})
-                sys_enter_rate.append({"ts": time.time(), "rps": rate})
-                cutoff = time.time() - SAMPLE_WINDOW
-                latency_ms[:]   = [x for x in latency_ms   if x["ts"] >= cutoff]
-                io_latency[:]   = [x for x in io_latency   if x["ts"] >= cutoff]
-                sys_enter_rate[:] = [x for x in sys_enter_rate if x["ts"] >= cutoff]
-
-            table.clear()
+                if tick.sched is not None:
+                    latency_ms.append(now, p50, p95)
+                    anom_dists.append(tick.sched)
+                if anom_dists and now - anom_start >= SAMPLE_INTERVAL_SEC:
+                    anomaly.update(now, _pooled_p95(anom_dists))
+                    anom_dists, anom_start = [], now
+                if tick.block is not None:
+                    io_latency.append(now, iop)
+                if tick.sys_enter is not None:
+                    sys_enter_rate.append(now, rate)
+                if tick.gauges:
+                    gauges.append(now, *(tick.gauges.get(g, np.nan) for g in GAUGES))
+                for sk, h, dist in ((lat_sketch, sched_hist, tick.sched),
+                                    (io_sketch, block_hist, tick.block)):
+                    if dist is not None and dist[1].size:
+                        sk.add(now, *dist)
+                        h.add(*dist)
+                if tick.sys_enter is not None:
+                    syscalls["total"] += tick.sys_enter
+                if tick.per_cpu:
+                    cpu_table.update_columns(now, tick.per_cpu)
+                for path, vals in tick.per_cgroup.items():
+                    cgroup_table.update(now, path, vals)
+                cgroup_table.expire(now, SAMPLE_WINDOW)
+                _update_topk(tick, math.exp(-dt / SAMPLE_WINDOW))
         except Exception:
-            break
+            sampler["errors"] += 1  # this tick is lost, sampling goes on
+            log.exception("sample tick failed")
+            last_ts = time.time()
+
+
+def _replay_snapshot() -> dict:
+    data = replayer.current()
+    data.setdefault("host_id", HOST_ID)
+    data.setdefault("host_group", HOST_GROUP)
+    data.setdefault("quantiles", {})
+    if "fingerprint" not in data:  # e.g. workload CSVs
+        data["fingerprint"] = _fingerprint(data)
+    return data
+
+
+def _publish() -> Snapshot:
+    global _snapshot
+    t0 = time.perf_counter()
+    data = _replay_snapshot() if replayer is not None else _compute_snapshot()
+    _snapshot = Snapshot(data["ts"], data, json.dumps(data).encode())
+    _render_metrics(data["metrics"])
+    _fanout(_snapshot)
+    publish_timing.observe((time.perf_counter() - t0) * 1000.0)
+    return _snapshot
+
+
+def _compute_selfstats() -> dict:
+    out = {"process": self_usage.read(),
+           "collectors": {name: {**t.to_dict(),
+                                 "dropped": next((getattr(c, "dropped", 0)
+                                                  for c in collectors if c.name == name), 0)}
+                          for name, t in collector_timing.items()},
+           "sampler": dict(sampler), "publish": publish_timing.to_dict(),
+           "stream_subscribers": len(_subscribers), "ts": time.time()}
+    if bpf_progs is not None:
+        now = time.monotonic()
+        progs = bpf_progs.read()
+        for name, row in progs.items():
+            prev = _bpf_prev.get(name)
+            _bpf_prev[name] = (now, row.get("run_time_ns", 0))
+            if prev is not None:
+                row["cpu_percent"] = (100.0 * (row.get("run_time_ns", 0) - prev[1])
+                                      / 1e9 / max(1e-6, now - prev[0]))
+        out["bpf"] = {"stats_enabled": bpf_stats_enabled(), "programs": progs}
+    return out
+
+
+def _selfstats_metrics(st: dict) -> dict:
+    """Flat history metrics (self.*) from a /selfstats body."""
+    p = st["process"]
+    out = {"self.cpu_percent": p["cpu_percent"], "self.rss_mb": p["rss_bytes"] / 2**20,
+           "self.publish_ms": st["publish"]["avg_ms"],
+           "self.dropped_ticks": st["sampler"]["dropped_ticks"],
+           "self.sampler_errors": st["sampler"]["errors"]}
+    for name, c in st["collectors"].items():
+        out[f"self.{name}.read_ms"] = c["avg_ms"]
+        out[f"self.{name}.errors"] = c["errors"]
+        out[f"self.{name}.dropped"] = c["dropped"]
+    for name, row in st.get("bpf", {}).get("programs", {}).items():
+        out[f"self.bpf.{name}.avg_ns"] = row["avg_ns"]
+        if "cpu_percent" in row:
+            out[f"self.bpf.{name}.cpu_percent"] = row["cpu_percent"]
+    return out
+
+
+def publish_snapshot() -> Snapshot:
+    """Compute the snapshot from the current windows and publish it."""
+    with _publish_lock:
+        return _publish()
+
+
+def snapshot_worker():
+    global _selfstats
+    last_flush = time.time()
+    record = open(RECORD_PATH, "ab") if RECORD_PATH else None
+    while True:
+        try:
+            snap = publish_snapshot()
+            _selfstats = _compute_selfstats()
+            if record is not None:
+                record.write(snap.body + b"\n")
+                record.flush()
+            if history is not None:
+                history.append(snap.ts, snap.data["metrics"])
+                if HISTORY_ATTRIBUTION == "on":
+                    history.append(snap.ts, _attribution_metrics())
+                if HISTORY_SELFSTATS == "on":
+                    history.append(snap.ts, _selfstats_metrics(_selfstats))
+                if HISTORY_FINGERPRINT == "on" and "fingerprint" in snap.data:
+                    history.append(snap.ts, dict(zip(
+                        (f"fp.{n}" for n in FEATURE_NAMES),
+                        snap.data["fingerprint"]["vector"])))
+                if snap.ts - last_flush >= HISTORY_FLUSH_SEC:
+                    history.expire(snap.ts)
+                    history.flush()
+                    last_flush = snap.ts
+        except Exception:
+            pass
+        version = sampling.version
+        sampling.wait(sampling.interval(), version)
+
+
+def replay_worker():
+    """Publish each replayed record, then wait its (speed-scaled) gap."""
+    while True:
+        try:
+            publish_snapshot()
+        except Exception:
+            pass
+        time.sleep(replayer.delay())
+        with _publish_lock:
+            if not replayer.advance():
+                break  # trace ended: the last record stays published
+
 
 @app.on_event("startup")
 def startup():
-    global bcc, tps
-    if USE_EBPF != "off":
+    global bcc, tps, history, cgroups, replayer, bpf_progs
+    if REPLAY_PATH:
+        replayer = Replayer(REPLAY_PATH, REPLAY_SPEED, loop=REPLAY_LOOP != "off",
+                            default_gap_s=SAMPLE_INTERVAL_SEC)
+        if REPLAY_SPEED > 0:
+            threading.Thread(target=replay_worker, daemon=True).start()
+        if AGGREGATOR_URL:
+            threading.Thread(target=push_worker, daemon=True).start()
+        return
+    if HISTORY_DIR:
+        try:
+            history = History(HISTORY_DIR, HISTORY_TIERS, allow=HISTORY_METRICS,
+                              max_series=HISTORY_MAX_SERIES, expire_s=HISTORY_EXPIRE_SEC)
+        except OSError:
+            history = None
+    if BPF_FIXTURE:
+        collectors.append(FixtureCollector(BPF_FIXTURE))
+    elif USE_EBPF != "off":
         try:
             bcc, tables = try_init_bcc()
             tps = tables
         except Exception:
             bcc = None
-    if bcc is not None:
-        t = threading.Thread(target=ebpf_worker, daemon=True)
+        if bcc is not None:
+            collectors.append(BccCollector(tps))
+            if BPF_STATS != "off":
+                enable_bpf_stats()
+            bpf_progs = BpfProgStats({name: fn.fd for name, fn in bcc.funcs.items()})
+    # procfs always supplies the PSI/cpu gauges; its latency estimates are
+    # only used when no eBPF/fixture source is active (first source wins)
+    if USE_PROCFS != "off":
+        sources = ("pressure", "stat") if collectors else None
+        procfs = ProcfsCollector(PROCFS_INTERVALS, sources=sources)
+        if procfs.available:
+            collectors.append(procfs)
+    if USE_PROCESS_SCAN == "on" or (USE_PROCESS_SCAN == "auto" and bcc is None):
+        proc = ProcessCollector(interval_s=PROCESS_SCAN_SEC, max_pids=MAX_PIDS)
+        if proc.available:
+            collectors.append(proc)
+    if USE_CGROUPS != "off":
+        cg = CgroupCollector(CGROUP_ROOT, CGROUP_DEPTH, MAX_CGROUPS)
+        if cg.available:
+            cgroups = cg
+            collectors.append(cg)
+    if collectors:
+        t = threading.Thread(target=sample_worker, daemon=True)
         t.start()
+    threading.Thread(target=snapshot_worker, daemon=True).start()
+    if AGGREGATOR_URL:
+        threading.Thread(target=push_worker, daemon=True).start()
 
 @app.get("/healthz")
 def healthz():
     mode = "fallback"
-    if bcc is not None:
-        mode = "ebpf"
+    if replayer is not None:
+        mode = "replay"
+    elif collectors:
+        mode = collectors[0].name
     elif USE_EBPF == "on":
         mode = "ebpf-requested-but-unavailable"
-    return {"ok": True, "mode": mode, "has_block": bool(tps.get("block")), "has_sysenter": bool(tps.get("sys_enter"))}
+    return {"ok": True, "mode": mode, "has_sched": bool(tps.get("sched")),
+            "has_block": bool(tps.get("block")), "has_sysenter": bool(tps.get("sys_enter"))}
 
-@app.get("/snapshot")
-def snapshot():
+@app.get("/selfstats")
+def selfstats():
+    """The agent's own cost: CPU / RSS, per-collector read latency, errors and
+    dropped samples, publish latency and, with eBPF, per-program BPF run
+    counts and run time.  Refreshed once per tick."""
+    st = _selfstats
+    if st is None or time.time() - st["ts"] > SNAPSHOT_TTL_SEC:
+        st = _compute_selfstats()
+    return st
+
+
+@app.get("/sampling")
+def sampling_state():
+    """Effective sampling interval and the live rate leases."""
+    return sampling.state()
+
+
+@app.post("/sampling/lease")
+def sampling_lease(hz: float = Body(..., gt=0), ttl_s: float = Body(..., gt=0),
+                   holder: str = Body("")):
+    """Sample at `hz` (clamped to 1/SAMPLE_MIN_INTERVAL_SEC) for `ttl_s`
+    seconds; renew with PUT before it lapses, release with DELETE."""
+    try:
+        return sampling.acquire(hz, ttl_s, holder)
+    except OverflowError as e:
+        raise HTTPException(503, str(e))
+
+
+@app.put("/sampling/lease/{lease_id}")
+def sampling_renew(lease_id: str, ttl_s: float = Body(..., gt=0, embed=True)):
+    try:
+        return sampling.renew(lease_id, ttl_s)
+    except KeyError:
+        raise HTTPException(404, f"no live lease '{lease_id}'")
+
+
+@app.delete("/sampling/lease/{lease_id}")
+def sampling_release(lease_id: str):
+    if not sampling.release(lease_id):
+        raise HTTPException(404, f"no live lease '{lease_id}'")
+    return {"ok": True, **sampling.state()}
+
+
+def _compute_snapshot() -> dict:
+    now = time.time()
     with hist_lock:
-        meds = [x["median"] for x in latency_ms]
-        p95s = [x["p95"] for x in latency_ms]
-        iop  = [x["p95"] for x in io_latency if x["p95"]]
-        rps  = [x["rps"] for x in sys_enter_rate]
-    median = statistics.median(meds) if meds else 0.0
-    p95 = statistics.median(p95s) if p95s else 0.0
-    p95_io = statistics.median(iop) if iop else 0.0
-    rate = statistics.median(rps) if rps else 0.0
-    anomaly_rate = _robust_anomaly_rate(p95s)
+        meds = latency_ms.weighted("median", now)
+        p95s = latency_ms.weighted("p95", now)
+        iop, iop_w = io_latency.weighted("p95", now)
+        rps  = sys_enter_rate.weighted("rps", now)
+        gauge_cols = [gauges.weighted(g, now) for g in GAUGES]
+        anomaly_rate = anomaly.rate(now)
+        quantiles = {name: _window_quantiles(sk, now)
+                     for name, sk in (("sched_latency_ms", lat_sketch),
+                                      ("block_io_ms", io_sketch))}
+        mix = _syscall_shares()
+    # headline latencies are true quantiles over the longest sketch window;
+    # fall back to the median of per-tick summaries when no histogram is fed,
+    # each tick weighted by the time it covers (the interval varies)
+    longest = f"{max(SKETCH_WINDOWS)}s"
+    lat_q = quantiles["sched_latency_ms"][longest]
+    io_q = quantiles["block_io_ms"][longest]
+    med = lat_q["p50"] if lat_q["count"] else weighted_median(*meds)
+    p95 = lat_q["p95"] if lat_q["count"] else weighted_median(*p95s)
+    p95_io = io_q["p95"] if io_q["count"] else weighted_median(iop[iop != 0],
+                                                               iop_w[iop != 0])
+    rate = weighted_median(*rps)
+    host_gauges = {g: weighted_median(*gauge_cols[i]) for i, g in enumerate(GAUGES)}
     throughput = _throughput_rps()
     load1, load5, load15 = psutil.getloadavg()
-    return JSONResponse({
-        "host_id": "host-001",
+    data = {
+        "host_id": HOST_ID,
+        "host_group": HOST_GROUP,
         "metrics": {
             "cpu_load_1": load1,
             "cpu_load_5": load5,
             "cpu_load_15": load15,
-            "median_latency_ms": float(median),
+            "median_latency_ms": float(med),
             "p95_latency_ms": float(p95),
             "p95_block_io_ms": float(p95_io),
             "sys_enter_rps": float(rate),
             "anomaly_rate": float(anomaly_rate),
             "throughput_kbps": float(throughput),
+            **host_gauges,
+            **mix,
         },
+        "quantiles": quantiles,
         "ts": time.time()
-    })
+    }
+    data["fingerprint"] = _fingerprint(data)
+    return data
+
+
+def _fingerprint(data: dict) -> dict:
+    return {"version": FINGERPRINT_VERSION,
+            "vector": [round(float(x), 5)
+                       for x in fingerprint(data["metrics"], data["quantiles"])]}
+
+
+def _syscall_shares() -> dict:
+    """syscall_<class>_share of the windowed syscall mix (empty until per-id
+    counts arrive); callers hold hist_lock."""
+    total = sum(syscall_mix.values())
+    if total <= 0:
+        return {}
+    return {f"syscall_{cls}_share": n / total for cls, n in syscall_mix.items()}
+
+
+def _topk(k: int) -> dict:
+    """Top-k syscalls and processes with rates over the decayed window.  An
+    exponentially weighted count over SAMPLE_WINDOW holds about rate *
+    SAMPLE_WINDOW events; `error_*` bounds each entry's overestimate."""
+    w = float(SAMPLE_WINDOW)
+    with hist_lock:
+        calls = [{"id": sid, "name": syscall_info(sid)[0], "class": syscall_info(sid)[1],
+                  "rps": n / w, "error_rps": e / w}
+                 for sid, n, e in top_syscalls.top(k)]
+        procs = {}
+        for col, summary in top_processes.items():
+            if not len(summary):
+                continue
+            if col == "cpu_ms":  # ms of CPU per second of window -> percent
+                procs[col] = [{"pid": pid, "comm": comm, "cpu_percent": n / w / 10.0,
+                               "error_cpu_percent": e / w / 10.0}
+                              for (pid, comm), n, e in summary.top(k)]
+            else:
+                procs[col] = [{"pid": pid, "comm": comm, "rps": n / w, "error_rps": e / w}
+                              for (pid, comm), n, e in summary.top(k)]
+        total = sum(syscall_mix.values())
+        classes = {c: n / total for c, n in syscall_mix.items()} if total > 0 else {}
+    return {"window_s": SAMPLE_WINDOW, "syscalls": calls, "processes": procs,
+            "classes": classes, "ts": time.time()}
+
+
+def _attribution(cpu: str = None, cgroup: str = None) -> dict:
+    """Per-CPU / per-cgroup rows ({"last", "avg"} per column) matching the
+    `/snapshot` filters: `cpu` is "all" or a comma list of CPU numbers,
+    `cgroup` a path prefix ("/" for all)."""
+    out = {}
+    with hist_lock:
+        if cpu is not None:
+            want = None if cpu == "all" else {int(c) for c in cpu.split(",") if c}
+            out["per_cpu"] = cpu_table.rows(
+                None if want is None else want.__contains__)
+        if cgroup is not None:
+            prefix = cgroup.rstrip("/")
+            out["cgroups"] = cgroup_table.rows(
+                lambda p: p == prefix or p.startswith(prefix + "/") or not prefix)
+    return out
+
+
+def _attribution_metrics() -> dict:
+    """Window averages as flat history metrics: cpu<N>.<col>, cgroup<path>.<col>."""
+    out = {}
+    with hist_lock:
+        for prefix, table in (("cpu", cpu_table), ("cgroup", cgroup_table)):
+            for row in table.rows():
+                key = row.pop("key")
+                for col, v in row.items():
+                    out[f"{prefix}{key}.{col}"] = v["avg"]
+    return out
+
+
+@app.get("/snapshot")
+def snapshot(max_age: float = Query(None, ge=0.0), cpu: str = Query(None),
+             cgroup: str = Query(None)):
+    """Serve the last published snapshot.
+
+    It is recomputed inline only if older than SNAPSHOT_TTL_SEC (or the
+    caller's tighter `max_age`, in seconds), e.g. when the background worker
+    has stalled; concurrent stale readers share one recomputation.  `cpu`
+    ("all" or "0,3") and `cgroup` (path prefix) add per-CPU / per-cgroup rows.
+    In replay step mode (REPLAY_SPEED=0) each call advances one record."""
+    limit = SNAPSHOT_TTL_SEC if max_age is None else min(max_age, SNAPSHOT_TTL_SEC)
+    if replayer is not None and replayer.speed == 0:
+        with _publish_lock:  # step mode: every read consumes one record
+            snap = _publish()
+            replayer.advance()
+    else:
+        snap = _snapshot
+        if snap is None or time.time() - snap.ts > limit:
+            with _publish_lock:
+                snap = _snapshot
+                if snap is None or time.time() - snap.ts > limit:
+                    snap = _publish()
+    age = max(0.0, time.time() - snap.ts)
+    headers = {"X-Snapshot-Age": f"{age:.3f}"}
+    if cpu is None and cgroup is None:
+        return Response(snap.body, media_type="application/json", headers=headers)
+    try:
+        extra = _attribution(cpu, cgroup)
+    except ValueError:
+        raise HTTPException(400, "'cpu' must be 'all' or a comma list of CPU numbers")
+    return JSONResponse({**snap.data, **extra}, headers=headers)
+
+
+@app.get("/fingerprint")
+def fingerprint_view():
+    """The published workload fingerprint with its feature names, in order."""
+    snap = _snapshot or publish_snapshot()
+    fp = snap.data.get("fingerprint", {})
+    return {"version": fp.get("version"), "features": list(FEATURE_NAMES),
+            "vector": fp.get("vector", []), "ts": snap.ts}
+
+
+@app.get("/topk")
+def topk(k: int = Query(TOPK, ge=1, le=TOPK_COUNTERS)):
+    """Heaviest syscalls (by id, with name and io/net/sched/mem class) and
+    processes (by syscalls, read/write syscalls or CPU time, whichever the
+    active collectors report) over the sampling window, from fixed-size
+    space-saving summaries."""
+    return _topk(k)
+
+
+# --------------------------------------------------------------------------- #
+# OpenMetrics exposition.  Families are re-rendered only when their inputs
+# changed during the tick (see exposition.MetricsPage); /metrics itself just
+# returns the cached bytes.
+# --------------------------------------------------------------------------- #
+# bpf_log2l() slot i holds [2^(i-1), 2^i) us, so its bucket bound is 2^i us
+LOG2_LE_SECONDS = np.exp2(np.arange(LOG2_SLOTS)) * 1e-6
+# snapshot metric -> (exposed gauge name, help)
+METRIC_GAUGES = {
+    "anomaly_rate": ("semantos_anomaly_ratio",
+                     "Fraction of recent p95 samples flagged by the median+k*MAD rule."),
+    "throughput_kbps": ("semantos_throughput_kbps", "Network throughput proxy (KB/s)."),
+    "sys_enter_rps": ("semantos_syscall_rate", "Syscalls entered per second (window median)."),
+    "cpu_load_1": ("semantos_load1", "1-minute load average."),
+    "cpu_util": ("semantos_cpu_utilization_ratio", "Host CPU utilisation."),
+    "ctx_switch_rps": ("semantos_context_switch_rate", "Context switches per second."),
+    **{f"syscall_{c}_share": (f"semantos_syscall_{c}_ratio",
+                              f"Share of syscalls in the {c} class (window).")
+       for c in SYSCALL_CLASSES},
+    **{g: (f"semantos_{g}_ratio", f"PSI {g[4:].replace('_', ' ')} stall fraction.")
+       for g in GAUGES if g.startswith("psi_")},
+}
+
+
+def _render_metrics(metrics: dict) -> bytes:
+    with hist_lock:
+        hists = [(name, help_, h.version, h.counts.copy(), h.sum_ms)
+                 for name, help_, h in (
+                     ("semantos_runqueue_latency_seconds",
+                      "Run-queue latency (wakeup to switch-in).", sched_hist),
+                     ("semantos_block_io_latency_seconds",
+                      "Block I/O latency (issue to complete).", block_hist))]
+        n_sys = syscalls["total"]
+    families = [(name, version,
+                 lambda name=name, help_=help_, c=c, s=s: histogram_text(
+                     name, help_, LOG2_LE_SECONDS, c, s / 1000.0, unit="seconds"))
+                for name, help_, version, c, s in hists]
+    families.append(("semantos_syscalls", n_sys,
+                     lambda: counter_text("semantos_syscalls", "Syscalls entered.", n_sys)))
+    for key, (name, help_) in METRIC_GAUGES.items():
+        v = metrics.get(key)
+        if v is not None and v == v:
+            families.append((name, v, lambda name=name, help_=help_, v=v:
+                             gauge_text(name, help_, v)))
+    return metrics_page.render(families)
+
+
+@app.get("/metrics")
+def metrics():
+    """OpenMetrics exposition of the published tick (cumulative log2 latency
+    histograms, syscall counter, signal gauges)."""
+    if _snapshot is None:
+        publish_snapshot()
+    return Response(metrics_page.body, media_type=OPENMETRICS_TYPE)
+
+
+# --------------------------------------------------------------------------- #
+# Push stream (SSE).  Every subscriber owns a one-slot mailbox that the
+# publisher overwrites, so a slow consumer never queues a backlog: it simply
+# receives the newest snapshot when it next reads (older ones are coalesced).
+# --------------------------------------------------------------------------- #
+class _Subscriber:
+    __slots__ = ("loop", "event", "latest", "coalesced")
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.event = asyncio.Event()
+        self.latest = None
+        self.coalesced = 0
+
+
+_subscribers = set()
+_sub_lock = threading.Lock()
+
+
+def _fanout(snap: Snapshot):
+    with _sub_lock:
+        subs = list(_subscribers)
+    for sub in subs:
+        if sub.latest is not None:
+            sub.coalesced += 1
+        sub.latest = snap
+        try:
+            sub.loop.call_soon_threadsafe(sub.event.set)
+        except RuntimeError:  # subscriber's loop already closed
+            pass
+
+
+def _diff(prev: dict, cur: dict) -> dict:
+    """Leaves of `cur` that differ from `prev` (nested dicts recursed)."""
+    out = {}
+    for k, v in cur.items():
+        p = prev.get(k)
+        if isinstance(v, dict) and isinstance(p, dict):
+            d = _diff(p, v)
+            if d:
+                out[k] = d
+        elif v != p:
+            out[k] = v
+    return out
+
+
+@app.get("/stream")
+async def stream(delta: bool = Query(False)):
+    """Server-sent events: one `snapshot` event per published tick.
+
+    With `delta=true`, events after the first carry only the fields that
+    changed since the last event this subscriber received (`event: delta`)."""
+    sub = _Subscriber(asyncio.get_running_loop())
+    with _sub_lock:
+        if len(_subscribers) >= STREAM_MAX_SUBSCRIBERS:
+            raise HTTPException(503, "too many stream subscribers")
+        _subscribers.add(sub)
+    if _snapshot is not None:
+        sub.latest = _snapshot
+        sub.event.set()
+
+    async def events():
+        last = None
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(sub.event.wait(), STREAM_KEEPALIVE_SEC)
+                except asyncio.TimeoutError:
+                    yield b": keepalive\n\n"
+                    continue
+                sub.event.clear()
+                snap, sub.latest = sub.latest, None
+                if snap is None:
+                    continue
+                if delta and last is not None:
+                    body = json.dumps({**_diff(last, snap.data), "ts": snap.ts,
+                                       "coalesced": sub.coalesced}).encode()
+                    kind = b"delta"
+                else:
+                    body, kind = snap.body, b"snapshot"
+                last = snap.data
+                yield b"event: " + kind + b"\ndata: " + body + b"\n\n"
+        finally:
+            with _sub_lock:
+                _subscribers.discard(sub)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/history")
+def history_range(metric: str = Query(None), frm: float = Query(None, alias="from"),
+                  to: float = Query(None), step: float = Query(None, gt=0)):
+    """Range query over the on-disk history: avg/min/max/count per `step`
+    seconds between `from` and `to` (epoch s; default: the last hour), served
+    from the coarsest tier that satisfies the step.  Without `metric`, lists
+    the recorded metrics."""
+    if history is None:
+        raise HTTPException(503, "history disabled")
+    if metric is None:
+        return {"metrics": history.metrics(), "tiers": list(HISTORY_TIERS),
+                "rejected_samples": history.rejected}
+    now = time.time()
+    t1 = now if to is None else to
+    t0 = t1 - 3600 if frm is None else frm
+    if t0 > t1:
+        raise HTTPException(400, "'from' must not be after 'to'")
+    try:
+        return history.query(metric, t0, t1, step, now=now)
+    except KeyError:
+        raise HTTPException(404, f"unknown metric '{metric}'")
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+def _sketches_payload(w: int) -> dict:
+    now = time.time()
+    with hist_lock:
+        out = {"sched_latency_ms": lat_sketch.sketch(w, now).to_dict(),
+               "block_io_ms": io_sketch.sketch(w, now).to_dict()}
+    snap = _snapshot
+    return {"host_id": HOST_ID, "host_group": HOST_GROUP, "window_s": w,
+            "sketches": out, "metrics": snap.data["metrics"] if snap else {},
+            "ts": now}
+
+
+def push_worker():
+    """POST the sketches payload to AGGREGATOR_URL/ingest once per tick."""
+    url = AGGREGATOR_URL.rstrip("/") + "/ingest"
+    w = AGGREGATOR_WINDOW if AGGREGATOR_WINDOW in SKETCH_WINDOWS else max(SKETCH_WINDOWS)
+    while True:
+        time.sleep(SAMPLE_INTERVAL_SEC)
+        try:
+            req = urllib.request.Request(
+                url, data=json.dumps(_sketches_payload(w)).encode(),
+                headers={"Content-Type": "application/json"})
+            urllib.request.urlopen(req, timeout=2.0).close()
+        except Exception:
+            pass  # aggregator down: the next tick carries the whole window
+
+
+@app.get("/sketches")
+def sketches(window: int = None):
+    """Serialized window sketches plus the latest metrics, for fleet-level
+    merging without raw samples.
+
+    `window` selects one of SKETCH_WINDOWS (default: the longest)."""
+    w = window if window in SKETCH_WINDOWS else max(SKETCH_WINDOWS)
+    return JSONResponse(_sketches_payload(w))
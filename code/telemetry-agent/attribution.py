@@ -0,0 +1,240 @@
+"""
+attribution.py — per-CPU and per-cgroup breakdowns for the telemetry agent.
+
+  * AttributionTable : fixed-capacity table of per-key aggregates (last tick
+                       value + exponentially weighted window average per
+                       column).  Rows are preallocated numpy arrays; keys map
+                       to slots and the least recently seen key is evicted when
+                       the table is full, so memory is flat no matter how many
+                       CPUs or cgroups come and go.
+  * CgroupCollector  : cgroup v2 reader (cpu.stat, io.stat, *.pressure) for
+                       up to `max_cgroups` cgroups, with persistent handles.
+"""
+from __future__ import annotations
+
+import math
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+
+from collectors import Tick, ProcFile
+
+CPU_COLUMNS = ("runq_p50_ms", "runq_p95_ms", "runq_mean_ms", "util",
+               "sys_enter_rps")
+CGROUP_COLUMNS = ("cpu_usage", "throttled_frac", "io_rps", "io_bps",
+                  "psi_cpu_some", "psi_io_some", "psi_memory_some",
+                  "sys_enter_rps")
+
+
+class AttributionTable:
+    """Per-key aggregates in preallocated (capacity, n_columns) arrays.
+
+    `last` holds the most recent tick's value of each column (NaN = not
+    reported); `avg` an exponentially weighted mean with time constant
+    `window_s`, which approximates the sliding window without storing it.
+    """
+
+    def __init__(self, capacity: int, columns, window_s: float):
+        self.capacity = int(capacity)
+        self.columns = tuple(columns)
+        self._col = {c: i for i, c in enumerate(self.columns)}
+        self.window_s = float(window_s)
+        self.last = np.full((self.capacity, len(self.columns)), np.nan)
+        self.avg = np.full((self.capacity, len(self.columns)), np.nan)
+        self.seen = np.full(self.capacity, -np.inf)
+        self.keys = [None] * self.capacity
+        self._slot = {}
+
+    def __len__(self):
+        return len(self._slot)
+
+    def _slot_for(self, key, now: float) -> int:
+        i = self._slot.get(key)
+        if i is None:
+            i = int(np.argmin(self.seen))  # free slots have seen = -inf
+            old = self.keys[i]
+            if old is not None:
+                del self._slot[old]
+            self.keys[i] = key
+            self._slot[key] = i
+            self.last[i] = np.nan
+            self.avg[i] = np.nan
+            self.seen[i] = now
+        return i
+
+    def update(self, now: float, key, values: dict):
+        i = self._slot_for(key, now)
+        a = 1.0 - math.exp(-max(0.0, now - self.seen[i]) / self.window_s)
+        self.seen[i] = now
+        for col, v in values.items():
+            j = self._col.get(col)
+            if j is None or v is None or v != v:
+                continue
+            self.last[i, j] = v
+            prev = self.avg[i, j]
+            self.avg[i, j] = v if prev != prev else prev + a * (v - prev)
+
+    def update_columns(self, now: float, columns: dict):
+        """Vectorized update for integer keys 0..n-1 (e.g. CPU numbers)."""
+        n = max((len(v) for v in columns.values()), default=0)
+        n = min(n, self.capacity)
+        idx = np.array([self._slot_for(k, now) for k in range(n)], np.int64)
+        a = 1.0 - np.exp(-np.maximum(0.0, now - self.seen[idx]) / self.window_s)
+        self.seen[idx] = now
+        for col, vals in columns.items():
+            j = self._col.get(col)
+            if j is None:
+                continue
+            v = np.asarray(vals, float)[:n]
+            ok = ~np.isnan(v)
+            self.last[idx[ok], j] = v[ok]
+            prev = self.avg[idx, j]
+            upd = np.where(np.isnan(prev), v, prev + a * (v - prev))
+            self.avg[idx[ok], j] = upd[ok]
+
+    def expire(self, now: float, ttl_s: float):
+        """Free the slots of keys not reported for `ttl_s`."""
+        for key, i in list(self._slot.items()):
+            if now - self.seen[i] > ttl_s:
+                del self._slot[key]
+                self.keys[i] = None
+                self.seen[i] = -np.inf
+
+    def rows(self, match=None) -> list:
+        out = []
+        for key, i in sorted(self._slot.items(), key=lambda kv: str(kv[0])):
+            if match is not None and not match(key):
+                continue
+            row = {"key": key}
+            for c, j in self._col.items():
+                last, avg = self.last[i, j], self.avg[i, j]
+                if last == last:
+                    row[c] = {"last": float(last), "avg": float(avg)}
+            out.append(row)
+        return out
+
+
+class CgroupCollector:
+    """Per-cgroup CPU, I/O and pressure rates from cgroup v2 interface files.
+
+    Cgroups are discovered down to `depth` levels below `root` and rescanned
+    every `rescan_s`; at most `max_cgroups` are tracked (shallowest first).
+    `ids` maps each cgroup's id (its directory inode, as returned by
+    bpf_get_current_cgroup_id) to its path so eBPF per-cgroup counters can be
+    attributed.
+    """
+
+    name = "cgroup"
+    FILES = ("cpu.stat", "io.stat", "cpu.pressure", "io.pressure",
+             "memory.pressure")
+
+    def __init__(self, root: str = "/sys/fs/cgroup", depth: int = 2,
+                 max_cgroups: int = 256, rescan_s: float = 30.0):
+        self.root = Path(root)
+        self.depth = depth
+        self.max_cgroups = max_cgroups
+        self.rescan_s = rescan_s
+        self.ids = {}
+        self._files = {}   # path -> {file name: ProcFile}
+        self._prev = {}    # path -> (ts, np.ndarray of counters)
+        self._scanned = -math.inf
+
+    @property
+    def available(self) -> bool:
+        return (self.root / "cgroup.controllers").exists()
+
+    def _scan(self):
+        found = []
+        level = [self.root]
+        for _ in range(self.depth + 1):
+            found.extend(level)
+            if len(found) >= self.max_cgroups:
+                break
+            nxt = []
+            for d in level:
+                try:
+                    nxt.extend(sorted(p for p in d.iterdir() if p.is_dir()))
+                except OSError:
+                    pass
+            level = nxt
+        found = found[:self.max_cgroups]
+        keep = {"/" + str(p.relative_to(self.root)).lstrip(".") for p in found}
+        for path in list(self._files):
+            if path not in keep:
+                self._drop(path)
+        self.ids = {}
+        for p in found:
+            path = "/" + str(p.relative_to(self.root)).lstrip(".")
+            try:
+                self.ids[os.stat(p).st_ino] = path
+            except OSError:
+                continue
+            if path not in self._files:
+                files = {}
+                for name in self.FILES:
+                    try:
+                        files[name] = ProcFile(str(p / name))
+                    except OSError:
+                        pass
+                self._files[path] = files
+
+    def _drop(self, path: str):
+        for f in self._files.pop(path, {}).values():
+            f.close()
+        self._prev.pop(path, None)
+
+    @staticmethod
+    def _counters(files) -> np.ndarray:
+        # usage_usec, throttled_usec, ios, bytes, psi cpu/io/memory some totals
+        c = np.zeros(7)
+        f = files.get("cpu.stat")
+        if f:
+            for line in f.read().splitlines():
+                k, _, v = line.partition(b" ")
+                if k == b"usage_usec":
+                    c[0] = float(v)
+                elif k == b"throttled_usec":
+                    c[1] = float(v)
+        f = files.get("io.stat")
+        if f:
+            for line in f.read().splitlines():
+                for kv in line.split()[1:]:
+                    k, _, v = kv.partition(b"=")
+                    if k in (b"rios", b"wios"):
+                        c[2] += float(v)
+                    elif k in (b"rbytes", b"wbytes"):
+                        c[3] += float(v)
+        for j, name in enumerate(("cpu.pressure", "io.pressure",
+                                  "memory.pressure"), start=4):
+            f = files.get(name)
+            if f:
+                first = f.read().split(b"\n", 1)[0]  # the "some" line
+                c[j] = float(first.rpartition(b"total=")[2] or 0.0)
+        return c
+
+    def read(self) -> Tick:
+        now = time.time()
+        if now - self._scanned >= self.rescan_s:
+            self._scan()
+            self._scanned = now
+        out = {}
+        for path, files in list(self._files.items()):
+            try:
+                cur = self._counters(files)
+            except (OSError, ValueError):
+                self._drop(path)  # cgroup removed under us
+                continue
+            prev = self._prev.get(path)
+            self._prev[path] = (now, cur)
+            if prev is None:
+                continue
+            dt = max(1e-6, now - prev[0])
+            d = np.maximum(cur - prev[1], 0.0) / dt
+            out[path] = {"cpu_usage": d[0] / 1e6, "throttled_frac": d[1] / 1e6,
+                         "io_rps": d[2], "io_bps": d[3],
+                         "psi_cpu_some": min(1.0, d[4] / 1e6),
+                         "psi_io_some": min(1.0, d[5] / 1e6),
+                         "psi_memory_some": min(1.0, d[6] / 1e6)}
+        return Tick(None, None, None, {}, None, out)
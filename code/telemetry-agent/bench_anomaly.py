@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+bench_anomaly.py — streaming vs batch robust anomaly rate.
+
+Compares the per-tick cost of RobustOutliers (incremental sliding median/MAD)
+against recomputing `robust_anomaly_rate` from scratch over the same window,
+which is what /snapshot used to do on every call.  Each tick is one new sample
+(evicting the oldest) followed by one read; both paths must agree exactly.
+
+Usage:
+    python bench_anomaly.py --sizes 1000 10000 100000 --ticks 200
+"""
+import argparse
+import time
+
+import numpy as np
+
+from telemetry_core import RobustOutliers, robust_anomaly_rate
+
+
+def bench(n: int, ticks: int, k: float, seed: int):
+    rng = np.random.default_rng(seed)
+    x = rng.lognormal(2.5, 0.4, n + ticks)
+    x[rng.random(x.size) < 0.02] *= 4.0          # sprinkle tail spikes
+
+    det = RobustOutliers(horizon_s=n - 0.5, k=k)
+    for t in range(n):
+        det.update(float(t), float(x[t]))
+
+    t0 = time.perf_counter()
+    stream = []
+    for t in range(n, n + ticks):
+        det.update(float(t), float(x[t]))
+        stream.append(det.rate())
+    t_stream = (time.perf_counter() - t0) / ticks
+
+    t0 = time.perf_counter()
+    batch = []
+    for t in range(n, n + ticks):
+        batch.append(robust_anomaly_rate(x[t - n + 1:t + 1], k))
+    t_batch = (time.perf_counter() - t0) / ticks
+
+    t0 = time.perf_counter()
+    for _ in range(ticks):
+        det.rate()
+    t_read = (time.perf_counter() - t0) / ticks
+
+    return {"n": n, "stream_us": t_stream * 1e6, "read_us": t_read * 1e6,
+            "batch_us": t_batch * 1e6, "speedup": t_batch / t_stream,
+            "agree": bool(np.allclose(stream, batch, rtol=0, atol=1e-12))}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", type=int, nargs="+",
+                    default=[100, 1000, 10000, 100000])
+    ap.add_argument("--ticks", type=int, default=200)
+    ap.add_argument("--k", type=float, default=3.0)
+    ap.add_argument("--seed", type=int, default=0)
+    args = ap.parse_args()
+
+    print(f"{'window':>8} {'stream us/tick':>15} {'read us':>8} "
+          f"{'batch us/tick':>14} {'speedup':>8} {'agree':>6}")
+    for n in args.sizes:
+        r = bench(n, args.ticks, args.k, args.seed)
+        print(f"{r['n']:>8} {r['stream_us']:>15.1f} {r['read_us']:>8.2f} "
+              f"{r['batch_us']:>14.1f} {r['speedup']:>7.1f}x {str(r['agree']):>6}")
+
+
+if __name__ == "__main__":
+    main()
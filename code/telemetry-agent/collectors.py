@@ -0,0 +1,411 @@
+"""
+collectors.py — per-tick signal sources for the SemantOS telemetry agent.
+
+Each collector's `read()` returns a Tick holding what changed since the
+previous read, so the sampling loop in app.py is the same whichever source
+is active:
+
+  * BccCollector     : in-kernel log2 histograms (run-queue latency, block I/O
+                       latency), the sys_enter counters (total, per syscall
+                       id, per cgroup, per process), read from BPF maps.
+                       Maps are cumulative; per-tick deltas are taken here, so
+                       nothing is cleared and no events are lost between a read
+                       and a clear.
+  * FixtureCollector : replays recorded per-tick histograms from a JSONL file,
+                       so the userspace side runs without BCC or privileges.
+  * ProcfsCollector  : no-privilege fallback over /proc/schedstat,
+                       /proc/diskstats, /proc/pressure/* and /proc/stat, read
+                       through persistent file descriptors with pread.
+"""
+from __future__ import annotations
+
+import json
+import os
+import time
+from collections import namedtuple
+from pathlib import Path
+
+import numpy as np
+
+from telemetry_core import LOG2_SLOTS, hist_quantiles_rows, log2_slot_ms
+
+# sched / block: this tick's latency distribution as (values_ms, counts), values
+# ascending, or None when the source has no such signal; sys_enter: syscalls
+# entered during the tick (or None); gauges: {name: value} host-level gauges;
+# per_cpu: {column: array indexed by CPU}; per_cgroup: {cgroup path or id:
+# {column: value}} (see attribution.py for the column names); per_syscall:
+# {syscall id: count entered during the tick}; per_process: {(pid, comm):
+# {column: value}} (see topk.py).
+Tick = namedtuple("Tick", ["sched", "block", "sys_enter", "gauges", "per_cpu",
+                           "per_cgroup", "per_syscall", "per_process"],
+                  defaults=(None, None, None, None))
+
+# Host gauges a collector may report (fraction of wall time stalled for psi_*).
+GAUGES = ("psi_cpu_some", "psi_cpu_full", "psi_io_some", "psi_io_full",
+          "psi_memory_some", "psi_memory_full", "cpu_util", "ctx_switch_rps")
+
+SLOT_MS = log2_slot_ms()
+
+
+def _percpu_log2_counts(table) -> np.ndarray:
+    """(n_cpus, 64) slot counts of a BPF_PERCPU_ARRAY histogram."""
+    out = None
+    for k, v in table.items():
+        slot = int(k.value)
+        if out is None:
+            out = np.zeros((len(v), LOG2_SLOTS), np.int64)
+        if 0 <= slot < LOG2_SLOTS:
+            out[:, slot] = [int(x) for x in v]
+    return out if out is not None else np.zeros((1, LOG2_SLOTS), np.int64)
+
+
+def _percpu_rows(table, n: int) -> np.ndarray:
+    """Per-key totals (summed over CPUs) of an n-entry BPF_PERCPU_ARRAY."""
+    out = np.zeros(n, np.int64)
+    for k, v in table.items():
+        if 0 <= k.value < n:
+            out[k.value] = sum(v)
+    return out
+
+
+def _percpu_scalar(table) -> np.ndarray:
+    v = table[table.Key(0)]
+    return np.array([int(x) for x in v], np.int64)
+
+
+def _decode_log2(hist):
+    """Per-slot log2(us) counts -> (values_ms, counts) of the non-empty slots."""
+    if hist is None:
+        return None
+    nz = np.flatnonzero(hist)
+    return SLOT_MS[nz], hist[nz]
+
+
+class BccCollector:
+    """Reads the runq/bio histograms and syscall counters of a loaded BPF object.
+
+    Histograms and the syscall counters are per-CPU arrays (summed here for
+    the host view); per-cgroup and per-process syscalls come from LRU hashes
+    keyed by cgroup id and tgid.
+    """
+
+    name = "ebpf"
+
+    def __init__(self, tables: dict):
+        self.tables = tables
+        self._prev = {}
+        self._prev_ts = None
+        self._prev_pid = {}  # tgid -> syscall count as of the last read
+        self.dropped = 0  # in-kernel start stamps lost to full maps (cumulative)
+
+    def _delta(self, key, cur):
+        prev = self._prev.get(key)
+        self._prev[key] = cur
+        if prev is None or np.shape(prev) != np.shape(cur):
+            return cur * 0
+        return np.maximum(cur - prev, 0)
+
+    def read(self) -> Tick:
+        now = time.time()
+        dt = max(1e-6, now - self._prev_ts) if self._prev_ts else None
+        self._prev_ts = now
+        sched = block = sys_enter = None
+        per_cpu, per_cgroup = {}, {}
+        if self.tables.get("sched"):
+            m = self._delta("sched", _percpu_log2_counts(self.tables["sched"]))
+            sched = m.sum(axis=0)
+            p50, p95 = hist_quantiles_rows(SLOT_MS, m, [0.5, 0.95])
+            per_cpu.update(runq_p50_ms=p50, runq_p95_ms=p95)
+        if self.tables.get("block"):
+            block = self._delta("block",
+                                _percpu_log2_counts(self.tables["block"])).sum(axis=0)
+        if self.tables.get("sys_enter"):
+            cpu = self._delta("sys_enter", _percpu_scalar(self.tables["sys_enter"]))
+            sys_enter = int(cpu.sum())
+            if dt:
+                per_cpu["sys_enter_rps"] = cpu / dt
+        if self.tables.get("cg_sys_enter") is not None:  # may start empty
+            for k, v in self.tables["cg_sys_enter"].items():
+                cgid = int(k.value)
+                d = int(self._delta(("cg", cgid), int(v.value)))
+                if d and dt:
+                    per_cgroup[cgid] = {"sys_enter_rps": d / dt}
+            if len(self._prev) > 4 * 1024:  # forget ids the LRU map evicted
+                self._prev = {k: v for k, v in self._prev.items()
+                              if not isinstance(k, tuple)}
+        per_syscall = per_process = None
+        if self.tables.get("sys_by_id") is not None:
+            t = self.tables["sys_by_id"]
+            d = self._delta("sys_by_id", _percpu_rows(t, len(t)))
+            per_syscall = {int(i): int(d[i]) for i in np.flatnonzero(d)}
+        if self.tables.get("sys_by_pid") is not None:
+            cur, per_process = {}, {}
+            for k, v in self.tables["sys_by_pid"].items():
+                comm = v.comm.decode(errors="replace")
+                cur[k.value] = v.count
+                prev = self._prev_pid.get(k.value)
+                # keys absent last read were created since; a smaller count
+                # means the exit probe deleted the entry and the tgid was reused
+                n = v.count - prev if prev is not None and v.count >= prev else v.count
+                if n:
+                    per_process[(k.value, comm)] = {"syscalls": n}
+            self._prev_pid = cur  # only keys still in the map: bounded
+        if self.tables.get("drops") is not None:
+            self.dropped = int(_percpu_scalar(self.tables["drops"]).sum())
+        return Tick(_decode_log2(sched), _decode_log2(block), sys_enter, {},
+                    per_cpu, per_cgroup, per_syscall, per_process)
+
+
+class FixtureCollector:
+    """Replays recorded ticks, one JSON object per line:
+
+        {"sched_us": [c0, c1, ...], "block_us": [...], "sys_enter": n,
+         "sys_by_id": {"<syscall id>": n}, "sys_by_pid": [[pid, comm, n]]}
+
+    Histogram lists are per-tick log2(us) slot counts (shorter lists are
+    zero-padded to 64 slots); missing keys mean the probe was unavailable.
+    Playback loops when `loop` is set, else the last tick repeats empty.
+    """
+
+    name = "fixture"
+
+    def __init__(self, path, loop: bool = True):
+        self.path = Path(path)
+        self.loop = loop
+        self._ticks = [self._parse(json.loads(line))
+                       for line in self.path.read_text().splitlines()
+                       if line.strip()]
+        if not self._ticks:
+            raise ValueError(f"empty histogram fixture: {self.path}")
+        self._i = 0
+
+    @staticmethod
+    def _hist(vals):
+        if vals is None:
+            return None
+        out = np.zeros(LOG2_SLOTS, np.int64)
+        vals = np.asarray(vals, np.int64)[:LOG2_SLOTS]
+        out[:vals.size] = vals
+        return _decode_log2(out)
+
+    def _parse(self, rec: dict) -> Tick:
+        sys_enter = rec.get("sys_enter")
+        by_id, by_pid = rec.get("sys_by_id"), rec.get("sys_by_pid")
+        return Tick(self._hist(rec.get("sched_us")), self._hist(rec.get("block_us")),
+                    int(sys_enter) if sys_enter is not None else None, {},
+                    per_syscall=None if by_id is None else
+                    {int(k): int(v) for k, v in by_id.items()},
+                    per_process=None if by_pid is None else
+                    {(int(pid), comm): {"syscalls": int(n)} for pid, comm, n in by_pid})
+
+    def read(self) -> Tick:
+        if self._i >= len(self._ticks):
+            if not self.loop:
+                t = self._ticks[-1]
+                empty = (SLOT_MS[:0], np.zeros(0, np.int64))
+                return Tick(empty if t.sched is not None else None,
+                            empty if t.block is not None else None,
+                            0 if t.sys_enter is not None else None, {})
+            self._i = 0
+        tick = self._ticks[self._i]
+        self._i += 1
+        return tick
+
+
+# --------------------------------------------------------------------------- #
+# procfs / PSI fallback.
+# --------------------------------------------------------------------------- #
+class ProcFile:
+    """A procfs file kept open for the agent's lifetime and re-read from offset
+    0 with pread, so sampling costs one syscall instead of open/read/close."""
+
+    def __init__(self, path: str, bufsize: int = 4096):
+        self.path = path
+        self.bufsize = bufsize
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self) -> bytes:
+        while True:
+            data = os.pread(self.fd, self.bufsize, 0)
+            if len(data) < self.bufsize:
+                return data
+            self.bufsize *= 2  # seq_file truncated the read; retry larger
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _open(path: str):
+    try:
+        return ProcFile(path)
+    except OSError:
+        return None
+
+
+class ProcfsCollector:
+    """Scheduling, I/O and pressure signals without eBPF or privileges.
+
+      * run-queue latency: per CPU, delta(run_delay_ns) / delta(timeslices)
+        from /proc/schedstat -- the mean wait per timeslice on that CPU; the
+        tick's distribution is those per-CPU means weighted by timeslices.
+      * block I/O latency: per whole disk, delta(ms reading + ms writing) /
+        delta(completed I/Os) from /proc/diskstats, weighted by I/Os.
+      * psi_*: fraction of the tick some/all tasks stalled, from the `total=`
+        counters of /proc/pressure/{cpu,io,memory}.
+      * cpu_util, ctx_switch_rps: from the cpu and ctxt lines of /proc/stat.
+
+    `intervals` maps a source ("schedstat", "diskstats", "pressure", "stat")
+    to its minimum re-read period in seconds; a source that is not due reports
+    nothing this tick, and its deltas span its own period.
+    """
+
+    name = "procfs"
+
+    def __init__(self, intervals: dict = None, sources=None, root: str = "/proc"):
+        self.intervals = intervals or {}
+        wanted = sources or ("schedstat", "diskstats", "pressure", "stat")
+        self.files = {}
+        for src in wanted:
+            if src == "pressure":
+                for res in ("cpu", "io", "memory"):
+                    f = _open(f"{root}/pressure/{res}")
+                    if f:
+                        self.files[f"pressure/{res}"] = f
+            else:
+                f = _open(f"{root}/{src}")
+                if f:
+                    self.files[src] = f
+        self._disks = None
+        self._prev = {}
+        self._last = {}
+
+    @property
+    def available(self) -> bool:
+        return bool(self.files)
+
+    def _due(self, src: str, now: float) -> bool:
+        last = self._last.get(src)
+        if last is not None and now - last < self.intervals.get(src, 0.0):
+            return False
+        self._last[src] = now
+        return True
+
+    def _delta(self, key, cur: np.ndarray, now: float):
+        prev = self._prev.get(key)
+        self._prev[key] = (now, cur)
+        if prev is None or prev[1].shape != cur.shape:
+            return None, 0.0
+        return np.maximum(cur - prev[1], 0), max(1e-6, now - prev[0])
+
+    def _schedstat(self, now):
+        # cpuN <7 legacy fields> running_ns run_delay_ns timeslices
+        rows = [line.split()[7:10] for line in self.files["schedstat"].read().splitlines()
+                if line.startswith(b"cpu")]
+        cur = np.array(rows, np.float64).reshape(-1, 3)
+        d, _ = self._delta("schedstat", cur, now)
+        if d is None:
+            return None, None
+        slices = d[:, 2]
+        busy = slices > 0
+        mean_ms = np.full(slices.size, np.nan)
+        mean_ms[busy] = d[busy, 1] / slices[busy] / 1e6
+        vals = mean_ms[busy]
+        order = np.argsort(vals)
+        return (vals[order], slices[busy][order].astype(np.int64)), mean_ms
+
+    def _whole_disks(self, names):
+        return {n for n in names if os.path.exists(f"/sys/block/{n.decode()}")}
+
+    def _diskstats(self, now):
+        rows, names = [], []
+        for line in self.files["diskstats"].read().splitlines():
+            f = line.split()
+            if len(f) < 11:
+                continue
+            names.append(f[2])
+            # reads_completed, ms_reading, writes_completed, ms_writing
+            rows.append((f[3], f[6], f[7], f[10]))
+        if self._disks is None:
+            self._disks = self._whole_disks(names)
+        keep = [i for i, n in enumerate(names) if n in self._disks]
+        cur = np.array([rows[i] for i in keep], np.float64).reshape(-1, 4)
+        d, _ = self._delta(("diskstats", tuple(names[i] for i in keep)), cur, now)
+        if d is None:
+            return None
+        ios = d[:, 0] + d[:, 2]
+        busy = ios > 0
+        vals = (d[busy, 1] + d[busy, 3]) / ios[busy]
+        order = np.argsort(vals)
+        return vals[order], ios[busy][order].astype(np.int64)
+
+    def _pressure(self, now, gauges):
+        for key, f in self.files.items():
+            if not key.startswith("pressure/"):
+                continue
+            res = key.split("/", 1)[1]
+            totals = {}
+            for line in f.read().splitlines():
+                kind, _, rest = line.partition(b" ")
+                totals[kind.decode()] = float(rest.rpartition(b"total=")[2])
+            cur = np.array([totals.get("some", 0.0), totals.get("full", 0.0)])
+            d, dt = self._delta(key, cur, now)
+            if d is not None:
+                gauges[f"psi_{res}_some"] = min(1.0, d[0] / 1e6 / dt)
+                if "full" in totals:
+                    gauges[f"psi_{res}_full"] = min(1.0, d[1] / 1e6 / dt)
+
+    def _stat(self, now, gauges):
+        cpu = ctxt = None
+        cpus = []
+        for line in self.files["stat"].read().splitlines():
+            if line.startswith(b"cpu "):
+                cpu = line.split()[1:9]
+            elif line.startswith(b"cpu"):
+                cpus.append(line.split()[1:9])
+            elif line.startswith(b"ctxt "):
+                ctxt = line.split()[1]
+        if cpu is None or ctxt is None:
+            return None
+        cur = np.array(cpu + [ctxt], np.float64)
+        d, dt = self._delta("stat", cur, now)
+        dc, _ = self._delta("stat/cpus", np.array(cpus, np.float64), now)
+        if d is None or dc is None:
+            return None
+        total = d[:8].sum()
+        if total > 0:
+            gauges["cpu_util"] = 1.0 - (d[3] + d[4]) / total  # idle + iowait
+        gauges["ctx_switch_rps"] = d[8] / dt
+        tot = dc.sum(axis=1)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(tot > 0, 1.0 - (dc[:, 3] + dc[:, 4]) / tot, np.nan)
+
+    def read(self) -> Tick:
+        now = time.time()
+        sched = block = None
+        gauges, per_cpu = {}, {}
+        try:
+            if "schedstat" in self.files and self._due("schedstat", now):
+                sched, mean_ms = self._schedstat(now)
+                if mean_ms is not None:
+                    per_cpu["runq_mean_ms"] = mean_ms
+            if "diskstats" in self.files and self._due("diskstats", now):
+                block = self._diskstats(now)
+            if any(k.startswith("pressure/") for k in self.files) \
+                    and self._due("pressure", now):
+                self._pressure(now, gauges)
+            if "stat" in self.files and self._due("stat", now):
+                util = self._stat(now, gauges)
+                if util is not None:
+                    per_cpu["util"] = util
+        except (OSError, ValueError, IndexError):
+            pass
+        return Tick(sched, block, None, gauges, per_cpu)
+
+
+def parse_intervals(spec: str) -> dict:
+    """"schedstat=1,pressure=5" -> {"schedstat": 1.0, "pressure": 5.0}."""
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        k, _, v = part.partition("=")
+        out[k.strip()] = float(v)
+    return out
@@ -0,0 +1,86 @@
+"""
+exposition.py — OpenMetrics text rendering for the telemetry agent's /metrics.
+
+The page is assembled from per-family text fragments.  Each family is
+registered with a change key (e.g. a histogram's version counter, or the
+gauge value itself); `render` re-formats only the families whose key moved
+since the previous tick and joins the cached fragments into one pre-encoded
+body, so scrapes between ticks are a plain bytes copy.
+"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+
+def _num(v: float) -> str:
+    if v != v:
+        return "NaN"
+    if math.isinf(v):
+        return "+Inf" if v > 0 else "-Inf"
+    return repr(float(v))
+
+
+def _labels(labels: dict) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in labels.items())
+    return "{" + body + "}"
+
+
+def histogram_text(name: str, help_: str, upper: np.ndarray, counts: np.ndarray,
+                   total_sum: float, unit: str = "", labels: dict = None) -> str:
+    """Histogram family from per-bucket (non-cumulative) counts with upper
+    bounds `upper`, ascending.  Buckets above the highest non-empty one are
+    folded into +Inf."""
+    lab = dict(labels or {})
+    nz = np.flatnonzero(counts)
+    top = int(nz[-1]) + 1 if nz.size else 1
+    cum = np.cumsum(counts[:top])
+    total = int(counts.sum())
+    lines = [f"# TYPE {name} histogram", f"# HELP {name} {help_}"]
+    if unit:
+        lines.append(f"# UNIT {name} {unit}")
+    for le, c in zip(upper[:top], cum):
+        lines.append(f"{name}_bucket{_labels({**lab, 'le': _num(le)})} {int(c)}")
+    lines.append(f"{name}_bucket{_labels({**lab, 'le': '+Inf'})} {total}")
+    lines.append(f"{name}_count{_labels(lab)} {total}")
+    lines.append(f"{name}_sum{_labels(lab)} {_num(total_sum)}")
+    return "\n".join(lines) + "\n"
+
+
+def counter_text(name: str, help_: str, value: float, labels: dict = None) -> str:
+    return (f"# TYPE {name} counter\n# HELP {name} {help_}\n"
+            f"{name}_total{_labels(labels)} {_num(value)}\n")
+
+
+def gauge_text(name: str, help_: str, value: float, labels: dict = None) -> str:
+    return (f"# TYPE {name} gauge\n# HELP {name} {help_}\n"
+            f"{name}{_labels(labels)} {_num(value)}\n")
+
+
+class MetricsPage:
+    """Cached OpenMetrics page with per-family incremental re-rendering."""
+
+    def __init__(self):
+        self._keys = {}
+        self._text = {}
+        self.body = b"# EOF\n"
+        self.rendered = 0  # families re-formatted, for self-inspection
+
+    def render(self, families) -> bytes:
+        """`families`: iterable of (name, change_key, fn() -> text)."""
+        seen = []
+        for name, key, fn in families:
+            seen.append(name)
+            if name not in self._text or self._keys[name] != key:
+                self._text[name] = fn()
+                self._keys[name] = key
+                self.rendered += 1
+        for name in set(self._text) - set(seen):
+            del self._text[name], self._keys[name]
+        self.body = ("".join(self._text[n] for n in seen) + "# EOF\n").encode()
+        return self.body
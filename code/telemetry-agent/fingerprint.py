@@ -0,0 +1,76 @@
+"""
+fingerprint.py — fixed-length workload fingerprint for the telemetry agent.
+
+Each published snapshot is summarized into FINGERPRINT_DIM features in
+[0, 1], in the fixed order of FEATURES, so two hosts (or two moments) can be
+compared with a plain vector distance and the vector can key a nearest-
+neighbour index:
+
+  * latencies (ms)        : log10(us) / 7, i.e. 1 us .. 10 s -> 0 .. 1
+  * rates (per s, KB/s)   : log10(1 + x) / 7
+  * ratios                : as is (PSI stall fractions, CPU utilisation,
+                            syscall class shares, anomaly rate)
+  * load                  : 1-minute load per CPU / 2
+
+A signal the host does not report is 0.  The layout is versioned; bump
+FINGERPRINT_VERSION whenever FEATURES changes.
+"""
+from __future__ import annotations
+
+import os
+
+import numpy as np
+
+FINGERPRINT_VERSION = 1
+
+# (name, source, key, transform); source "m" reads a snapshot metric (the
+# headline p50/p95 are already the longest sketch window's quantiles), and
+# "q:<sketch>" a quantile of that sketch's longest window
+FEATURES = (
+    ("sched_p50", "m", "median_latency_ms", "latency"),
+    ("sched_p95", "m", "p95_latency_ms", "latency"),
+    ("sched_p99", "q:sched_latency_ms", "p99", "latency"),
+    ("block_p95", "m", "p95_block_io_ms", "latency"),
+    ("block_p99", "q:block_io_ms", "p99", "latency"),
+    ("syscall_rate", "m", "sys_enter_rps", "rate"),
+    ("ctx_switch_rate", "m", "ctx_switch_rps", "rate"),
+    ("throughput", "m", "throughput_kbps", "rate"),
+    ("cpu_util", "m", "cpu_util", "ratio"),
+    ("load_per_cpu", "m", "cpu_load_1", "load"),
+    ("psi_cpu_some", "m", "psi_cpu_some", "ratio"),
+    ("psi_cpu_full", "m", "psi_cpu_full", "ratio"),
+    ("psi_io_some", "m", "psi_io_some", "ratio"),
+    ("psi_io_full", "m", "psi_io_full", "ratio"),
+    ("psi_memory_some", "m", "psi_memory_some", "ratio"),
+    ("psi_memory_full", "m", "psi_memory_full", "ratio"),
+    ("syscall_io_share", "m", "syscall_io_share", "ratio"),
+    ("syscall_net_share", "m", "syscall_net_share", "ratio"),
+    ("syscall_sched_share", "m", "syscall_sched_share", "ratio"),
+    ("syscall_mem_share", "m", "syscall_mem_share", "ratio"),
+    ("syscall_other_share", "m", "syscall_other_share", "ratio"),
+    ("anomaly_rate", "m", "anomaly_rate", "ratio"),
+)
+FEATURE_NAMES = tuple(f[0] for f in FEATURES)
+FINGERPRINT_DIM = len(FEATURES)
+
+_KIND = np.array([f[3] for f in FEATURES])
+_LATENCY = _KIND == "latency"
+_RATE = _KIND == "rate"
+_LOAD = _KIND == "load"
+_N_CPUS = os.cpu_count() or 1
+
+
+def fingerprint(metrics: dict, quantiles: dict) -> np.ndarray:
+    """The snapshot's feature vector (float32, FINGERPRINT_DIM)."""
+    windows = {}
+    for name, wins in (quantiles or {}).items():
+        if wins:  # longest window, e.g. "60s"
+            windows[name] = wins[max(wins, key=lambda w: float(w.rstrip("s")))]
+    raw = np.array([(windows.get(src[2:], {}) if src != "m" else metrics).get(key)
+                    or 0.0 for _, src, key, _ in FEATURES], np.float64)
+    raw = np.nan_to_num(raw, nan=0.0, posinf=0.0, neginf=0.0)
+    out = raw.copy()
+    out[_LATENCY] = np.log10(np.maximum(raw[_LATENCY] * 1000.0, 1.0)) / 7.0
+    out[_RATE] = np.log10(1.0 + np.maximum(raw[_RATE], 0.0)) / 7.0
+    out[_LOAD] = raw[_LOAD] / _N_CPUS / 2.0
+    return np.clip(out, 0.0, 1.0).astype(np.float32)
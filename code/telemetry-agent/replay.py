@@ -0,0 +1,130 @@
+"""
+replay.py — recorded-telemetry playback for the telemetry agent.
+
+Loads a trace into memory once and hands out records on a clock scaled by
+`speed`, so the reasoner / safety-runtime loop can be driven faster than real
+time and a recorded incident replays the same sequence every run.  Accepted
+sources (a file, a glob, or a directory searched for `*/run_*.log`):
+
+  * JSONL traces: one snapshot per line as served by `/snapshot` (e.g. written
+    by the agent with RECORD_PATH set), or a flat {metric: value, "ts": ...}.
+  * workload CSVs (`outputs/<workload>/run_*.log`):
+        timestamp,metric,median_ms,p95_ms,throughput,anomaly_rate
+    with anomaly_rate in basis points.
+"""
+from __future__ import annotations
+
+import csv
+import glob
+import json
+import os
+import time
+from datetime import datetime
+
+
+def _epoch(ts) -> float:
+    """Epoch seconds from a number or an ISO-8601 string ("...Z" allowed)."""
+    try:
+        return float(ts)
+    except (TypeError, ValueError):
+        return datetime.fromisoformat(str(ts).replace("Z", "+00:00")).timestamp()
+
+
+def _csv_records(path: str) -> list:
+    out = []
+    with open(path, newline="") as f:
+        for row in csv.DictReader(f):
+            try:
+                out.append((_epoch(row["timestamp"]), {
+                    "metrics": {
+                        "median_latency_ms": float(row["median_ms"]),
+                        "p95_latency_ms": float(row["p95_ms"]),
+                        "throughput_kbps": float(row["throughput"]),
+                        "anomaly_rate": float(row["anomaly_rate"]) / 1e4,
+                    },
+                    "workload": row.get("metric", ""),
+                }))
+            except (KeyError, ValueError):
+                continue  # malformed row
+    return out
+
+
+def _jsonl_records(path: str) -> list:
+    out = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("data:"):  # a captured /stream
+                line = line[5:].strip()
+            if not line.startswith("{"):
+                continue
+            rec = json.loads(line)
+            ts = _epoch(rec.pop("ts", 0.0))
+            if "metrics" not in rec:
+                rec = {"metrics": rec}
+            out.append((ts, rec))
+    return out
+
+
+def resolve(spec: str) -> list:
+    if os.path.isdir(spec):
+        return sorted(glob.glob(os.path.join(spec, "*", "run_*.log")))
+    return sorted(glob.glob(spec)) or [spec]
+
+
+class Replayer:
+    """Cycles through the records of one or more trace files.
+
+    Gaps between consecutive records are taken from their timestamps (files
+    are concatenated back to back); a non-increasing timestamp -- e.g. CSV
+    rows written within the same second -- falls back to `default_gap_s`.
+    `speed` divides every gap; 0 replays as fast as the consumer loop allows.
+    """
+
+    def __init__(self, spec: str, speed: float = 1.0, loop: bool = True,
+                 default_gap_s: float = 1.0):
+        self.files = resolve(spec)
+        self.speed = float(speed)
+        self.loop = loop
+        self.default_gap_s = default_gap_s
+        self.records, self.gaps, self.sources = [], [], []
+        for path in self.files:
+            recs = _csv_records(path) if not path.endswith((".jsonl", ".json")) \
+                else _jsonl_records(path)
+            prev = None
+            for ts, rec in recs:
+                gap = ts - prev if prev is not None and ts > prev else default_gap_s
+                self.gaps.append(gap if self.records else 0.0)
+                self.records.append(rec)
+                self.sources.append(path)
+                prev = ts
+        if not self.records:
+            raise ValueError(f"no replayable records in {spec!r}")
+        self.index = 0
+        self.lap = 0
+        self.done = False
+
+    def current(self, now: float = None) -> dict:
+        """The record in effect, shaped as a snapshot body stamped `now`."""
+        rec = self.records[self.index]
+        return {**rec, "replay": {"source": os.path.basename(self.sources[self.index]),
+                                  "index": self.index, "lap": self.lap,
+                                  "records": len(self.records), "speed": self.speed},
+                "ts": time.time() if now is None else now}
+
+    def delay(self) -> float:
+        """Wall-clock wait before the next record."""
+        nxt = self.index + 1
+        gap = self.gaps[nxt] if nxt < len(self.gaps) else self.default_gap_s
+        return gap / self.speed if self.speed > 0 else 0.0
+
+    def advance(self) -> bool:
+        """Step to the next record; False once a non-looping trace has ended."""
+        if self.index + 1 < len(self.records):
+            self.index += 1
+        elif self.loop:
+            self.index = 0
+            self.lap += 1
+        else:
+            self.done = True
+        return not self.done
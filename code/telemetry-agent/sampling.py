@@ -0,0 +1,98 @@
+"""
+sampling.py — lease-based sampling-rate control for the telemetry agent.
+
+The agent samples at `idle_interval_s` unless some client holds a lease for a
+faster rate, e.g. the safety-runtime for the duration of a canary rollout.
+Each lease asks for a rate (Hz) until it expires; the effective interval is
+that of the fastest live lease, never below `min_interval_s`.  Leases that are
+not renewed simply lapse, so a client that crashes mid-rollout cannot pin the
+agent at a high rate.  Workers block in `wait`, which returns early whenever
+the lease set changes so a new lease takes effect immediately.
+"""
+from __future__ import annotations
+
+import secrets
+import threading
+import time
+
+
+class SamplingController:
+    def __init__(self, idle_interval_s: float, min_interval_s: float,
+                 max_ttl_s: float = 3600.0, max_leases: int = 64):
+        self.idle_interval_s = float(idle_interval_s)
+        self.min_interval_s = float(min(min_interval_s, idle_interval_s))
+        self.max_ttl_s = float(max_ttl_s)
+        self.max_leases = max_leases
+        self.version = 0  # bumped on every lease change
+        self._leases = {}  # id -> {"holder", "interval_s", "expires_at", ...}
+        self._cond = threading.Condition()
+
+    def _expire(self, now: float):
+        for lid in [lid for lid, l in self._leases.items() if l["expires_at"] <= now]:
+            del self._leases[lid]
+            self.version += 1
+
+    def _changed(self):
+        self.version += 1
+        self._cond.notify_all()
+
+    def _view(self, lid: str, now: float) -> dict:
+        l = self._leases[lid]
+        return {"lease_id": lid, **l, "hz": 1.0 / l["interval_s"],
+                "remaining_s": max(0.0, l["expires_at"] - now)}
+
+    def acquire(self, hz: float, ttl_s: float, holder: str = "") -> dict:
+        """New lease for `hz` samples per second (clamped to the allowed range)
+        lasting `ttl_s` seconds.  OverflowError when too many are live."""
+        now = time.time()
+        with self._cond:
+            self._expire(now)
+            if len(self._leases) >= self.max_leases:
+                raise OverflowError("too many sampling leases")
+            lid = secrets.token_hex(8)
+            interval = min(self.idle_interval_s, max(self.min_interval_s, 1.0 / hz))
+            self._leases[lid] = {"holder": holder, "interval_s": interval,
+                                 "granted_at": now,
+                                 "expires_at": now + min(ttl_s, self.max_ttl_s)}
+            self._changed()
+            return self._view(lid, now)
+
+    def renew(self, lease_id: str, ttl_s: float) -> dict:
+        """Extend a live lease to `ttl_s` from now; KeyError once it lapsed."""
+        now = time.time()
+        with self._cond:
+            self._expire(now)
+            self._leases[lease_id]["expires_at"] = now + min(ttl_s, self.max_ttl_s)
+            return self._view(lease_id, now)
+
+    def release(self, lease_id: str) -> bool:
+        with self._cond:
+            if self._leases.pop(lease_id, None) is None:
+                return False
+            self._changed()
+            return True
+
+    def interval(self, now: float = None) -> float:
+        """Current sampling interval (s): the fastest live lease, else idle."""
+        now = time.time() if now is None else now
+        with self._cond:
+            self._expire(now)
+            return min((l["interval_s"] for l in self._leases.values()),
+                       default=self.idle_interval_s)
+
+    def wait(self, timeout: float, version: int) -> int:
+        """Sleep up to `timeout` s unless the lease set has changed since
+        `version` was read; returns the current version."""
+        with self._cond:
+            if self.version == version and timeout > 0:
+                self._cond.wait(timeout)
+            return self.version
+
+    def state(self) -> dict:
+        now = time.time()
+        interval = self.interval(now)
+        with self._cond:
+            leases = [self._view(lid, now) for lid in self._leases]
+        return {"interval_s": interval, "hz": 1.0 / interval,
+                "idle_interval_s": self.idle_interval_s,
+                "min_interval_s": self.min_interval_s, "leases": leases}
@@ -0,0 +1,123 @@
+"""
+selfstats.py — the telemetry agent's own overhead, cheap enough to read every
+tick:
+
+  * Timing       : count / last / EWMA / max latency (ms) of a repeated step,
+                   e.g. one collector's read().
+  * SelfUsage    : process CPU seconds (os.times) and RSS (/proc/self/statm,
+                   one pread), with CPU% over the interval since the last read.
+  * BpfProgStats : per-program run_cnt / run_time_ns of loaded BPF programs,
+                   from /proc/self/fdinfo/<prog fd>; the kernel only counts
+                   while kernel.bpf_stats_enabled is 1.
+"""
+from __future__ import annotations
+
+import os
+import time
+
+from collectors import ProcFile
+
+BPF_STATS_SYSCTL = "/proc/sys/kernel/bpf_stats_enabled"
+
+
+class Timing:
+    __slots__ = ("count", "errors", "last_ms", "avg_ms", "max_ms", "_alpha")
+
+    def __init__(self, alpha: float = 0.1):
+        self.count = self.errors = 0
+        self.last_ms = self.avg_ms = self.max_ms = 0.0
+        self._alpha = alpha
+
+    def observe(self, ms: float):
+        self.count += 1
+        self.last_ms = ms
+        self.avg_ms = ms if self.count == 1 else self.avg_ms + self._alpha * (ms - self.avg_ms)
+        if ms > self.max_ms:
+            self.max_ms = ms
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "errors": self.errors, "last_ms": self.last_ms,
+                "avg_ms": self.avg_ms, "max_ms": self.max_ms}
+
+
+class SelfUsage:
+    def __init__(self):
+        self._page = os.sysconf("SC_PAGE_SIZE")
+        try:
+            self._statm = ProcFile("/proc/self/statm")
+        except OSError:
+            self._statm = None
+        self._prev = (time.monotonic(), self._cpu_s())
+
+    @staticmethod
+    def _cpu_s() -> float:
+        t = os.times()
+        return t.user + t.system
+
+    def rss_bytes(self) -> int:
+        if self._statm is None:
+            return 0
+        return int(self._statm.read().split()[1]) * self._page
+
+    def read(self) -> dict:
+        now, cpu = time.monotonic(), self._cpu_s()
+        t0, c0 = self._prev
+        self._prev = (now, cpu)
+        t = os.times()
+        return {"cpu_user_s": t.user, "cpu_system_s": t.system,
+                "cpu_percent": 100.0 * (cpu - c0) / max(1e-6, now - t0),
+                "rss_bytes": self.rss_bytes(), "threads": _threads()}
+
+
+def _threads() -> int:
+    try:
+        return len(os.listdir("/proc/self/task"))
+    except OSError:
+        return 0
+
+
+def enable_bpf_stats() -> bool:
+    """Turn on kernel BPF run-time accounting (needs CAP_SYS_ADMIN); returns
+    whether it is on."""
+    try:
+        with open(BPF_STATS_SYSCTL, "r+") as f:
+            if f.read().strip() != "1":
+                f.seek(0)
+                f.write("1")
+        return True
+    except OSError:
+        return bpf_stats_enabled()
+
+
+def bpf_stats_enabled() -> bool:
+    try:
+        with open(BPF_STATS_SYSCTL) as f:
+            return f.read().strip() == "1"
+    except OSError:
+        return False
+
+
+class BpfProgStats:
+    """run_cnt / run_time_ns per BPF program, keyed by program name."""
+
+    def __init__(self, prog_fds: dict):
+        self._files = {}
+        for name, fd in prog_fds.items():
+            try:
+                self._files[name] = ProcFile(f"/proc/self/fdinfo/{fd}")
+            except OSError:
+                pass
+
+    def read(self) -> dict:
+        out = {}
+        for name, f in self._files.items():
+            row = {}
+            for line in f.read().splitlines():
+                k, _, v = line.partition(b":")
+                if k in (b"run_cnt", b"run_time_ns"):
+                    row[k.decode()] = int(v)
+            if row:
+                cnt = row.get("run_cnt", 0)
+                row["avg_ns"] = row.get("run_time_ns", 0) / cnt if cnt else 0.0
+                out[name] = row
+        return out
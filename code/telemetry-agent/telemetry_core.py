@@ -0,0 +1,523 @@
+"""
+telemetry_core.py — sliding-window primitives for the SemantOS telemetry agent.
+
+Dependency-light (numpy only) so the sampling thread never allocates per-sample
+Python objects and `/snapshot` reads stay vectorized:
+
+  * RingWindow     : preallocated circular buffer of (ts, value columns)
+                     samples with O(1) append and time-bounded, vectorized
+                     quantile reads; each sample also records the time it
+                     covers, so reads can weight by time when the sampling
+                     interval varies.
+  * QuantileSketch : mergeable, serializable DDSketch-style log-bucketed
+                     histogram with relative-error quantiles.
+  * WindowedSketch : per-slot sketches rolled into 1s/10s/60s-style window
+                     aggregates so any quantile is an O(bins) read.
+  * RobustOutliers : sliding median + MAD outlier rate maintained per sample,
+                     so `anomaly_rate` reads are O(1).
+  * log2 helpers   : decode the in-kernel log2 latency histograms (64 slots)
+                     and accumulate them as monotonic bucket counters.
+"""
+from __future__ import annotations
+
+import bisect
+import math
+from collections import deque
+from itertools import accumulate
+
+import numpy as np
+
+
+class RingWindow:
+    """Fixed-capacity circular buffer of timestamped samples.
+
+    Storage is two preallocated arrays: `ts` (capacity,) and `val`
+    (capacity, n_columns).  `append` overwrites the oldest slot in O(1); reads
+    mask out samples older than `horizon_s` instead of rebuilding the window,
+    so the writer never pays for expiry.  Capacity must cover the horizon at
+    the fastest sampling rate or the oldest in-horizon samples are overwritten.
+    `dt` holds the time since the previous append (0 for the first sample),
+    i.e. the span each per-tick value summarizes.
+    """
+
+    def __init__(self, horizon_s: float, capacity: int, columns=("value",)):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.horizon_s = float(horizon_s)
+        self.capacity = int(capacity)
+        self.columns = tuple(columns)
+        self._col = {c: i for i, c in enumerate(self.columns)}
+        self.ts = np.full(self.capacity, -np.inf)
+        self.val = np.zeros((self.capacity, len(self.columns)))
+        self.dt = np.zeros(self.capacity)
+        self._head = 0
+        self._n = 0
+        self._last_ts = None
+
+    @classmethod
+    def for_rate(cls, horizon_s: float, interval_s: float, columns=("value",)):
+        """Size a window to hold `horizon_s` of samples taken every `interval_s`."""
+        cap = int(math.ceil(horizon_s / max(1e-6, interval_s))) + 1
+        return cls(horizon_s, cap, columns)
+
+    def __len__(self):
+        return self._n
+
+    def append(self, ts: float, *values: float) -> None:
+        i = self._head
+        self.ts[i] = ts
+        self.val[i, :] = values
+        self.dt[i] = 0.0 if self._last_ts is None else \
+            min(max(0.0, ts - self._last_ts), self.horizon_s)
+        self._last_ts = ts
+        self._head = (i + 1) % self.capacity
+        if self._n < self.capacity:
+            self._n += 1
+
+    def clear(self) -> None:
+        self.ts.fill(-np.inf)
+        self._head = 0
+        self._n = 0
+        self._last_ts = None
+
+    def _live(self, now: float) -> np.ndarray:
+        return self.ts >= now - self.horizon_s
+
+    def column(self, name: str, now: float) -> np.ndarray:
+        """Copy of the in-horizon values of one column (unordered)."""
+        return self.val[self._live(now), self._col[name]]
+
+    def weighted(self, name: str, now: float):
+        """(values, dt) of the in-horizon samples of one column (unordered)."""
+        live = self._live(now)
+        return self.val[live, self._col[name]], self.dt[live]
+
+    def ordered(self, name: str, now: float):
+        """(ts, values) of the in-horizon samples, oldest first."""
+        live = self._live(now)
+        order = np.argsort(self.ts[live], kind="stable")
+        return self.ts[live][order], self.val[live, self._col[name]][order]
+
+
+LOG2_SLOTS = 64
+
+
+def log2_slot_ms(n_slots: int = LOG2_SLOTS) -> np.ndarray:
+    """Representative value (ms) of each bpf_log2l() microsecond slot.
+
+    Slot 0 holds zero-length intervals; slot i >= 1 covers [2^(i-1), 2^i) us
+    and is represented by its midpoint.
+    """
+    i = np.arange(n_slots, dtype=float)
+    us = np.where(i == 0, 0.0, 1.5 * np.exp2(i - 1))
+    return us / 1000.0
+
+
+def log2_slot_of_ms(values_ms) -> np.ndarray:
+    """bpf_log2l() slot of each value (ms): the inverse of `log2_slot_ms`."""
+    us = np.asarray(values_ms, float) * 1000.0
+    slot = np.floor(np.log2(np.maximum(us, 1.0))) + 1
+    return np.where(us < 1.0, 0, np.minimum(slot, LOG2_SLOTS - 1)).astype(np.int64)
+
+
+class Log2Counter:
+    """Cumulative log2(us) histogram since start, i.e. Prometheus-style
+    monotonic bucket counters.  Samples are binned by slot arithmetic, never
+    sorted; `version` changes whenever a sample is added."""
+
+    def __init__(self):
+        self.counts = np.zeros(LOG2_SLOTS, np.int64)
+        self.sum_ms = 0.0
+        self.version = 0
+
+    def add(self, values_ms, counts) -> None:
+        counts = np.asarray(counts, np.int64)
+        if not counts.any():
+            return
+        self.counts += np.bincount(log2_slot_of_ms(values_ms), weights=counts,
+                                   minlength=LOG2_SLOTS).astype(np.int64)
+        self.sum_ms += float(np.dot(values_ms, counts))
+        self.version += 1
+
+
+def hist_quantiles(values: np.ndarray, counts: np.ndarray, qs) -> list:
+    """Quantiles of a bucketed histogram: value of the first bucket whose
+    cumulative count reaches q * total (0.0 for an empty histogram)."""
+    counts = np.asarray(counts)
+    total = counts.sum()
+    if total <= 0:
+        return [0.0] * len(qs)
+    idx = np.searchsorted(np.cumsum(counts), np.asarray(qs, float) * total,
+                          side="left")
+    return values[np.minimum(idx, counts.size - 1)].tolist()
+
+
+def hist_quantiles_rows(values: np.ndarray, counts: np.ndarray, qs) -> np.ndarray:
+    """Row-wise `hist_quantiles` over a (rows, buckets) count matrix; rows with
+    no samples yield NaN.  Returns an array of shape (len(qs), rows)."""
+    cum = np.cumsum(counts, axis=1)
+    total = cum[:, -1:]
+    out = np.empty((len(qs), counts.shape[0]))
+    for k, q in enumerate(qs):
+        idx = np.minimum((cum < q * total).sum(axis=1), counts.shape[1] - 1)
+        out[k] = values[idx]
+    out[:, total[:, 0] <= 0] = np.nan
+    return out
+
+
+def weighted_median(values: np.ndarray, weights: np.ndarray) -> float:
+    """Median of `values` with each sample counted in proportion to its
+    weight (e.g. the time it covers), ignoring NaN; falls back to the plain
+    median when no weight is positive, and 0.0 when nothing is present."""
+    ok = ~np.isnan(values)
+    values, weights = values[ok], weights[ok]
+    if not values.size:
+        return 0.0
+    total = weights.sum()
+    if total <= 0:
+        return float(np.median(values))
+    order = np.argsort(values, kind="stable")
+    cum = np.cumsum(weights[order])
+    return float(values[order][min(np.searchsorted(cum, 0.5 * total), values.size - 1)])
+
+
+class QuantileSketch:
+    """DDSketch-style quantile sketch over a fixed, dense bucket range.
+
+    A positive value v lands in bucket ceil(log_gamma(v)) with
+    gamma = (1 + alpha) / (1 - alpha), so every reported quantile is within
+    relative error alpha of a true sample.  Values below `min_value` count as
+    zero; values above `max_value` clamp to the top bucket.  Counts live in a
+    preallocated int64 array, so two sketches with the same parameters merge
+    by plain addition -- which is what lets a fleet aggregator combine hosts
+    without raw samples.
+    """
+
+    def __init__(self, alpha: float = 0.01, min_value: float = 1e-3,
+                 max_value: float = 1e6):
+        if not 0.0 < alpha < 1.0:
+            raise ValueError("alpha must be in (0, 1)")
+        self.alpha = float(alpha)
+        self.min_value = float(min_value)
+        self.max_value = float(max_value)
+        self.gamma = (1.0 + alpha) / (1.0 - alpha)
+        self._lg = math.log(self.gamma)
+        self._key_min = int(math.ceil(math.log(self.min_value) / self._lg))
+        key_max = int(math.ceil(math.log(self.max_value) / self._lg))
+        self.counts = np.zeros(key_max - self._key_min + 1, np.int64)
+        self.zero = 0
+
+    @property
+    def params(self):
+        return (self.alpha, self.min_value, self.max_value)
+
+    @property
+    def count(self) -> int:
+        return int(self.counts.sum()) + self.zero
+
+    def _index(self, values: np.ndarray) -> np.ndarray:
+        keys = np.ceil(np.log(values) / self._lg).astype(np.int64)
+        return np.clip(keys - self._key_min, 0, self.counts.size - 1)
+
+    def add(self, values, counts=None) -> None:
+        """Add samples (optionally pre-aggregated with per-value counts)."""
+        v = np.asarray(values, float).ravel()
+        c = (np.ones(v.size, np.int64) if counts is None
+             else np.asarray(counts, np.int64).ravel())
+        small = v < self.min_value
+        self.zero += int(c[small].sum())
+        if not small.all():
+            big = ~small
+            self.counts += np.bincount(self._index(v[big]), weights=c[big],
+                                       minlength=self.counts.size).astype(np.int64)
+
+    def merge(self, other: "QuantileSketch") -> "QuantileSketch":
+        if other.params != self.params:
+            raise ValueError("cannot merge sketches with different parameters")
+        self.counts += other.counts
+        self.zero += other.zero
+        return self
+
+    def clear(self) -> None:
+        self.counts.fill(0)
+        self.zero = 0
+
+    def quantiles(self, qs) -> list:
+        return quantiles_from_counts(self, self.counts, self.zero, qs)
+
+    def quantile(self, q: float) -> float:
+        return self.quantiles([q])[0]
+
+    def to_dict(self) -> dict:
+        """Sparse JSON-friendly encoding (non-empty bucket indexes + counts)."""
+        nz = np.flatnonzero(self.counts)
+        return {"alpha": self.alpha, "min_value": self.min_value,
+                "max_value": self.max_value, "zero": self.zero,
+                "index": nz.tolist(), "counts": self.counts[nz].tolist()}
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "QuantileSketch":
+        sk = cls(d["alpha"], d["min_value"], d["max_value"])
+        sk.zero = int(d.get("zero", 0))
+        if d.get("index"):
+            sk.counts[np.asarray(d["index"], np.int64)] = np.asarray(d["counts"],
+                                                                     np.int64)
+        return sk
+
+
+def quantiles_from_counts(sketch: QuantileSketch, counts: np.ndarray,
+                          zero: int, qs) -> list:
+    """Quantile estimates for a bucket-count vector laid out like `sketch`."""
+    qs = np.asarray(qs, float)
+    total = int(counts.sum()) + zero
+    if total == 0:
+        return [0.0] * qs.size
+    ranks = qs * (total - 1)
+    cum = np.cumsum(counts) + zero
+    idx = np.searchsorted(cum, ranks, side="right")
+    idx = np.minimum(idx, counts.size - 1)
+    keys = idx + sketch._key_min
+    est = 2.0 * np.power(sketch.gamma, keys) / (sketch.gamma + 1.0)
+    return np.where(ranks < zero, 0.0, est).tolist()
+
+
+class WindowedSketch:
+    """Quantile sketches over several trailing windows, updated incrementally.
+
+    Samples go into the bucket row of the current `slot_s`-wide time slot; each
+    window keeps a running bucket-count aggregate that gains the newest slot
+    and loses the slot falling out of it whenever the clock crosses a slot
+    boundary.  Writes are O(bins) per tick and a quantile read is a single
+    cumulative sum over one aggregate, independent of how many samples the
+    window holds.
+    """
+
+    def __init__(self, windows_s=(1, 10, 60), slot_s: float = 1.0, **params):
+        self.slot_s = float(slot_s)
+        self.proto = QuantileSketch(**params)
+        self.windows = {int(w): max(1, int(round(w / self.slot_s)))
+                        for w in windows_s}
+        self._n = max(self.windows.values())
+        nb = self.proto.counts.size
+        self._slots = np.zeros((self._n, nb), np.int64)
+        self._slot_zero = np.zeros(self._n, np.int64)
+        self._agg = {w: np.zeros(nb, np.int64) for w in self.windows}
+        self._agg_zero = {w: 0 for w in self.windows}
+        self._cur = None
+
+    def _advance(self, slot: int) -> None:
+        if self._cur is None or slot - self._cur >= self._n:
+            self._slots.fill(0)
+            self._slot_zero.fill(0)
+            for w in self._agg:
+                self._agg[w].fill(0)
+                self._agg_zero[w] = 0
+            self._cur = slot
+            return
+        while self._cur < slot:
+            self._cur += 1
+            for w, n in self.windows.items():
+                old = (self._cur - n) % self._n
+                self._agg[w] -= self._slots[old]
+                self._agg_zero[w] -= int(self._slot_zero[old])
+            i = self._cur % self._n
+            self._slots[i].fill(0)
+            self._slot_zero[i] = 0
+
+    def add(self, ts: float, values, counts=None) -> None:
+        slot = int(ts // self.slot_s)
+        self._advance(max(slot, self._cur if self._cur is not None else slot))
+        self.proto.clear()
+        self.proto.add(values, counts)
+        i = self._cur % self._n
+        self._slots[i] += self.proto.counts
+        self._slot_zero[i] += self.proto.zero
+        for w in self._agg:
+            self._agg[w] += self.proto.counts
+            self._agg_zero[w] += self.proto.zero
+
+    def count(self, window_s: int) -> int:
+        return int(self._agg[window_s].sum()) + self._agg_zero[window_s]
+
+    def quantiles(self, window_s: int, qs, now: float = None) -> list:
+        if now is not None and self._cur is not None:
+            self._advance(max(int(now // self.slot_s), self._cur))
+        return quantiles_from_counts(self.proto, self._agg[window_s],
+                                     self._agg_zero[window_s], qs)
+
+    def sketch(self, window_s: int, now: float = None) -> QuantileSketch:
+        """A standalone (mergeable, serializable) copy of one window."""
+        if now is not None and self._cur is not None:
+            self._advance(max(int(now // self.slot_s), self._cur))
+        sk = QuantileSketch(*self.proto.params)
+        sk.counts[:] = self._agg[window_s]
+        sk.zero = self._agg_zero[window_s]
+        return sk
+
+
+MAD_SCALE = 1.4826  # MAD -> sigma for normally distributed samples
+
+
+def robust_anomaly_rate(values, k: float) -> float:
+    """Batch reference: fraction of samples above median + k * 1.4826 * MAD.
+
+    Recomputes both order statistics from scratch (two sorts); kept as the
+    ground truth RobustOutliers is checked and benchmarked against.
+    """
+    vals = np.asarray(values, float)
+    vals = vals[~np.isnan(vals)]
+    if vals.size < 5:
+        return 0.0
+    med = float(np.median(vals))
+    mad = float(np.median(np.abs(vals - med))) or 1e-9
+    thresh = med + k * MAD_SCALE * mad
+    return float(np.count_nonzero(vals > thresh)) / vals.size
+
+
+class _BlockedSorted:
+    """Sorted multiset of floats as a list of sorted blocks of at most
+    2*load values: insert/remove touch one block (O(log n + load)) and
+    positional reads bisect the block start offsets, which are rebuilt in
+    O(n / load) after a change."""
+
+    def __init__(self, load: int = 512):
+        self.load = load
+        self._blocks: list = []
+        self._maxes: list = []
+        self._starts: list = []
+        self._len = 0
+        self._dirty = False
+
+    def __len__(self):
+        return self._len
+
+    def add(self, v: float):
+        if not self._blocks:
+            self._blocks.append([v])
+            self._maxes.append(v)
+        else:
+            b = min(bisect.bisect_left(self._maxes, v), len(self._blocks) - 1)
+            blk = self._blocks[b]
+            bisect.insort(blk, v)
+            self._maxes[b] = blk[-1]
+            if len(blk) > 2 * self.load:
+                self._blocks[b:b + 1] = [blk[:self.load], blk[self.load:]]
+                self._maxes[b:b + 1] = [blk[self.load - 1], blk[-1]]
+        self._len += 1
+        self._dirty = True
+
+    def remove(self, v: float):
+        b = bisect.bisect_left(self._maxes, v)
+        blk = self._blocks[b]
+        del blk[bisect.bisect_left(blk, v)]
+        if blk:
+            self._maxes[b] = blk[-1]
+        else:
+            del self._blocks[b], self._maxes[b]
+        self._len -= 1
+        self._dirty = True
+
+    def _offsets(self) -> list:
+        if self._dirty:
+            self._starts = [0, *accumulate(map(len, self._blocks))][:-1]
+            self._dirty = False
+        return self._starts
+
+    def __getitem__(self, i: int) -> float:
+        starts = self._offsets()
+        b = bisect.bisect_right(starts, i) - 1
+        return self._blocks[b][i - starts[b]]
+
+    def bisect_left(self, v: float) -> int:
+        b = bisect.bisect_left(self._maxes, v)
+        if b == len(self._blocks):
+            return self._len
+        return self._offsets()[b] + bisect.bisect_left(self._blocks[b], v)
+
+    def bisect_right(self, v: float) -> int:
+        b = bisect.bisect_right(self._maxes, v)
+        if b == len(self._blocks):
+            return self._len
+        return self._offsets()[b] + bisect.bisect_right(self._blocks[b], v)
+
+
+class RobustOutliers:
+    """Streaming median + k*MAD outlier rate over a sliding time window.
+
+    Samples are kept in arrival order (for expiry) and in a blocked sorted
+    list (for order statistics), so an insert/remove costs O(log n) plus one
+    block's shift rather than the O(n) of a flat sorted list.  The median is
+    then an index lookup, the MAD is the k-th smallest distance to
+    the median found by a binary search over the two sorted distance runs on
+    either side of it, and the outlier count is one more bisect.  The
+    resulting rate is cached, so reads are O(1) unless expiry moved the window.
+    Results match `robust_anomaly_rate` exactly.
+    """
+
+    def __init__(self, horizon_s: float, k: float = 3.0, min_samples: int = 5):
+        self.horizon_s = float(horizon_s)
+        self.k = float(k)
+        self.min_samples = min_samples
+        self._fifo: deque = deque()
+        self._sorted = _BlockedSorted()
+        self._rate = 0.0
+
+    def __len__(self):
+        return len(self._sorted)
+
+    def _expire(self, now: float) -> bool:
+        cutoff = now - self.horizon_s
+        dropped = False
+        while self._fifo and self._fifo[0][0] < cutoff:
+            _, v = self._fifo.popleft()
+            self._sorted.remove(v)
+            dropped = True
+        return dropped
+
+    def update(self, ts: float, value: float) -> float:
+        self._expire(ts)
+        if value == value:  # skip NaN
+            self._fifo.append((ts, value))
+            self._sorted.add(value)
+        self._rate = self._compute()
+        return self._rate
+
+    def rate(self, now: float = None) -> float:
+        if now is not None and self._expire(now):
+            self._rate = self._compute()
+        return self._rate
+
+    def _median(self) -> float:
+        a, n = self._sorted, len(self._sorted)
+        h = n // 2
+        return a[h] if n % 2 else 0.5 * (a[h - 1] + a[h])
+
+    def _kth_distance(self, med: float, p: int, k: int) -> float:
+        """k-th (0-based) smallest |a[i] - med|, with a[:p] < med <= a[p:]."""
+        a = self._sorted
+        n_left, n_right = p, len(a) - p
+        lo, hi = max(0, k + 1 - n_right), min(k + 1, n_left)
+        while lo < hi:  # lo = how many of the k+1 smallest come from the left
+            i = (lo + hi) // 2
+            j = k + 1 - i
+            if j > 0 and med - a[p - 1 - i] < a[p + j - 1] - med:
+                lo = i + 1
+            else:
+                hi = i
+        i, j = lo, k + 1 - lo
+        left = med - a[p - i] if i > 0 else -math.inf
+        right = a[p + j - 1] - med if j > 0 else -math.inf
+        return max(left, right)
+
+    def _compute(self) -> float:
+        a, n = self._sorted, len(self._sorted)
+        if n < self.min_samples:
+            return 0.0
+        med = self._median()
+        p = a.bisect_left(med)
+        h = n // 2
+        mad = self._kth_distance(med, p, h)
+        if n % 2 == 0:
+            mad = 0.5 * (self._kth_distance(med, p, h - 1) + mad)
+        thresh = med + self.k * MAD_SCALE * (mad or 1e-9)
+        return (n - a.bisect_right(thresh)) / n
@@ -0,0 +1,105 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from collectors import FixtureCollector, ProcFile, ProcfsCollector, parse_intervals
+from telemetry_core import hist_quantiles, log2_slot_of_ms
+
+
+def test_procfile_rereads_from_offset_zero_and_grows(tmp_path):
+    p = tmp_path / "stat"
+    p.write_bytes(b"first\n")
+    f = ProcFile(str(p), bufsize=4)
+    try:
+        assert f.read() == b"first\n"
+        assert f.bufsize == 8  # the 4-byte read came back full: retried larger
+        p.write_bytes(b"second, longer than the buffer\n")
+        assert f.read() == b"second, longer than the buffer\n"
+        assert f.read() == b"second, longer than the buffer\n"
+    finally:
+        f.close()
+
+
+def _schedstat(rows):
+    return "".join(f"cpu{i} 0 0 0 0 0 0 {run} {delay} {slices}\n"
+                   for i, (run, delay, slices) in enumerate(rows))
+
+
+def _stat(cpus, ctxt):
+    line = lambda name, c: f"{name} " + " ".join(map(str, c)) + "\n"  # noqa: E731
+    total = [sum(col) for col in zip(*cpus)]
+    return (line("cpu", total) + "".join(line(f"cpu{i}", c) for i, c in enumerate(cpus))
+            + f"ctxt {ctxt}\n")
+
+
+def test_procfs_collector_reports_deltas(tmp_path):
+    (tmp_path / "schedstat").write_text(_schedstat([(0, 0, 0), (0, 0, 0)]))
+    (tmp_path / "stat").write_text(_stat([[0] * 8, [0] * 8], 0))
+    c = ProcfsCollector(sources=("schedstat", "stat", "diskstats"), root=str(tmp_path))
+    assert set(c.files) == {"schedstat", "stat"}  # no diskstats file here
+    first = c.read()
+    assert first.sched is None and "cpu_util" not in first.gauges
+
+    # cpu0: 4 ms waited over 2 timeslices; cpu1 idle.  cpu0 75% busy, cpu1 0%
+    (tmp_path / "schedstat").write_text(_schedstat([(9, 4_000_000, 2), (0, 0, 0)]))
+    (tmp_path / "stat").write_text(_stat([[3, 0, 0, 1, 0, 0, 0, 0],
+                                          [0, 0, 0, 4, 0, 0, 0, 0]], 100))
+    tick = c.read()
+    values, counts = tick.sched
+    assert values.tolist() == [2.0] and counts.tolist() == [2]
+    assert tick.per_cpu["runq_mean_ms"][0] == 2.0 and np.isnan(tick.per_cpu["runq_mean_ms"][1])
+    assert tick.gauges["cpu_util"] == pytest.approx(3 / 8)
+    assert tick.per_cpu["util"].tolist() == [0.75, 0.0]
+    assert tick.gauges["ctx_switch_rps"] > 0
+
+
+def test_procfs_collector_skips_sources_not_due(tmp_path):
+    (tmp_path / "schedstat").write_text(_schedstat([(0, 0, 0)]))
+    c = ProcfsCollector(intervals=parse_intervals("schedstat=3600"),
+                        sources=("schedstat",), root=str(tmp_path))
+    c.read()
+    (tmp_path / "schedstat").write_text(_schedstat([(1, 1_000_000, 1)]))
+    assert c.read().sched is None
+
+
+def test_parse_intervals():
+    assert parse_intervals("schedstat=1, pressure=5,") == {"schedstat": 1.0, "pressure": 5.0}
+
+
+FIXTURE = Path(__file__).resolve().parents[1] / "fixtures" / "bpf_hist_sample.jsonl"
+
+
+def test_fixture_collector_replays_recorded_histograms():
+    c = FixtureCollector(FIXTURE, loop=False)
+    tick = c.read()
+    # first line: sched slots 3..12 hold 7000 samples, block slots 8..12 hold 190
+    values, counts = tick.sched
+    assert counts.tolist() == [407, 1836, 2570, 1536, 487, 112, 40, 9, 2, 1]
+    assert np.allclose(values, [1.5 * 2 ** (s - 1) / 1000 for s in range(3, 13)])
+    assert tick.sys_enter == 42221 and tick.per_syscall is None
+    # p50: rank 3500 falls in slot 5 (24 us); p95: rank 6650 in slot 7 (96 us)
+    assert hist_quantiles(values, counts, [0.5, 0.95]) == pytest.approx([0.024, 0.096])
+    # block: ranks 95 and 180.5 of 190 fall in slots 9 (384 us) and 11 (1536 us)
+    assert hist_quantiles(*tick.block, [0.5, 0.95]) == pytest.approx([0.384, 1.536])
+
+    # the remaining ticks decode back to the recorded slot counts
+    lines = [json.loads(line) for line in FIXTURE.read_text().splitlines()]
+    got = np.zeros(64, np.int64)
+    got[log2_slot_of_ms(values)] += counts
+    for _ in lines[1:]:
+        v, n = c.read().sched
+        got[log2_slot_of_ms(v)] += n
+    want = np.sum([rec["sched_us"] for rec in lines], axis=0)
+    assert got[:want.size].tolist() == want.tolist() and not got[want.size:].any()
+    end = c.read()  # played out without `loop`: empty ticks, probes still present
+    assert end.sched[1].size == 0 and end.block[1].size == 0 and end.sys_enter == 0
+
+
+def test_fixture_collector_loops():
+    c = FixtureCollector(FIXTURE)
+    first = c.read()
+    for _ in range(len(FIXTURE.read_text().splitlines()) - 1):
+        c.read()
+    assert c.read() is first
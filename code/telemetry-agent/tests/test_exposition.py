@@ -0,0 +1,41 @@
+import numpy as np
+
+from exposition import MetricsPage, counter_text, gauge_text, histogram_text
+
+
+def test_histogram_is_cumulative_and_folds_empty_tail_into_inf():
+    text = histogram_text("lat_seconds", "Latency.", np.array([0.001, 0.002, 0.004, 0.008]),
+                          np.array([1, 0, 3, 0]), 0.0125, unit="seconds",
+                          labels={"cpu": "0"})
+    lines = text.splitlines()
+    assert lines[:3] == ["# TYPE lat_seconds histogram", "# HELP lat_seconds Latency.",
+                         "# UNIT lat_seconds seconds"]
+    assert lines[3:] == ['lat_seconds_bucket{cpu="0",le="0.001"} 1',
+                         'lat_seconds_bucket{cpu="0",le="0.002"} 1',
+                         'lat_seconds_bucket{cpu="0",le="0.004"} 4',
+                         'lat_seconds_bucket{cpu="0",le="+Inf"} 4',
+                         'lat_seconds_count{cpu="0"} 4',
+                         'lat_seconds_sum{cpu="0"} 0.0125']
+
+
+def test_counter_and_gauge_text():
+    assert counter_text("syscalls", "Entered.", 7).endswith("syscalls_total 7.0\n")
+    assert gauge_text("load", "Load.", float("nan"), {"w": "1"}).endswith('load{w="1"} NaN\n')
+
+
+def test_metrics_page_rerenders_only_changed_families():
+    page = MetricsPage()
+    calls = []
+
+    def fam(name, key, value):
+        def fn():
+            calls.append(name)
+            return gauge_text(name, "x", value)
+        return name, key, fn
+
+    body = page.render([fam("a", 1, 1.0), fam("b", 1, 2.0)])
+    assert body.endswith(b"# EOF\n") and b"a 1.0" in body and calls == ["a", "b"]
+    body = page.render([fam("a", 1, 9.0), fam("b", 2, 3.0)])
+    assert calls == ["a", "b", "b"] and b"a 1.0" in body and b"b 3.0" in body
+    body = page.render([fam("b", 2, 3.0)])
+    assert b"a 1.0" not in body and page.rendered == 3
@@ -0,0 +1,42 @@
+import threading
+import time
+
+import pytest
+
+from sampling import SamplingController
+
+
+def test_fastest_live_lease_wins_within_bounds():
+    sc = SamplingController(idle_interval_s=1.0, min_interval_s=0.05, max_leases=2)
+    assert sc.interval() == 1.0
+    slow = sc.acquire(hz=4, ttl_s=60, holder="a")
+    fast = sc.acquire(hz=1000, ttl_s=60, holder="b")
+    assert fast["interval_s"] == 0.05  # clamped to min_interval_s
+    assert sc.interval() == 0.05
+    with pytest.raises(OverflowError):
+        sc.acquire(hz=2, ttl_s=60)
+    assert sc.release(fast["lease_id"]) and not sc.release(fast["lease_id"])
+    assert sc.interval() == 0.25
+    assert sc.state()["leases"][0]["holder"] == "a"
+    assert sc.release(slow["lease_id"])
+
+
+def test_leases_lapse_unless_renewed():
+    sc = SamplingController(idle_interval_s=1.0, min_interval_s=0.05, max_ttl_s=10)
+    lease = sc.acquire(hz=10, ttl_s=3600)
+    assert lease["expires_at"] - lease["granted_at"] == pytest.approx(10)  # max_ttl_s
+    now = time.time()
+    assert sc.interval(now + 5) == 0.1
+    assert sc.interval(now + 11) == 1.0
+    with pytest.raises(KeyError):
+        sc.renew(lease["lease_id"], 10)
+
+
+def test_wait_returns_early_on_lease_change():
+    sc = SamplingController(idle_interval_s=1.0, min_interval_s=0.05)
+    version = sc.version
+    threading.Timer(0.05, sc.acquire, (20, 60)).start()
+    t0 = time.monotonic()
+    assert sc.wait(5.0, version) != version
+    assert time.monotonic() - t0 < 2.0
+    assert sc.wait(0.01, sc.version) == sc.version
@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+
+from telemetry_core import (Log2Counter, QuantileSketch, RingWindow, RobustOutliers,
+                            WindowedSketch, hist_quantiles, log2_slot_ms,
+                            log2_slot_of_ms, robust_anomaly_rate, weighted_median)
+
+
+def _true_quantile(x, q):
+    return np.sort(x)[int(q * (x.size - 1))]
+
+
+def test_ring_window_masks_expired_and_overwrites_oldest():
+    w = RingWindow(horizon_s=10, capacity=4, columns=("a", "b"))
+    for t in range(6):
+        w.append(float(t), t, 10 * t)
+    assert len(w) == 4
+    ts, vals = w.ordered("b", now=5.0)
+    assert ts.tolist() == [2.0, 3.0, 4.0, 5.0]
+    assert vals.tolist() == [20, 30, 40, 50]
+    assert sorted(w.column("a", now=14.5).tolist()) == [5.0]
+    values, dt = w.weighted("a", now=5.0)
+    assert dt.tolist() == [1.0] * 4
+
+
+def test_weighted_median_counts_time_not_samples():
+    # one long 9 s sample outweighs three short ones
+    assert weighted_median(np.array([1.0, 2.0, 3.0, 100.0]),
+                           np.array([0.1, 0.1, 0.1, 9.0])) == 100.0
+    assert weighted_median(np.array([np.nan]), np.array([1.0])) == 0.0
+
+
+@pytest.mark.parametrize("alpha", [0.01, 0.05])
+def test_sketch_quantiles_within_alpha(alpha):
+    x = np.random.default_rng(0).lognormal(1.0, 1.5, 20000)
+    sk = QuantileSketch(alpha)
+    sk.add(x)
+    for q in (0.01, 0.5, 0.9, 0.99, 0.999):
+        true = _true_quantile(x, q)
+        assert abs(sk.quantile(q) - true) <= alpha * true * (1 + 1e-9)
+
+
+def test_sketch_merge_and_roundtrip_equal_single_sketch():
+    rng = np.random.default_rng(1)
+    a, b = rng.exponential(5.0, 5000), rng.exponential(50.0, 5000)
+    whole = QuantileSketch(0.01)
+    whole.add(np.concatenate([a, b, [0.0]]))
+    left, right = QuantileSketch(0.01), QuantileSketch(0.01)
+    left.add(a)
+    right.add(np.append(b, 0.0))
+    merged = QuantileSketch.from_dict(left.merge(right).to_dict())
+    assert merged.zero == whole.zero == 1
+    assert np.array_equal(merged.counts, whole.counts)
+    with pytest.raises(ValueError):
+        merged.merge(QuantileSketch(0.02))
+
+
+def test_windowed_sketch_drops_slots_leaving_the_window():
+    ws = WindowedSketch(windows_s=(1, 10), alpha=0.01)
+    ws.add(0.5, [100.0] * 10)
+    ws.add(5.5, [1.0] * 10)
+    assert ws.count(10) == 20 and ws.count(1) == 10
+    assert ws.quantiles(1, [0.5], now=5.9)[0] == pytest.approx(1.0, rel=0.01)
+    assert ws.quantiles(10, [0.5], now=10.5)[0] == pytest.approx(1.0, rel=0.01)
+    assert ws.count(10) == 10  # the t=0 slot aged out
+    assert ws.sketch(10, now=30.0).count == 0
+
+
+@pytest.mark.parametrize("n", [7, 40, 2000])
+def test_robust_outliers_match_batch_reference(n):
+    rng = np.random.default_rng(n)
+    x = np.round(rng.lognormal(2.5, 0.4, n + 300), 1)  # rounding makes ties
+    x[rng.random(x.size) < 0.03] *= 5
+    det = RobustOutliers(horizon_s=n - 0.5, k=3.0)
+    for t, v in enumerate(x):
+        rate = det.update(float(t), float(v))
+        if t >= n:
+            assert rate == robust_anomaly_rate(x[t - n + 1:t + 1], 3.0)
+    assert len(det) == n
+
+
+def test_robust_outliers_expire_on_read_and_skip_nan():
+    det = RobustOutliers(horizon_s=10, min_samples=5)
+    for t in range(5):
+        det.update(float(t), 1.0)
+    det.update(5.0, 50.0)
+    det.update(6.0, float("nan"))
+    assert len(det) == 6 and det.rate() == pytest.approx(1 / 6)
+    assert det.rate(now=30.0) == 0.0 and len(det) == 0
+
+
+def test_log2_slots_roundtrip_and_counter_is_monotonic():
+    mid = log2_slot_ms()
+    assert log2_slot_of_ms(mid).tolist() == list(range(mid.size))
+    c = Log2Counter()
+    c.add([0.0015, 0.0015, 1.0], [1, 2, 4])
+    c.add([1.0], [0])
+    assert c.version == 1 and c.counts.sum() == 7
+    assert c.counts[log2_slot_of_ms([1.0])[0]] == 4
+    assert hist_quantiles(mid, c.counts, [0.5])[0] == pytest.approx(mid[log2_slot_of_ms([1.0])[0]])
@@ -0,0 +1,62 @@
+import os
+
+import numpy as np
+
+from topk import ProcessCollector, SpaceSaving, syscall_info
+
+
+def test_space_saving_keeps_heavy_hitters_with_error_bounds():
+    rng = np.random.default_rng(0)
+    heavy = {"a": 0.3, "b": 0.2, "c": 0.12}
+    keys = list(heavy) + [f"k{i}" for i in range(500)]
+    p = np.array(list(heavy.values()) + [0.38 / 500] * 500)
+    stream = rng.choice(len(keys), 20000, p=p)
+    ss = SpaceSaving(16)
+    true = {}
+    for i in range(0, stream.size, 50):  # 50 events per batch, like a tick
+        batch = {}
+        for j in stream[i:i + 50]:
+            batch[keys[j]] = batch.get(keys[j], 0) + 1
+            true[keys[j]] = true.get(keys[j], 0) + 1
+        ss.update(batch)
+    assert len(ss) == 16 and ss.total == stream.size
+    top = ss.top(3)
+    assert [k for k, _, _ in top] == ["a", "b", "c"]
+    for key, count, err in ss.top(16):
+        assert count - err <= true[key] <= count
+
+
+def test_space_saving_decay_lets_a_stopped_key_fade_out():
+    ss = SpaceSaving(2)
+    ss.update({"old": 100})
+    for _ in range(20):
+        ss.decay(0.5)
+        ss.update({"new": 10, "newer": 5})
+    assert {k for k, _, _ in ss.top(2)} == {"new", "newer"}
+
+
+def test_syscall_info():
+    assert syscall_info(0) == ("read", "io")
+    assert syscall_info(202) == ("futex", "sched")
+    assert syscall_info(511) == ("sys_511", "other")
+
+
+def _proc(root, pid, comm, start, utime, stime, syscr=None):
+    d = root / str(pid)
+    d.mkdir(exist_ok=True)
+    rest = ["S"] + ["0"] * 10 + [str(utime), str(stime)] + ["0"] * 6 + [str(start)]
+    (d / "stat").write_text(f"{pid} ({comm}) " + " ".join(rest) + "\n")
+    if syscr is not None:
+        (d / "io").write_text(f"rchar: 1\nsyscr: {syscr}\nsyscw: 1\n")
+
+
+def test_process_collector_reports_deltas_and_restarted_pids(tmp_path):
+    hz = os.sysconf("SC_CLK_TCK")
+    _proc(tmp_path, 10, "web (worker)", 500, 100, 50, syscr=9)
+    _proc(tmp_path, 11, "db", 600, 0, 0)
+    c = ProcessCollector(root=str(tmp_path), interval_s=0)
+    assert c.read().per_process == {}
+    _proc(tmp_path, 10, "web (worker)", 500, 100 + hz, 50, syscr=19)
+    _proc(tmp_path, 11, "db", 601, 5, 5)  # pid reused by a new process
+    out = c.read().per_process
+    assert out == {(10, "web (worker)"): {"cpu_ms": 1000.0, "io_syscalls": 10}}
@@ -0,0 +1,66 @@
+import math
+
+import numpy as np
+import pytest
+
+from tsdb import History, parse_tiers
+
+TIERS = {1: 120, 10: 1200, 60: 7200}  # res (s) = retention (s)
+
+
+def test_rollups_agree_across_tiers(tmp_path):
+    h = History(tmp_path, TIERS)
+    t0 = 1_000_020  # a multiple of 60
+    xs = np.random.default_rng(0).normal(10, 3, 120)
+    for i, x in enumerate(xs):
+        h.append(t0 + i, {"lat": float(x)})
+    now = t0 + 119
+    fine = h.query("lat", t0, now, step=1, now=now)
+    assert fine["tier_s"] == 1 and fine["count"] == [1] * 120
+    assert fine["avg"] == pytest.approx(xs.tolist())
+    for step, tier in ((10, 10), (60, 60), (30, 10)):
+        r = h.query("lat", t0, now, step=step, now=now)
+        assert r["tier_s"] == tier and r["step_s"] == step
+        groups = xs.reshape(-1, step)
+        assert r["count"] == [step] * len(groups)
+        assert r["avg"] == pytest.approx(groups.mean(axis=1).tolist())
+        assert r["min"] == pytest.approx(groups.min(axis=1).tolist())
+        assert r["max"] == pytest.approx(groups.max(axis=1).tolist())
+
+
+def test_ring_reuse_bounds_retention(tmp_path):
+    h = History(tmp_path, {1: 10})
+    for t in range(25):
+        h.append(t, {"x": t})
+    r = h.query("x", 0, 24, step=1, now=24)
+    assert r["ts"] == list(range(15, 25))  # older laps were overwritten
+    with pytest.raises(KeyError):
+        h.query("missing", 0, 24)
+    with pytest.raises(ValueError):
+        h.query("x", 0, 1e9, step=1)
+
+
+def test_reopen_keeps_data_and_recreates_resized_tiers(tmp_path):
+    h = History(tmp_path, {10: 100, 60: 600})
+    h.append(1000, {"a.b/c": 5.0})
+    h.flush()
+    del h
+    h = History(tmp_path, {10: 200, 60: 600})  # 10 s tier resized, 60 s kept
+    assert h.metrics() == ["a.b_c"]
+    assert h.query("a.b/c", 960, 1019, step=10, now=1019)["count"] == []
+    assert h.query("a.b/c", 960, 1019, step=60, now=1019)["avg"] == [5.0]
+    assert (tmp_path / "a.b_c.10s.col").stat().st_size == 5 * 20 * 8
+
+
+def test_allowlist_series_cap_and_expiry(tmp_path):
+    h = History(tmp_path, {1: 60}, allow=["keep.*"], max_series=2, expire_s=30)
+    h.append(0, {"keep.a": 1, "keep.b": 2, "keep.c": 3, "drop": 4, "keep.nan": math.nan})
+    assert h.metrics() == ["keep.a", "keep.b"] and h.rejected == 2
+    h.append(40, {"keep.a": 1})
+    assert h.expire(40) == 1
+    assert h.metrics() == ["keep.a"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["keep.a.1s.col"]
+
+
+def test_parse_tiers():
+    assert parse_tiers("1=21600, 10=259200,") == {1: 21600.0, 10: 259200.0}
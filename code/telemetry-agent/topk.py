@@ -0,0 +1,224 @@
+"""
+topk.py — bounded heavy-hitter accounting of syscalls and processes.
+
+  * SpaceSaving      : weighted space-saving summary (Metwally et al.) over a
+                       fixed number of counters with exponential decay, so the
+                       top keys track the recent window and a key that stops
+                       appearing fades out and is evicted.  Memory is
+                       `capacity` slots however many pids come and go.
+  * SYSCALLS         : x86_64 syscall id -> (name, class); the class (io, net,
+                       sched, mem) tells scheduler-bound from I/O-bound load.
+  * ProcessCollector : fallback per-process sampler over /proc/<pid>/stat
+                       (CPU time) and /proc/<pid>/io (syscr + syscw, i.e.
+                       read/write-class syscalls), for hosts without eBPF.
+"""
+from __future__ import annotations
+
+import os
+import time
+
+import numpy as np
+
+from collectors import Tick
+
+# per-process columns a collector may report: syscalls entered (eBPF),
+# read/write-class syscalls (/proc/<pid>/io) and CPU time (ms)
+PROCESS_COLUMNS = ("syscalls", "io_syscalls", "cpu_ms")
+SYSCALL_CLASSES = ("io", "net", "sched", "mem", "other")
+
+_CLASS_NAMES = {
+    "io": "read write open close stat fstat lstat lseek pread64 pwrite64 readv "
+          "writev access pipe dup dup2 sendfile fcntl flock fsync fdatasync "
+          "truncate ftruncate getdents rename mkdir rmdir unlink readlink "
+          "getdents64 fadvise64 io_setup io_destroy io_getevents io_submit "
+          "openat mkdirat newfstatat unlinkat renameat readlinkat splice tee "
+          "sync_file_range fallocate pipe2 preadv pwritev syncfs renameat2 "
+          "copy_file_range preadv2 pwritev2 statx io_uring_setup "
+          "io_uring_enter openat2",
+    "net": "socket connect accept sendto recvfrom sendmsg recvmsg shutdown bind "
+           "listen getsockname getpeername socketpair setsockopt getsockopt "
+           "accept4 recvmmsg sendmmsg",
+    "sched": "poll select sched_yield nanosleep pause wait4 futex "
+             "sched_setaffinity sched_getaffinity epoll_wait clock_nanosleep "
+             "epoll_ctl pselect6 ppoll epoll_pwait eventfd2 epoll_create1 "
+             "sched_getattr sched_setattr membarrier epoll_pwait2 futex_waitv",
+    "mem": "mmap mprotect munmap brk mremap msync mincore madvise mlock munlock "
+           "mbind set_mempolicy get_mempolicy migrate_pages move_pages "
+           "process_madvise",
+}
+# x86_64 numbering (arch/x86/entry/syscalls/syscall_64.tbl); ids not listed
+# are reported as sys_<id>, class "other"
+_X86_64 = {
+    0: "read", 1: "write", 2: "open", 3: "close", 4: "stat", 5: "fstat",
+    6: "lstat", 7: "poll", 8: "lseek", 9: "mmap", 10: "mprotect", 11: "munmap",
+    12: "brk", 13: "rt_sigaction", 14: "rt_sigprocmask", 16: "ioctl",
+    17: "pread64", 18: "pwrite64", 19: "readv", 20: "writev", 21: "access",
+    22: "pipe", 23: "select", 24: "sched_yield", 25: "mremap", 26: "msync",
+    27: "mincore", 28: "madvise", 32: "dup", 33: "dup2", 34: "pause",
+    35: "nanosleep", 39: "getpid", 40: "sendfile", 41: "socket", 42: "connect",
+    43: "accept", 44: "sendto", 45: "recvfrom", 46: "sendmsg", 47: "recvmsg",
+    48: "shutdown", 49: "bind", 50: "listen", 51: "getsockname",
+    52: "getpeername", 53: "socketpair", 54: "setsockopt", 55: "getsockopt",
+    56: "clone", 57: "fork", 59: "execve", 60: "exit", 61: "wait4", 62: "kill",
+    72: "fcntl", 73: "flock", 74: "fsync", 75: "fdatasync", 76: "truncate",
+    77: "ftruncate", 78: "getdents", 82: "rename", 83: "mkdir", 84: "rmdir",
+    87: "unlink", 89: "readlink", 96: "gettimeofday", 149: "mlock",
+    150: "munlock", 186: "gettid", 202: "futex", 203: "sched_setaffinity",
+    204: "sched_getaffinity", 206: "io_setup", 207: "io_destroy",
+    208: "io_getevents", 209: "io_submit", 217: "getdents64", 221: "fadvise64",
+    228: "clock_gettime", 230: "clock_nanosleep", 231: "exit_group",
+    232: "epoll_wait", 233: "epoll_ctl", 237: "mbind", 238: "set_mempolicy",
+    239: "get_mempolicy", 256: "migrate_pages", 257: "openat", 258: "mkdirat",
+    262: "newfstatat", 263: "unlinkat", 264: "renameat", 267: "readlinkat",
+    270: "pselect6", 271: "ppoll", 275: "splice", 276: "tee",
+    277: "sync_file_range", 279: "move_pages", 281: "epoll_pwait",
+    285: "fallocate", 288: "accept4", 290: "eventfd2", 291: "epoll_create1",
+    293: "pipe2", 295: "preadv", 296: "pwritev", 299: "recvmmsg", 306: "syncfs",
+    307: "sendmmsg", 314: "sched_setattr", 315: "sched_getattr",
+    316: "renameat2", 318: "getrandom", 324: "membarrier",
+    326: "copy_file_range", 327: "preadv2", 328: "pwritev2", 332: "statx",
+    425: "io_uring_setup", 426: "io_uring_enter", 435: "clone3",
+    437: "openat2", 439: "faccessat2", 440: "process_madvise",
+    441: "epoll_pwait2", 449: "futex_waitv",
+}
+_CLASS_OF = {name: cls for cls, names in _CLASS_NAMES.items() for name in names.split()}
+SYSCALLS = {i: (name, _CLASS_OF.get(name, "other")) for i, name in _X86_64.items()}
+MAX_SYSCALL_ID = 512  # size of the eBPF per-id counter array
+
+
+def syscall_info(sid: int) -> tuple:
+    """(name, class) of a syscall id."""
+    return SYSCALLS.get(sid, (f"sys_{sid}", "other"))
+
+
+class SpaceSaving:
+    """Top-k summary over `capacity` counters.
+
+    A tracked key adds its weight to its counter; an untracked one takes over
+    the smallest counter, inheriting its value as the key's overestimate
+    (`errors`), so count - error is a lower bound and any key whose share of
+    the decayed total exceeds 1/capacity is guaranteed to be tracked.
+    `decay(f)` scales all counters, turning the summary into an exponentially
+    weighted window.
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = int(capacity)
+        self.keys = [None] * self.capacity
+        self.slot = {}
+        self.counts = np.zeros(self.capacity)
+        self.errors = np.zeros(self.capacity)
+        self.total = 0.0
+
+    def __len__(self):
+        return len(self.slot)
+
+    def decay(self, f: float) -> None:
+        self.counts *= f
+        self.errors *= f
+        self.total *= f
+
+    def update(self, items: dict) -> None:
+        """Add {key: weight}; tracked keys first, then new keys heaviest first
+        so a light key cannot evict a heavier one from the same batch."""
+        new = []
+        for key, w in items.items():
+            if w <= 0:
+                continue
+            self.total += w
+            i = self.slot.get(key)
+            if i is None:
+                new.append((w, key))
+            else:
+                self.counts[i] += w
+        new.sort(key=lambda t: t[0], reverse=True)
+        for w, key in new:
+            n = len(self.slot)
+            if n < self.capacity:
+                i, err = n, 0.0
+            else:
+                i = int(np.argmin(self.counts))
+                err = float(self.counts[i])
+                del self.slot[self.keys[i]]
+            self.keys[i] = key
+            self.slot[key] = i
+            self.counts[i] = err + w
+            self.errors[i] = err
+
+    def top(self, n: int) -> list:
+        """[(key, count, error)] of the n largest counters, descending."""
+        used = len(self.slot)
+        order = np.argsort(-self.counts[:used], kind="stable")[:n]
+        return [(self.keys[i], float(self.counts[i]), float(self.errors[i]))
+                for i in order if self.counts[i] > 0]
+
+
+class ProcessCollector:
+    """Per-process CPU time and read/write syscall counts from procfs.
+
+    Scans /proc at most every `interval_s` (up to `max_pids` processes) and
+    reports per-process deltas since the previous scan.  Only the last scan's
+    counters are kept, so state is bounded by the live process count; a pid
+    whose start time changed is a new process and starts from zero.
+    /proc/<pid>/io of other users' processes needs CAP_SYS_PTRACE; without it
+    only cpu_ms is reported for them.
+    """
+
+    name = "proc"
+
+    def __init__(self, root: str = "/proc", interval_s: float = 5.0,
+                 max_pids: int = 4096):
+        self.root = root
+        self.interval_s = interval_s
+        self.max_pids = max_pids
+        self._hz = os.sysconf("SC_CLK_TCK")
+        self._prev = {}
+        self._scanned = 0.0
+
+    @property
+    def available(self) -> bool:
+        return os.path.exists(f"{self.root}/self/stat")
+
+    def _sample(self, pid: str):
+        with open(f"{self.root}/{pid}/stat", "rb") as f:
+            stat = f.read()
+        head, _, rest = stat.rpartition(b")")  # comm may contain spaces / ')'
+        comm = head.partition(b"(")[2].decode(errors="replace")
+        f = rest.split()  # f[0] is field 3 (state)
+        ticks, start = int(f[11]) + int(f[12]), f[19]  # utime + stime, starttime
+        io = None
+        try:
+            with open(f"{self.root}/{pid}/io", "rb") as fh:
+                for line in fh.read().splitlines():
+                    k, _, v = line.partition(b":")
+                    if k in (b"syscr", b"syscw"):
+                        io = (io or 0) + int(v)
+        except OSError:
+            pass
+        return comm, start, ticks, io
+
+    def read(self) -> Tick:
+        now = time.time()
+        if now - self._scanned < self.interval_s:
+            return Tick(None, None, None, {})
+        self._scanned = now
+        cur, out = {}, {}
+        for pid in os.listdir(self.root):
+            if not pid.isdigit():
+                continue
+            if len(cur) >= self.max_pids:
+                break
+            try:
+                comm, start, ticks, io = self._sample(pid)
+            except (OSError, ValueError, IndexError):
+                continue  # exited mid-scan
+            cur[pid] = (start, ticks, io)
+            prev = self._prev.get(pid)
+            if prev is None or prev[0] != start:
+                continue
+            row = {"cpu_ms": max(0, ticks - prev[1]) * 1000.0 / self._hz}
+            if io is not None and prev[2] is not None:
+                row["io_syscalls"] = max(0, io - prev[2])
+            out[(int(pid), comm)] = row
+        self._prev = cur
+        return Tick(None, None, None, {}, None, None, None, out)
@@ -0,0 +1,211 @@
+"""
+tsdb.py — embedded on-disk telemetry history for the SemantOS telemetry agent.
+
+Every metric is kept at several resolutions (tiers, default 1s / 10s / 1m / 1h),
+each a preallocated, memory-mapped column file laid out as five contiguous
+float64 columns of `capacity` slots:
+
+    key  : absolute slot number (ts // resolution) the row currently holds
+    sum, count, min, max : aggregate of the samples that fell in that slot
+
+A write lands in slot (ts // res) % capacity of *every* tier and folds into its
+aggregate, so rollups are maintained incrementally with no compaction job;
+a row whose key is from an older lap of the ring is reset before reuse, which
+is what bounds retention to capacity * res per tier.  Range queries pick the
+coarsest tier whose resolution still satisfies the requested step and reduce
+directly over contiguous views of the mmap (at most two, when the range wraps
+the ring), so no column is copied before aggregation.
+
+Each series costs one file per tier (about 4 MB with the default tiers), so
+`History` only creates series whose names match its allowlist, caps their
+number at `max_series`, and `expire` deletes series not written for
+`expire_s`.
+"""
+from __future__ import annotations
+
+import fnmatch
+import math
+import re
+from pathlib import Path
+
+import numpy as np
+
+KEY, SUM, COUNT, MIN, MAX = range(5)
+
+# resolution (s) -> retention (s)
+DEFAULT_TIERS = {1: 6 * 3600, 10: 3 * 86400, 60: 30 * 86400, 3600: 365 * 86400}
+
+_SAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def parse_tiers(spec: str) -> dict:
+    """"1=21600,10=259200" -> {1: 21600.0, 10: 259200.0} (resolution=retention)."""
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        res, _, ret = part.partition("=")
+        out[int(res)] = float(ret)
+    return out
+
+
+class _TierFile:
+    def __init__(self, path: Path, res: int, retention_s: float):
+        self.res = res
+        self.capacity = max(1, int(math.ceil(retention_s / res)))
+        self.path = path
+        new = not path.exists()
+        if not new and path.stat().st_size != 5 * self.capacity * 8:
+            path.unlink()  # written with other tiers: its slots mean nothing now
+            new = True
+        self.cols = np.memmap(path, dtype=np.float64, mode="w+" if new else "r+",
+                              shape=(5, self.capacity))
+        if new:
+            self.cols[KEY] = -1.0
+
+    def add(self, ts: float, value: float):
+        slot = int(ts // self.res)
+        i = slot % self.capacity
+        c = self.cols
+        if c[KEY, i] != slot:
+            c[KEY, i] = slot
+            c[SUM, i] = c[COUNT, i] = 0.0
+            c[MIN, i] = math.inf
+            c[MAX, i] = -math.inf
+        c[SUM, i] += value
+        c[COUNT, i] += 1.0
+        if value < c[MIN, i]:
+            c[MIN, i] = value
+        if value > c[MAX, i]:
+            c[MAX, i] = value
+
+    def last_ts(self) -> float:
+        """Start of the newest slot written, or -inf."""
+        k = float(self.cols[KEY].max())
+        return k * self.res if k >= 0 else -math.inf
+
+    def segments(self, s0: int, s1: int):
+        """(first_slot, column views) for slots s0..s1, split where they wrap."""
+        s0 = max(s0, s1 - self.capacity + 1)
+        out = []
+        s = s0
+        while s <= s1:
+            i = s % self.capacity
+            n = min(s1 - s + 1, self.capacity - i)
+            out.append((s, self.cols[:, i:i + n]))
+            s += n
+        return out
+
+
+class History:
+    """Multi-tier, mmap-backed history of scalar metrics.
+
+    `allow` is a list of fnmatch patterns of the metric names recorded (None
+    records everything); at most `max_series` series exist at once, and
+    `expire` removes those idle for more than `expire_s` seconds."""
+
+    def __init__(self, root, tiers: dict = None, max_points: int = 11000,
+                 allow=None, max_series: int = 512, expire_s: float = None):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.tiers = dict(sorted((tiers or DEFAULT_TIERS).items()))
+        self.max_points = max_points
+        self.max_series = int(max_series)
+        self.expire_s = expire_s
+        self._allow = (None if allow is None else
+                       re.compile("|".join(fnmatch.translate(p) for p in allow) or "(?!)"))
+        self.rejected = 0  # samples of metrics not allowed or over the cap
+        self._metrics = {}
+        self._last = {}  # series -> ts of its newest sample
+        names = set()
+        for res in self.tiers:
+            suffix = f".{res}s.col"
+            names.update(p.name[:-len(suffix)] for p in self.root.glob(f"*{suffix}"))
+        for name in sorted(names)[:self.max_series]:
+            files = self._open(name)
+            self._last[name] = max(tf.last_ts() for tf in files)
+
+    def _open(self, name: str):
+        files = self._metrics.get(name)
+        if files is None:
+            files = [_TierFile(self.root / f"{name}.{res}s.col", res, ret)
+                     for res, ret in self.tiers.items()]
+            self._metrics[name] = files
+        return files
+
+    def metrics(self) -> list:
+        return sorted(self._metrics)
+
+    def append(self, ts: float, values: dict):
+        """Fold one sample per allowed metric into every tier."""
+        for metric, v in values.items():
+            if v is None or v != v:  # skip absent / NaN
+                continue
+            name = _SAFE.sub("_", metric)
+            files = self._metrics.get(name)
+            if ((self._allow is not None and not self._allow.match(metric))
+                    or (files is None and len(self._metrics) >= self.max_series)):
+                self.rejected += 1
+                continue
+            files = files or self._open(name)
+            for tf in files:
+                tf.add(ts, float(v))
+            self._last[name] = ts
+
+    def expire(self, now: float) -> int:
+        """Delete the files of series with no sample for `expire_s`; returns
+        how many series went."""
+        if not self.expire_s:
+            return 0
+        idle = [n for n, t in self._last.items() if now - t > self.expire_s]
+        for name in idle:
+            for tf in self._metrics.pop(name):
+                del tf.cols
+                tf.path.unlink(missing_ok=True)
+            del self._last[name]
+        return len(idle)
+
+    def flush(self):
+        for files in self._metrics.values():
+            for tf in files:
+                tf.cols.flush()
+
+    def _tier(self, files, step: float, t0: float, now: float):
+        """Coarsest tier with res <= step that still reaches back to t0; if
+        none does, the tier with the longest retention."""
+        ok = [tf for tf in files if tf.res <= step] or files[:1]
+        covering = [tf for tf in ok if now - tf.capacity * tf.res <= t0]
+        return (covering or [max(files, key=lambda tf: tf.capacity * tf.res)])[-1]
+
+    def query(self, metric: str, t0: float, t1: float, step: float = None,
+              now: float = None) -> dict:
+        files = self._metrics.get(_SAFE.sub("_", metric))
+        if files is None:
+            raise KeyError(metric)
+        now = t1 if now is None else now
+        step = float(step) if step else max(1.0, (t1 - t0) / 1000.0)
+        if (t1 - t0) / step > self.max_points:
+            raise ValueError(f"range/step exceeds {self.max_points} points")
+        tf = self._tier(files, step, t0, now)
+        group = max(1, int(round(step / tf.res)))
+        g0 = int(t0 // (tf.res * group))
+        g1 = int(t1 // (tf.res * group))
+        n = g1 - g0 + 1
+        acc = np.zeros((4, n))
+        acc[2] = math.inf
+        acc[3] = -math.inf
+        for first, view in tf.segments(g0 * group, (g1 + 1) * group - 1):
+            slots = first + np.arange(view.shape[1])
+            valid = view[KEY] == slots
+            if not valid.any():
+                continue
+            g = slots[valid] // group - g0
+            acc[0] += np.bincount(g, view[SUM][valid], minlength=n)
+            acc[1] += np.bincount(g, view[COUNT][valid], minlength=n)
+            np.minimum.at(acc[2], g, view[MIN][valid])
+            np.maximum.at(acc[3], g, view[MAX][valid])
+        has = acc[1] > 0
+        ts = (g0 + np.flatnonzero(has)) * tf.res * group
+        return {"metric": metric, "tier_s": tf.res, "step_s": tf.res * group,
+                "ts": ts.tolist(),
+                "avg": (acc[0, has] / acc[1, has]).tolist(),
+                "min": acc[2, has].tolist(), "max": acc[3, has].tolist(),
+                "count": acc[1, has].astype(int).tolist()}
@@ -0,0 +1,268 @@
+"""
+telemetry-aggregator — fleet view over many SemantOS telemetry agents.
+
+Hosts reach the aggregator either by being scraped (`AGENTS` / `AGENTS_FILE`:
+every SCRAPE_INTERVAL_SEC each agent's `/sketches` is fetched over a bounded
+pool of persistent HTTP/1.1 connections) or by pushing the same payload to
+`/ingest` (agents with AGGREGATOR_URL set).  Each report replaces the host's row in a
+FleetTable, whose per-group sketch totals are kept up to date incrementally;
+fleet and per-group snapshots are published once per interval and served from
+pre-serialized bytes.  Everything runs on one asyncio loop, so the table needs
+no lock.
+"""
+import os
+import time
+import json
+import asyncio
+from urllib.parse import urlsplit
+
+from fastapi import FastAPI, Query, Request, HTTPException
+from fastapi.responses import Response
+
+from fleet_core import SketchLayout, FleetTable
+
+AGENTS = [a for a in os.environ.get("AGENTS", "").split(",") if a]  # base URLs
+AGENTS_FILE = os.environ.get("AGENTS_FILE", "")  # lines: "<base url> [group]"
+SCRAPE_INTERVAL_SEC = float(os.environ.get("SCRAPE_INTERVAL_SEC", "1.0"))
+SCRAPE_CONCURRENCY = int(os.environ.get("SCRAPE_CONCURRENCY", "64"))  # pool size
+SCRAPE_TIMEOUT_SEC = float(os.environ.get("SCRAPE_TIMEOUT_SEC", "2.0"))
+SKETCH_WINDOW = int(os.environ.get("SKETCH_WINDOW", "60"))  # agent window merged (s)
+SKETCH_ALPHA = float(os.environ.get("SKETCH_ALPHA", "0.01"))  # must match agents
+MAX_HOSTS = int(os.environ.get("MAX_HOSTS", "2048"))
+STALE_SEC = float(os.environ.get("STALE_SEC", str(5 * SCRAPE_INTERVAL_SEC)))
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99, "p999": 0.999}
+
+app = FastAPI(title="telemetry-aggregator", version="1.0.0")
+fleet = FleetTable(SketchLayout(SKETCH_ALPHA), max_hosts=MAX_HOSTS, stale_s=STALE_SEC)
+targets = []  # [(base_url, group or None)], loaded at startup
+_published = {}  # scope ("fleet" or group) -> pre-serialized snapshot bytes
+stats = {"scrapes": 0, "scrape_errors": 0, "pushes": 0, "dropped": 0,
+         "expired": 0, "cycle_s": 0.0, "overruns": 0}
+
+
+def _targets() -> list:
+    """[(base_url, group or None)] from AGENTS and AGENTS_FILE."""
+    out = [(a.rstrip("/"), None) for a in AGENTS]
+    if AGENTS_FILE:
+        with open(AGENTS_FILE) as f:
+            for line in f:
+                parts = line.split()
+                if parts and not parts[0].startswith("#"):
+                    out.append((parts[0].rstrip("/"),
+                                parts[1] if len(parts) > 1 else None))
+    return out
+
+
+def _ingest(payload: dict, default_host: str = None, group: str = None) -> bool:
+    """Apply one `/sketches` payload; ValueError when it has the wrong shape
+    (the host's row is then left as it was)."""
+    if not isinstance(payload, dict):
+        raise ValueError("payload must be an object")
+    host = payload.get("host_id") or default_host
+    if not host:
+        return False
+    if not isinstance(host, str) or not isinstance(payload.get("host_group") or "", str):
+        raise ValueError("host_id and host_group must be strings")
+    ok = fleet.update(time.time(), host,
+                      group or payload.get("host_group") or "default",
+                      payload.get("sketches") or {}, payload.get("metrics"))
+    if not ok:
+        stats["dropped"] += 1
+    return ok
+
+
+# --------------------------------------------------------------------------- #
+# Scraping.  A general-purpose async HTTP client costs ~1 ms of CPU per
+# request, which alone would use a whole core at 1000 hosts/s; agents answer
+# a single GET with a Content-Length body, so a minimal keep-alive HTTP/1.1
+# exchange over pooled asyncio streams is all that is needed.
+# --------------------------------------------------------------------------- #
+class _Pool:
+    """Idle keep-alive connections per (host, port), at most `size` in use."""
+
+    def __init__(self, size: int, timeout: float):
+        self.sem = asyncio.Semaphore(size)
+        self.timeout = timeout
+        self.idle = {}
+
+    async def get(self, url: str) -> bytes:
+        u = urlsplit(url)
+        addr = (u.hostname, u.port or 80)
+        path = (u.path or "/") + (f"?{u.query}" if u.query else "")
+        req = (f"GET {path} HTTP/1.1\r\nHost: {u.netloc}\r\n"
+               "Accept: application/json\r\n\r\n").encode()
+        async with self.sem:
+            conns = self.idle.setdefault(addr, [])
+            conn = conns.pop() if conns else None
+            for attempt in (0, 1):  # an idle connection may have been closed
+                if conn is None:
+                    conn = await asyncio.wait_for(asyncio.open_connection(*addr),
+                                                  self.timeout)
+                try:
+                    body = await asyncio.wait_for(self._exchange(conn, req),
+                                                  self.timeout)
+                    conns.append(conn)
+                    return body
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    conn[1].close()
+                    conn = None
+                    if attempt:
+                        raise
+                except BaseException:
+                    conn[1].close()
+                    raise
+
+    @staticmethod
+    async def _exchange(conn, req: bytes) -> bytes:
+        reader, writer = conn
+        writer.write(req)
+        head = await reader.readuntil(b"\r\n\r\n")
+        status = head[9:12]
+        length = None
+        for line in head.split(b"\r\n")[1:]:
+            k, _, v = line.partition(b":")
+            if k.strip().lower() == b"content-length":
+                length = int(v)
+        if length is None:
+            raise ValueError("response without Content-Length")
+        body = await reader.readexactly(length)
+        if status != b"200":
+            raise ValueError(f"HTTP {status.decode()}")
+        return body
+
+    def close(self):
+        for conns in self.idle.values():
+            for _, writer in conns:
+                writer.close()
+        self.idle.clear()
+
+
+async def _scrape(pool: _Pool, url: str, group: str):
+    try:
+        body = await pool.get(f"{url}/sketches?window={SKETCH_WINDOW}")
+        _ingest(json.loads(body), default_host=url, group=group)
+        stats["scrapes"] += 1
+    except asyncio.CancelledError:
+        raise
+    except Exception:  # one bad agent must not stop the fleet's scraping
+        stats["scrape_errors"] += 1
+
+
+async def scrape_worker():
+    if not targets:
+        return
+    pool = _Pool(SCRAPE_CONCURRENCY, SCRAPE_TIMEOUT_SEC)
+    try:
+        while True:
+            t0 = time.time()
+            await asyncio.gather(*(_scrape(pool, u, g) for u, g in targets),
+                                 return_exceptions=True)
+            stats["cycle_s"] = time.time() - t0
+            if stats["cycle_s"] > SCRAPE_INTERVAL_SEC:
+                stats["overruns"] += 1
+            await asyncio.sleep(max(0.0, SCRAPE_INTERVAL_SEC - stats["cycle_s"]))
+    finally:
+        pool.close()
+
+
+def _publish():
+    global _published
+    now = time.time()
+    stats["expired"] += fleet.expire(now)
+    out = {}
+    for scope in [None, *fleet.groups]:
+        data = {**fleet.summary(scope, QUANTILES), "ts": now}
+        out[scope or "fleet"] = json.dumps(data).encode()
+    _published = out
+
+
+async def publish_worker():
+    while True:
+        try:
+            _publish()
+        except Exception:
+            pass
+        await asyncio.sleep(SCRAPE_INTERVAL_SEC)
+
+
+@app.on_event("startup")
+async def startup():
+    targets.extend(_targets())
+    asyncio.create_task(scrape_worker())
+    asyncio.create_task(publish_worker())
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"ok": True, "hosts": len(fleet), "groups": len(fleet.groups),
+            "targets": len(targets), "rejected_sketches": fleet.rejected,
+            "cpu_s": time.process_time(), **stats}
+
+
+@app.post("/ingest")
+async def ingest(request: Request):
+    """Push path: the agent's `/sketches` payload (host_id, host_group,
+    sketches, metrics)."""
+    try:
+        payload = json.loads(await request.body())
+    except ValueError:
+        raise HTTPException(400, "body must be JSON")
+    if not isinstance(payload, dict) or not payload.get("host_id"):
+        raise HTTPException(400, "missing host_id")
+    try:
+        ok = _ingest(payload)
+    except OverflowError as e:
+        raise HTTPException(503, str(e))
+    except (ValueError, TypeError) as e:
+        raise HTTPException(400, f"bad payload: {e}")
+    if not ok:
+        raise HTTPException(503, "host table full")
+    stats["pushes"] += 1
+    return {"ok": True}
+
+
+@app.get("/snapshot")
+async def snapshot(group: str = Query(None)):
+    """Fleet-wide (or one host group's) merged quantiles and metric mean/max,
+    as of the last publish."""
+    body = _published.get(group or "fleet")
+    if body is None:
+        if group is not None and group not in fleet.groups:
+            raise HTTPException(404, f"unknown group '{group}'")
+        _publish()
+        body = _published.get(group or "fleet")
+    return Response(body, media_type="application/json")
+
+
+@app.get("/groups")
+async def groups():
+    counts = {}
+    for i in fleet.hosts.values():
+        g = int(fleet.group_of[i])
+        counts[g] = counts.get(g, 0) + 1
+    return {name: {"hosts": counts.get(g, 0)} for name, g in fleet.groups.items()}
+
+
+@app.get("/hosts")
+async def hosts(group: str = Query(None)):
+    if group is not None and group not in fleet.groups:
+        raise HTTPException(404, f"unknown group '{group}'")
+    now = time.time()
+    want = fleet.groups.get(group)
+    names = {g: name for name, g in fleet.groups.items()}
+    return [{"host_id": h, "group": names[int(fleet.group_of[i])],
+             "age_s": round(now - fleet.seen[i], 3)}
+            for h, i in sorted(fleet.hosts.items())
+            if want is None or fleet.group_of[i] == want]
+
+
+@app.get("/sketches")
+async def sketches(group: str = Query(None)):
+    """Merged sketches in the agent's `/sketches` format, so aggregators can
+    be stacked."""
+    if group is not None and group not in fleet.groups:
+        raise HTTPException(404, f"unknown group '{group}'")
+    return {"host_id": f"aggregate:{group or 'fleet'}", "host_group": group or "fleet",
+            "window_s": SKETCH_WINDOW, "ts": time.time(),
+            "sketches": {name: fleet.merged_sketch(name, group)
+                         for name in fleet.sketches}}
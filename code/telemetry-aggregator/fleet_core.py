@@ -0,0 +1,221 @@
+"""
+fleet_core.py — fleet-level merging for the SemantOS telemetry aggregator.
+
+Dependency-light (numpy only).  Mirrors the bucket layout of the agent's
+QuantileSketch (telemetry-agent/telemetry_core.py), so per-host sketches
+received as sparse {index, counts} dicts merge by plain addition:
+
+  * SketchLayout : DDSketch bucket geometry + quantile read over a count vector.
+  * FleetTable   : latest sketch rows and scalar metrics of up to `max_hosts`
+                   hosts in preallocated arrays, plus running per-group bucket
+                   totals updated by (new - old) on every host report, so a
+                   fleet or group quantile is one O(bins) read regardless of
+                   how many hosts contribute.
+"""
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+SKETCHES = ("sched_latency_ms", "block_io_ms")
+
+
+class SketchLayout:
+    """Bucket geometry of QuantileSketch(alpha, min_value, max_value)."""
+
+    def __init__(self, alpha: float = 0.01, min_value: float = 1e-3,
+                 max_value: float = 1e6):
+        self.alpha = float(alpha)
+        self.min_value = float(min_value)
+        self.max_value = float(max_value)
+        self.gamma = (1.0 + alpha) / (1.0 - alpha)
+        lg = math.log(self.gamma)
+        self.key_min = int(math.ceil(math.log(self.min_value) / lg))
+        self.n_bins = int(math.ceil(math.log(self.max_value) / lg)) - self.key_min + 1
+
+    def matches(self, d: dict) -> bool:
+        return (math.isclose(d.get("alpha", -1.0), self.alpha)
+                and math.isclose(d.get("min_value", -1.0), self.min_value)
+                and math.isclose(d.get("max_value", -1.0), self.max_value))
+
+    def quantiles(self, counts: np.ndarray, zero: int, qs) -> list:
+        qs = np.asarray(qs, float)
+        total = int(counts.sum()) + int(zero)
+        if total == 0:
+            return [0.0] * qs.size
+        ranks = qs * (total - 1)
+        cum = np.cumsum(counts) + zero
+        idx = np.minimum(np.searchsorted(cum, ranks, side="right"), counts.size - 1)
+        est = 2.0 * np.power(self.gamma, idx + self.key_min) / (self.gamma + 1.0)
+        return np.where(ranks < zero, 0.0, est).tolist()
+
+    def to_dict(self, counts: np.ndarray, zero: int) -> dict:
+        nz = np.flatnonzero(counts)
+        return {"alpha": self.alpha, "min_value": self.min_value,
+                "max_value": self.max_value, "zero": int(zero),
+                "index": nz.tolist(), "counts": counts[nz].tolist()}
+
+
+class FleetTable:
+    """Per-host rows in fixed-size arrays with incrementally maintained
+    per-group totals.
+
+    Scalar metrics get a column the first time a name is reported (at most
+    `max_metrics`); hosts that have not reported for `stale_s` are evicted
+    and their contribution is subtracted from their group's totals.
+    """
+
+    def __init__(self, layout: SketchLayout, max_hosts: int = 2048,
+                 max_groups: int = 256, max_metrics: int = 64,
+                 stale_s: float = 10.0, sketches=SKETCHES):
+        self.layout = layout
+        self.sketches = tuple(sketches)
+        self.max_hosts = max_hosts
+        self.stale_s = stale_s
+        k, n = len(self.sketches), layout.n_bins
+        self.counts = np.zeros((k, max_hosts, n), np.int64)
+        self.zero = np.zeros((k, max_hosts), np.int64)
+        self.group_counts = np.zeros((k, max_groups, n), np.int64)
+        self.group_zero = np.zeros((k, max_groups), np.int64)
+        self.metrics = np.full((max_hosts, max_metrics), np.nan)
+        self.metric_names = []
+        self._metric_col = {}
+        self.seen = np.full(max_hosts, -np.inf)
+        self.group_of = np.full(max_hosts, -1, np.int64)
+        self.hosts = {}    # host_id -> row
+        self.groups = {}   # group name -> index
+        self._free = list(range(max_hosts - 1, -1, -1))
+        self.rejected = 0  # sketches with a foreign layout
+
+    def __len__(self):
+        return len(self.hosts)
+
+    def _group(self, name: str) -> int:
+        g = self.groups.get(name)
+        if g is None:
+            if len(self.groups) >= self.group_zero.shape[1]:
+                raise OverflowError("too many host groups")
+            g = self.groups[name] = len(self.groups)
+        return g
+
+    def _retract(self, i: int):
+        g = self.group_of[i]
+        if g >= 0:
+            self.group_counts[:, g] -= self.counts[:, i]
+            self.group_zero[:, g] -= self.zero[:, i]
+
+    def _parse(self, sketches: dict):
+        """(counts, zero) arrays of one report; ValueError when malformed.
+        Sketches with a foreign layout are counted in `rejected` and left
+        empty."""
+        k, n = len(self.sketches), self.layout.n_bins
+        counts, zero = np.zeros((k, n), np.int64), np.zeros(k, np.int64)
+        for j, name in enumerate(self.sketches):
+            d = sketches.get(name)
+            if not d:
+                continue
+            if not isinstance(d, dict):
+                raise ValueError(f"sketch {name} is not an object")
+            if not self.layout.matches(d):
+                self.rejected += 1
+                continue
+            idx = np.asarray(d.get("index") or [], np.int64).reshape(-1)
+            c = np.asarray(d.get("counts") or [], np.int64).reshape(-1)
+            z = int(d.get("zero", 0))
+            if (idx.size != c.size or z < 0 or (c < 0).any()
+                    or (idx.size and (idx.min() < 0 or idx.max() >= n))):
+                raise ValueError(f"sketch {name} out of range")
+            np.add.at(counts[j], idx, c)
+            zero[j] = z
+        return counts, zero
+
+    def update(self, now: float, host: str, group: str, sketches: dict,
+               metrics: dict = None) -> bool:
+        """Replace `host`'s row with its latest report.  False when the table
+        is full.  A malformed report (ValueError/TypeError) or too many groups
+        (OverflowError) raises before anything is changed."""
+        if not isinstance(sketches, dict) or not isinstance(metrics or {}, dict):
+            raise ValueError("sketches and metrics must be objects")
+        counts, zero = self._parse(sketches)
+        i = self.hosts.get(host)
+        if i is None and not self._free:
+            return False
+        g = self._group(group)
+        if i is None:
+            i = self.hosts[host] = self._free.pop()
+        self._retract(i)
+        self.counts[:, i] = counts
+        self.zero[:, i] = zero
+        self.group_of[i] = g
+        self.group_counts[:, g] += counts
+        self.group_zero[:, g] += zero
+        self.seen[i] = now
+        mrow = self.metrics[i]
+        mrow.fill(np.nan)
+        for name, v in (metrics or {}).items():
+            j = self._metric_col.get(name)
+            if j is None:
+                if len(self.metric_names) >= mrow.size:
+                    continue
+                j = self._metric_col[name] = len(self.metric_names)
+                self.metric_names.append(name)
+            if isinstance(v, (int, float)):
+                mrow[j] = v
+        return True
+
+    def expire(self, now: float) -> int:
+        stale = [h for h, i in self.hosts.items() if now - self.seen[i] > self.stale_s]
+        for h in stale:
+            i = self.hosts.pop(h)
+            self._retract(i)
+            self.group_of[i] = -1
+            self.seen[i] = -np.inf
+            self.counts[:, i] = 0
+            self.zero[:, i] = 0
+            self.metrics[i] = np.nan
+            self._free.append(i)
+        return len(stale)
+
+    def _rows(self, group: str = None) -> np.ndarray:
+        live = np.fromiter(self.hosts.values(), np.int64, len(self.hosts))
+        if group is None:
+            return live
+        return live[self.group_of[live] == self.groups[group]]
+
+    def summary(self, group: str = None, qs: dict = None) -> dict:
+        """Merged quantiles and metric mean/max over the fleet or one group."""
+        qs = qs or {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+        if group is None:
+            counts, zero = self.group_counts.sum(axis=1), self.group_zero.sum(axis=1)
+        else:
+            g = self.groups[group]
+            counts, zero = self.group_counts[:, g], self.group_zero[:, g]
+        quantiles = {}
+        for k, name in enumerate(self.sketches):
+            est = self.layout.quantiles(counts[k], zero[k], list(qs.values()))
+            quantiles[name] = {"count": int(counts[k].sum() + zero[k]),
+                               **dict(zip(qs, est))}
+        rows = self._rows(group)
+        m = self.metrics[rows][:, :len(self.metric_names)]
+        metrics = {}
+        if rows.size:
+            present = ~np.isnan(m)
+            n = present.sum(axis=0)
+            with np.errstate(invalid="ignore"):
+                mean = np.where(n > 0, np.nansum(m, axis=0) / np.maximum(n, 1), np.nan)
+                mx = np.where(n > 0, np.max(np.where(present, m, -np.inf), axis=0),
+                              np.nan)
+            for j, name in enumerate(self.metric_names):
+                if n[j]:
+                    metrics[name] = {"mean": float(mean[j]), "max": float(mx[j])}
+        return {"scope": group or "fleet", "hosts": int(rows.size),
+                "quantiles": quantiles, "metrics": metrics}
+
+    def merged_sketch(self, name: str, group: str = None) -> dict:
+        k = self.sketches.index(name)
+        if group is None:
+            return self.layout.to_dict(self.group_counts[k].sum(axis=0),
+                                       self.group_zero[k].sum())
+        g = self.groups[group]
+        return self.layout.to_dict(self.group_counts[k, g], self.group_zero[k, g])
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+swarm.py — a local swarm of fake telemetry agents for the aggregator.
+
+Serves `--hosts` virtual agents from one asyncio process on one port: agent i
+answers `GET /h/<i>/sketches` with a payload shaped like the real agent's
+`/sketches` (sparse sketches + metrics), regenerated once per second from a
+per-group lognormal latency profile so group quantiles differ.  A targets file
+for the aggregator's AGENTS_FILE is written alongside.  With `--push URL` the
+swarm instead POSTs every host's payload to URL/ingest once per second
+(push mode needs httpx).
+
+Usage:
+    python swarm.py --hosts 1000 --groups 8 --port 9200 --targets /tmp/agents.txt
+    AGENTS_FILE=/tmp/agents.txt uvicorn app:app --port 9105
+    curl localhost:9105/healthz; curl 'localhost:9105/snapshot?group=g3'
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import numpy as np
+
+from fleet_core import SketchLayout
+
+
+class Swarm:
+    def __init__(self, hosts: int, groups: int, samples: int, seed: int):
+        self.layout = SketchLayout()
+        self.hosts, self.groups, self.samples = hosts, groups, samples
+        self.rng = np.random.default_rng(seed)
+        self.bodies = [b""] * hosts
+        self.served = 0
+
+    def _index(self, v: np.ndarray) -> np.ndarray:
+        keys = np.ceil(np.log(v) / np.log(self.layout.gamma)).astype(np.int64)
+        return np.clip(keys - self.layout.key_min, 0, self.layout.n_bins - 1)
+
+    def regenerate(self):
+        g = np.arange(self.hosts) % self.groups
+        mu = 0.5 + 0.25 * g  # log-ms: each group a little slower
+        sched = self.rng.lognormal(mu[:, None], 0.6, (self.hosts, self.samples))
+        block = self.rng.lognormal(mu[:, None] + 1.0, 0.8, (self.hosts, self.samples // 4))
+        si, bi = self._index(sched), self._index(block)
+        now = time.time()
+        for h in range(self.hosts):
+            sk = {}
+            for name, idx in (("sched_latency_ms", si[h]), ("block_io_ms", bi[h])):
+                keys, counts = np.unique(idx, return_counts=True)
+                sk[name] = {"alpha": self.layout.alpha,
+                            "min_value": self.layout.min_value,
+                            "max_value": self.layout.max_value, "zero": 0,
+                            "index": keys.tolist(), "counts": counts.tolist()}
+            self.bodies[h] = json.dumps({
+                "host_id": f"fake-{h:05d}", "host_group": f"g{g[h]}",
+                "window_s": 60, "sketches": sk, "ts": now,
+                "metrics": {"p95_latency_ms": float(np.percentile(sched[h], 95)),
+                            "cpu_util": float(self.rng.random())}}).encode()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                path = head.split(b" ", 2)[1].split(b"?", 1)[0]
+                parts = path.split(b"/")  # b"", b"h", b"<i>", b"sketches"
+                try:
+                    body, status = self.bodies[int(parts[2])], b"200 OK"
+                except (IndexError, ValueError):
+                    body, status = b"{}", b"404 Not Found"
+                writer.write(b"HTTP/1.1 " + status + b"\r\nContent-Type: "
+                             b"application/json\r\nContent-Length: "
+                             + str(len(body)).encode() + b"\r\n\r\n" + body)
+                self.served += 1
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def run(args):
+    swarm = Swarm(args.hosts, args.groups, args.samples, args.seed)
+    swarm.regenerate()
+    if args.targets:
+        with open(args.targets, "w") as f:
+            for h in range(args.hosts):
+                f.write(f"http://{args.host}:{args.port}/h/{h}\n")
+    client = server = None
+    if args.push:
+        import httpx
+        client = httpx.AsyncClient(limits=httpx.Limits(max_connections=args.concurrency))
+        sem = asyncio.Semaphore(args.concurrency)
+
+        async def push(body):
+            async with sem:
+                try:
+                    await client.post(args.push.rstrip("/") + "/ingest", content=body,
+                                      headers={"Content-Type": "application/json"})
+                except Exception:
+                    pass
+    else:
+        server = await asyncio.start_server(swarm.handle, args.host, args.port)
+    print(f"swarm: {args.hosts} hosts in {args.groups} groups "
+          f"({'push -> ' + args.push if args.push else f'serving on :{args.port}'})",
+          flush=True)
+    last = time.time()
+    while True:
+        if client is not None:
+            await asyncio.gather(*(push(b) for b in swarm.bodies))
+        await asyncio.sleep(max(0.0, 1.0 - (time.time() - last)))
+        last = time.time()
+        swarm.regenerate()
+        if args.verbose and server is not None:
+            print(f"served {swarm.served}", flush=True)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--hosts", type=int, default=1000)
+    ap.add_argument("--groups", type=int, default=8)
+    ap.add_argument("--samples", type=int, default=400, help="latency samples per host")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9200)
+    ap.add_argument("--targets", default="", help="write an AGENTS_FILE here")
+    ap.add_argument("--push", default="", help="aggregator base URL to push to")
+    ap.add_argument("--concurrency", type=int, default=64)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--verbose", action="store_true")
+    asyncio.run(run(ap.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+import math
+
+import numpy as np
+import pytest
+
+from fleet_core import SketchLayout, FleetTable
+
+LAYOUT = SketchLayout(0.01)
+
+
+def _sketch(values, layout=LAYOUT) -> dict:
+    """Sparse {index, counts} payload of `values`, as an agent sends it."""
+    v = np.asarray(values, float)
+    small = v < layout.min_value
+    keys = np.ceil(np.log(v[~small]) / math.log(layout.gamma)).astype(np.int64)
+    idx, counts = np.unique(np.clip(keys - layout.key_min, 0, layout.n_bins - 1),
+                            return_counts=True)
+    return {"alpha": layout.alpha, "min_value": layout.min_value,
+            "max_value": layout.max_value, "zero": int(small.sum()),
+            "index": idx.tolist(), "counts": counts.tolist()}
+
+
+def _assert_totals_consistent(t: FleetTable):
+    for name, g in t.groups.items():
+        rows = [i for i in t.hosts.values() if t.group_of[i] == g]
+        assert np.array_equal(t.group_counts[:, g], t.counts[:, rows].sum(axis=1))
+        assert np.array_equal(t.group_zero[:, g], t.zero[:, rows].sum(axis=1))
+    assert (t.group_counts >= 0).all() and (t.group_zero >= 0).all()
+
+
+def test_merged_quantiles_within_alpha_of_pooled_samples():
+    rng = np.random.default_rng(0)
+    t = FleetTable(LAYOUT, max_hosts=8)
+    pooled = []
+    for h in range(8):
+        x = rng.lognormal(1.0 + 0.3 * h, 0.8, 3000)
+        pooled.append(x)
+        assert t.update(0.0, f"h{h}", "web" if h % 2 else "db",
+                        {"sched_latency_ms": _sketch(x)}, {"cpu": float(h)})
+    pooled = np.sort(np.concatenate(pooled))
+    s = t.summary(None, {"p50": 0.5, "p99": 0.99})
+    for key, q in (("p50", 0.5), ("p99", 0.99)):
+        true = pooled[int(q * (pooled.size - 1))]
+        assert abs(s["quantiles"]["sched_latency_ms"][key] - true) <= 0.01 * true * (1 + 1e-9)
+    assert s["hosts"] == 8 and s["metrics"]["cpu"] == {"mean": 3.5, "max": 7.0}
+    assert t.summary("web")["hosts"] == 4
+    merged = t.merged_sketch("sched_latency_ms")
+    assert merged["counts"] == t.counts[0].sum(axis=0)[merged["index"]].tolist()
+    assert sum(merged["counts"]) + merged["zero"] == pooled.size
+
+
+def test_totals_stay_consistent_through_updates_moves_and_expiry():
+    rng = np.random.default_rng(1)
+    t = FleetTable(LAYOUT, max_hosts=16, stale_s=5.0)
+    for step in range(300):
+        host = f"h{rng.integers(20)}"
+        x = rng.exponential(rng.uniform(0.5, 50), rng.integers(0, 50))
+        t.update(float(step), host, f"g{rng.integers(3)}",
+                 {"sched_latency_ms": _sketch(x), "block_io_ms": _sketch(x * 2)})
+        if step % 7 == 0:
+            t.expire(float(step))
+        _assert_totals_consistent(t)
+    assert len(t) + len(t._free) == 16
+
+
+def test_malformed_report_changes_nothing():
+    t = FleetTable(LAYOUT, max_hosts=2)
+    t.update(0.0, "a", "g", {"sched_latency_ms": _sketch([1.0, 2.0, 0.0])})
+    before = (t.counts.copy(), t.zero.copy(), t.group_counts.copy(), t.group_zero.copy())
+    bad_index = {**_sketch([1.0]), "index": [LAYOUT.n_bins]}
+    bad_counts = {**_sketch([1.0, 2.0]), "counts": [1]}
+    negative = {**_sketch([1.0]), "counts": [-5]}
+    for bad in ({"sched_latency_ms": bad_index}, {"sched_latency_ms": bad_counts},
+                {"sched_latency_ms": negative}, {"sched_latency_ms": [1, 2]}, [1]):
+        with pytest.raises((ValueError, TypeError)):
+            t.update(1.0, "a", "g", bad)
+    for a, b in zip(before, (t.counts, t.zero, t.group_counts, t.group_zero)):
+        assert np.array_equal(a, b)
+    _assert_totals_consistent(t)
+
+
+def test_foreign_layout_is_rejected_and_group_overflow_leaks_no_slot():
+    t = FleetTable(LAYOUT, max_hosts=3, max_groups=1)
+    t.update(0.0, "a", "g", {"sched_latency_ms": _sketch([1.0], SketchLayout(0.02))})
+    assert t.rejected == 1 and t.summary()["quantiles"]["sched_latency_ms"]["count"] == 0
+    with pytest.raises(OverflowError):
+        t.update(0.0, "b", "other", {})
+    assert "b" not in t.hosts and len(t._free) == 2
+    assert t.update(0.0, "c", "g", {}) and t.update(0.0, "d", "g", {})
+    assert not t.update(0.0, "e", "g", {})  # table full
+
+
+def test_counts_do_not_wrap():
+    t = FleetTable(LAYOUT, max_hosts=1)
+    big = {**_sketch([1.0]), "counts": [2**40]}
+    t.update(0.0, "a", "g", {"sched_latency_ms": big})
+    assert t.summary()["quantiles"]["sched_latency_ms"]["count"] == 2**40
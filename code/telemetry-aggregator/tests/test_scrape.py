@@ -0,0 +1,34 @@
+import asyncio
+import json
+
+import app
+
+
+class _FakePool:
+    def __init__(self, bodies):
+        self.bodies = bodies
+
+    async def get(self, url):
+        body = self.bodies[url.split("/sketches")[0]]
+        if isinstance(body, Exception):
+            raise body
+        return body
+
+
+def test_one_bad_agent_does_not_stop_the_others(monkeypatch):
+    monkeypatch.setattr(app, "fleet", app.FleetTable(app.SketchLayout(app.SKETCH_ALPHA),
+                                                     max_hosts=8))
+    monkeypatch.setattr(app, "stats", dict(app.stats, scrapes=0, scrape_errors=0))
+    good = json.dumps({"host_id": "ok", "sketches": {}, "metrics": {"cpu": 1.0}}).encode()
+    pool = _FakePool({"http://ok": good,
+                      "http://list": b"[1, 2]",
+                      "http://shape": json.dumps({"sketches": {"sched_latency_ms": 3}}).encode(),
+                      "http://metrics": json.dumps({"metrics": [1]}).encode(),
+                      "http://boom": RuntimeError("unexpected")})
+
+    async def cycle():
+        await asyncio.gather(*(app._scrape(pool, u, None) for u in pool.bodies))
+
+    asyncio.run(cycle())
+    assert app.stats["scrapes"] == 1 and app.stats["scrape_errors"] == 4
+    assert list(app.fleet.hosts) == ["ok"]